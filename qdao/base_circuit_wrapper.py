@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
 
@@ -28,3 +28,8 @@ class BaseCircWrapper(ABC):
     @abstractmethod
     def gen_sub_circ(self, instrs, num_local, num_primary) -> Any:
         """Generate a new subcircuit based on given list of instructions"""
+
+    def get_instr_matrix(self, instruction) -> Optional[np.ndarray]:
+        """Unitary matrix of the instruction in little-endian order of its
+        qubits, `None` if the instruction cannot be fused"""
+        return None
@@ -0,0 +1,117 @@
+"""
+Batch Simulator Module
+======================
+
+This module provides a `BatchSimulator`, which applies the gates of a
+sub-circuit to a batch of chunks at once with vectorized NumPy kernels. If
+`num_primary` is small, simulating chunk by chunk is dominated by the
+overhead of each simulator call, while a batch of chunks, stacked into a
+`(batch, 1 << num_primary)` array, costs a few large array operations per
+gate. See `Engine` with `batch_size > 1`.
+
+Classes:
+--------
+
+- BatchSimulator: Simulates a sub-circuit on a batch of chunks.
+
+Functions:
+----------
+
+- apply_gate: Apply a gate matrix to every row of a batch of statevectors.
+"""
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from qdao.circuit import CircuitHelperProvider
+from qdao.exceptions import QdaoError
+
+# Instructions without a matrix that do not change the statevector
+_NOOP_INSTRS = {"barrier", "id", "save_statevector", "save_state"}
+
+
+def apply_gate(batch: np.ndarray, matrix: np.ndarray, qubits: List[int]) -> None:
+    """
+    Apply a gate matrix to every row of a batch of statevectors in place.
+
+    Args:
+        batch (np.ndarray): A `(batch, 1 << n)` array, qubit 0 is the least
+            significant bit of an amplitude index.
+        matrix (np.ndarray): A `(1 << k, 1 << k)` matrix in little-endian
+            order of `qubits`, i.e., bit `i` of a row index is `qubits[i]`.
+        qubits (List[int]): Qubits the gate acts on.
+    """
+    n = batch.shape[1].bit_length() - 1
+    k = len(qubits)
+    # numpy reshapes in big-endian order, axis `1 + a` holds qubit `n-1-a`
+    state = batch.reshape((batch.shape[0],) + (2,) * n)
+    axes = [n - qubits[k - 1 - a] for a in range(k)]
+
+    diag = np.diag(matrix)
+    if np.count_nonzero(matrix - np.diag(diag)) == 0:
+        # Broadcast the diagonal over the other qubits and the batch
+        shape = [1] * (n + 1)
+        for a in axes:
+            shape[a] = 2
+        state *= diag.reshape((2,) * k).transpose(np.argsort(axes)).reshape(shape)
+        return
+
+    res = np.tensordot(
+        matrix.reshape((2,) * (2 * k)), state, axes=(list(range(k, 2 * k)), axes)
+    )
+    state[...] = np.moveaxis(res, list(range(k)), axes)
+
+
+class BatchSimulator:
+    """
+    Simulates a sub-circuit on a batch of chunks with NumPy.
+
+    Gates are taken from the circuit helper of the backend, see
+    `BaseCircWrapper.get_instr_matrix`, so every gate of a sub-circuit must
+    have a matrix, e.g., Qiskit circuits transpiled to basis gates.
+
+    Attributes:
+        backend (str): Backend of sub-circuits, e.g., "qiskit".
+    """
+
+    def __init__(self, backend: str = "qiskit") -> None:
+        self.backend = backend
+        self._circ_helper = CircuitHelperProvider.get_helper(backend)
+        # Gates of the last sub-circuit, which is run once per batch
+        self._compiled = None
+
+    def compile(self, circ: Any) -> List[Tuple[List[int], np.ndarray]]:
+        """Qubits and matrix of each gate of `circ`"""
+        if self._compiled is not None and self._compiled[0] is circ:
+            return self._compiled[1]
+
+        helper = self._circ_helper
+        helper.circ = circ
+        ops = []
+        for instr in helper.instructions:
+            matrix = helper.get_instr_matrix(instr)
+            if matrix is None:
+                name = getattr(getattr(instr, "operation", instr), "name", None)
+                if name in _NOOP_INSTRS:
+                    continue
+                raise QdaoError(
+                    "Batch simulation requires gate matrices, {} has none, "
+                    "try transpiling the circuit to basis gates".format(name)
+                )
+            ops.append((list(helper.get_instr_qubits(instr)), np.asarray(matrix)))
+        self._compiled = (circ, ops)
+        return ops
+
+    def run(self, simobj) -> np.ndarray:
+        """
+        Simulate `simobj.circ` on each row of `simobj.objs[0]`.
+
+        Returns:
+            np.ndarray: The evolved batch, which is the input buffer if it
+                is contiguous.
+        """
+        batch, circ = simobj.objs[0], simobj.circ
+        rows = batch.reshape(-1, batch.shape[-1])
+        for qubits, matrix in self.compile(circ):
+            apply_gate(rows, matrix, qubits)
+        return rows.reshape(batch.shape)
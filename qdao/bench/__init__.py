@@ -0,0 +1,17 @@
+"""
+Benchmark Package
+=================
+
+Offline benchmarks of `Engine`. Circuits are generated locally, so that no
+network access nor QASM checkout is required, and results are emitted as JSON
+lines with per-phase timings. Run `python -m qdao.bench --help` for options.
+
+Modules:
+--------
+
+- qdao.bench.circuits: Generators of benchmark circuit families.
+- qdao.bench.runner: Sweep of configurations and the command line entry point.
+"""
+from qdao.bench.circuits import CIRCUITS, generate_circuit
+from qdao.bench.runner import BenchConfig, run_config, sweep
+from qdao.engine import PHASES, PhaseTimer
@@ -0,0 +1,5 @@
+import sys
+
+from qdao.bench.runner import main
+
+sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Benchmark Circuits Module
+=========================
+
+This module generates circuit families for benchmarks locally, i.e., without
+downloading QASM files. Every generator is deterministic for a given seed, so
+that results of different runs and machines are comparable.
+
+Functions:
+----------
+
+- random_layers: Random circuit of one- and two-qubit gates, see `qdao.qiskit.utils.random_circuit`.
+- qft: Quantum Fourier transform.
+- ghz: Preparation of a GHZ state.
+- ising: Trotterized time evolution of a transverse-field Ising chain.
+- qaoa: QAOA ansatz of MaxCut on a random graph.
+- generate_circuit: Generate a circuit of a family in `CIRCUITS` for a backend.
+
+Attributes:
+-----------
+
+- CIRCUITS: Registry of circuit generators by family name.
+- QUAFU_BASIS_GATES: Gates a circuit is transpiled to before converting to Quafu.
+"""
+from typing import Any, Optional
+
+import numpy as np
+from qiskit import QuantumCircuit, transpile
+from qiskit.qasm2 import dumps
+
+from qdao.exceptions import QdaoError
+from qdao.qiskit.utils import random_circuit
+
+QUAFU_BASIS_GATES = ["h", "x", "rx", "ry", "rz", "cx"]
+
+
+def random_layers(
+    num_qubits: int, depth: int, seed: Optional[int] = None
+) -> QuantumCircuit:
+    """Random circuit of `depth` layers of one- and two-qubit gates"""
+    return random_circuit(num_qubits, depth, max_operands=2, measure=False, seed=seed)
+
+
+def qft(num_qubits: int, depth: int = 1, seed: Optional[int] = None) -> QuantumCircuit:
+    """Quantum Fourier transform, `depth` and `seed` are ignored"""
+    circ = QuantumCircuit(num_qubits)
+    for i in reversed(range(num_qubits)):
+        circ.h(i)
+        for j in reversed(range(i)):
+            circ.cp(np.pi / (1 << (i - j)), j, i)
+    for i in range(num_qubits // 2):
+        circ.swap(i, num_qubits - 1 - i)
+    return circ
+
+
+def ghz(num_qubits: int, depth: int = 1, seed: Optional[int] = None) -> QuantumCircuit:
+    """GHZ state preparation, `depth` and `seed` are ignored"""
+    circ = QuantumCircuit(num_qubits)
+    circ.h(0)
+    for i in range(num_qubits - 1):
+        circ.cx(i, i + 1)
+    return circ
+
+
+def ising(num_qubits: int, depth: int, seed: Optional[int] = None) -> QuantumCircuit:
+    """`depth` Trotter steps of a transverse-field Ising chain with random couplings"""
+    rng = np.random.default_rng(seed)
+    circ = QuantumCircuit(num_qubits)
+    circ.h(range(num_qubits))
+    for _ in range(depth):
+        for i in range(num_qubits - 1):
+            circ.rzz(rng.uniform(0, np.pi), i, i + 1)
+        for i in range(num_qubits):
+            circ.rx(rng.uniform(0, np.pi), i)
+    return circ
+
+
+def qaoa(num_qubits: int, depth: int, seed: Optional[int] = None) -> QuantumCircuit:
+    """`depth` QAOA layers of MaxCut on a random graph of edge probability 0.5"""
+    rng = np.random.default_rng(seed)
+    edges = [
+        (i, j)
+        for i in range(num_qubits)
+        for j in range(i + 1, num_qubits)
+        if rng.random() < 0.5
+    ]
+    circ = QuantumCircuit(num_qubits)
+    circ.h(range(num_qubits))
+    for _ in range(depth):
+        gamma, beta = rng.uniform(0, np.pi, size=2)
+        for i, j in edges:
+            circ.rzz(2 * gamma, i, j)
+        circ.rx(2 * beta, range(num_qubits))
+    return circ
+
+
+CIRCUITS = {
+    "random": random_layers,
+    "qft": qft,
+    "ghz": ghz,
+    "ising": ising,
+    "qaoa": qaoa,
+}
+
+
+def generate_circuit(
+    name: str,
+    num_qubits: int,
+    depth: int = 10,
+    seed: Optional[int] = 0,
+    backend: str = "qiskit",
+) -> Any:
+    """
+    Generate a circuit of a family in `CIRCUITS` for a backend.
+
+    Args:
+        name (str): Name of the circuit family.
+        num_qubits (int): Number of qubits.
+        depth (int): Number of layers, ignored by fixed-size families.
+        seed (Optional[int]): Seed of random gates and parameters.
+        backend (str): Backend the circuit is simulated with.
+
+    Returns:
+        Any: The circuit in the format of `backend`.
+    """
+    if name not in CIRCUITS:
+        raise QdaoError(
+            "Unknown circuit family {}, supported: {}".format(name, list(CIRCUITS))
+        )
+    circ = CIRCUITS[name](num_qubits, depth, seed)
+
+    if backend == "qiskit":
+        from qiskit_aer import Aer
+
+        return transpile(circ, Aer.get_backend("aer_simulator"), seed_transpiler=0)
+    if backend == "quafu":
+        from quafu import QuantumCircuit as QuafuCircuit
+
+        circ = transpile(circ, basis_gates=QUAFU_BASIS_GATES, seed_transpiler=0)
+        quafu_circ = QuafuCircuit(1)
+        quafu_circ.from_openqasm(dumps(circ))
+        return quafu_circ
+    raise QdaoError("Unsupported backend {} for benchmark circuits".format(backend))
@@ -0,0 +1,613 @@
+"""
+Benchmark Regression Module
+===========================
+
+This module measures a fixed set of benchmark cases repeatedly and compares
+them against baselines recorded on the same machine. Baselines are stored as
+one JSON file per machine fingerprint, with one entry per case, whose name
+encodes its configuration. A case regresses if its median is slower than the
+baseline median by more than a threshold, and the interquartile ranges (IQR)
+of both do not overlap, i.e., the slowdown is not explained by noise.
+
+Classes:
+--------
+
+- BenchCase: A benchmark case that is measured repeatedly.
+- Measurement: Median and IQR of repeated measurements of one case.
+
+Functions:
+----------
+
+- machine_fingerprint: Hardware and software identity of this machine.
+- fingerprint_id: Short stable id of a machine fingerprint.
+- measure_cases: Measure benchmark cases.
+- compare: Find regressions of measurements against a baseline.
+- load_baseline: Load the baseline of a machine.
+- save_baseline: Save measurements as the baseline of a machine.
+- main: Command line entry point, `python -m qdao.bench.regression --help`.
+
+Attributes:
+-----------
+
+- CASES: Registry of benchmark cases by name.
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from qdao.bench.circuits import generate_circuit
+from qdao.bench.runner import BenchConfig, run_config, scratch_dir
+from qdao.circuit import CircuitHelperProvider, PartitionerProvider
+from qdao.manager import SvManager
+from qdao.util import indexes
+
+THROUGHPUT_UNIT = "gates/s"
+BANDWIDTH_UNIT = "B/s"
+
+
+class BenchCase:
+    """
+    A benchmark case that is measured repeatedly.
+
+    Attributes:
+        name (str): Name of the case including its configuration.
+        setup (Callable): Context manager yielding `(run, work)`, where `run`
+            executes the measured work once. If `run` returns a number, it is
+            taken as the elapsed time instead of timing the call.
+        unit (str): 's' for time, lower is better, or 'gates/s' or 'B/s'
+            for throughput computed as `work` per second, higher is better.
+        default (bool): Whether the case is measured if no case is
+            selected, large cases are only measured on request.
+    """
+
+    def __init__(
+        self, name: str, setup: Callable, unit: str = "s", default: bool = True
+    ) -> None:
+        self.name = name
+        self.setup = setup
+        self.unit = unit
+        self.default = default
+
+    def measure(self, repeat: int = 5, warmup: int = 1) -> "Measurement":
+        """Run `warmup` untimed and `repeat` timed iterations"""
+        samples = []
+        with self.setup() as (run, work):
+            for i in range(warmup + repeat):
+                st = perf_counter()
+                ret = run()
+                elapsed = perf_counter() - st if ret is None else ret
+                if i < warmup:
+                    continue
+                if self.unit in (THROUGHPUT_UNIT, BANDWIDTH_UNIT):
+                    samples.append(work / max(elapsed, 1e-9))
+                else:
+                    samples.append(elapsed)
+        return Measurement(self.unit, samples)
+
+
+class Measurement:
+    """
+    Median and IQR of repeated measurements of one case.
+
+    Attributes:
+        unit (str): Unit of the samples, see `BenchCase`.
+        samples (List[float]): Measured samples.
+        median (float): Median of the samples.
+        q1 (float): First quartile of the samples.
+        q3 (float): Third quartile of the samples.
+    """
+
+    def __init__(self, unit: str, samples: List[float]) -> None:
+        self.unit = unit
+        self.samples = list(samples)
+        self.q1, self.median, self.q3 = (
+            float(v) for v in np.percentile(self.samples, [25, 50, 75])
+        )
+
+    @property
+    def iqr(self) -> float:
+        return self.q3 - self.q1
+
+    @property
+    def higher_is_better(self) -> bool:
+        return self.unit in (THROUGHPUT_UNIT, BANDWIDTH_UNIT)
+
+    def slowdown(self, baseline: "Measurement") -> float:
+        """Ratio of the median to that of `baseline`, > 1 means slower"""
+        if self.higher_is_better:
+            return baseline.median / max(self.median, 1e-12)
+        return self.median / max(baseline.median, 1e-12)
+
+    def to_dict(self) -> dict:
+        return {
+            "unit": self.unit,
+            "samples": self.samples,
+            "median": self.median,
+            "q1": self.q1,
+            "q3": self.q3,
+            "iqr": self.iqr,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Measurement":
+        return cls(d["unit"], d["samples"])
+
+
+def _engine_case(circuit: str, nq: int, np_: int, nl: int, location: str):
+    config = BenchConfig(
+        circuit=circuit,
+        num_qubits=nq,
+        num_primary=np_,
+        num_local=nl,
+        sv_location=location,
+    )
+
+    @contextmanager
+    def setup():
+        circ = generate_circuit(circuit, nq, depth=config.depth, seed=config.seed)
+        yield lambda: run_config(config, circuit=circ)["time"], 1
+
+    return BenchCase(
+        "engine.run/{}-q{}-p{}-l{}-{}".format(circuit, nq, np_, nl, location), setup
+    )
+
+
+def _manager_case(op: str, nq: int, np_: int, nl: int, location: str):
+    # Local qubits and the highest qubits, i.e., storage units are strided
+    qubits = list(range(nl)) + list(range(nq - np_ + nl, nq))
+
+    @contextmanager
+    def setup():
+        with scratch_dir() as path:
+            manager = SvManager(
+                num_qubits=nq,
+                num_primary=np_,
+                num_local=nl,
+                sv_location=location,
+                data_dir=path,
+            )
+            manager.initialize()
+
+            def run():
+                for ichunk in range(1 << (nq - np_)):
+                    manager.chunk_idx = ichunk
+                    if op == "load_sv":
+                        manager.load_sv(qubits)
+                    else:
+                        manager.store_sv(qubits)
+
+            yield run, 1
+            del manager
+
+    return BenchCase(
+        "manager.{}/q{}-p{}-l{}-{}".format(op, nq, np_, nl, location), setup
+    )
+
+
+def _direct_io_case(direct: bool, nq: int, np_: int, nl: int):
+    # Chunks of contiguous storage units, i.e., large sequential accesses
+    qubits = list(range(np_))
+
+    @contextmanager
+    def setup():
+        with scratch_dir() as path:
+            manager = SvManager(
+                num_qubits=nq,
+                num_primary=np_,
+                num_local=nl,
+                direct_io=direct,
+                data_dir=path,
+            )
+            manager.initialize()
+
+            def run():
+                for ichunk in range(1 << (nq - np_)):
+                    manager.chunk_idx = ichunk
+                    manager.load_sv(qubits)
+                    manager.store_sv(qubits)
+
+            # Bytes read and written by a sweep
+            yield run, 2 * (16 << nq)
+            del manager
+
+    return BenchCase(
+        "storage.sweep/{}-q{}-p{}-l{}".format(
+            "direct" if direct else "buffered", nq, np_, nl
+        ),
+        setup,
+        unit=BANDWIDTH_UNIT,
+        default=nq < 30,
+    )
+
+
+def _partitioner_case(
+    name: str, circuit: str, nq: int, np_: int, nl: int, backend: str
+):
+    @contextmanager
+    def setup():
+        circ = generate_circuit(circuit, nq, backend=backend)
+        part = PartitionerProvider.get_partitioner(name, np=np_, nl=nl, backend=backend)
+        helper = CircuitHelperProvider.get_helper(backend)
+        helper.circ = circ
+
+        def run():
+            part.run(circ)
+
+        yield run, len(list(helper.instructions))
+
+    return BenchCase(
+        "partitioner.{}/{}-q{}-p{}-l{}-{}".format(name, circuit, nq, np_, nl, backend),
+        setup,
+        unit=THROUGHPUT_UNIT,
+    )
+
+
+def _indexes_case(nq: int, width: int):
+    qubits = list(range(0, nq, nq // width))[:width]
+
+    @contextmanager
+    def setup():
+        def run():
+            for k in range(1 << (nq - width)):
+                indexes(qubits, k)
+
+        yield run, 1
+
+    return BenchCase("util.indexes/q{}-w{}".format(nq, width), setup)
+
+
+def _simulator_case(backend: str, np_: int):
+    @contextmanager
+    def setup():
+        from qdao.simulator import SimulatorProvider
+
+        circ = generate_circuit("random", np_, depth=10, seed=0, backend=backend)
+        helper = CircuitHelperProvider.get_helper(backend)
+        helper.circ = circ
+        instrs = list(helper.instructions)
+        helper.circ = helper.gen_sub_circ(instrs, 0, np_).circ
+        sim = SimulatorProvider.get_simulator(backend)
+        chunk = np.zeros(1 << np_, dtype=np.complex128)
+        chunk[0] = 1.0
+
+        def run():
+            sim.run(helper.init_circ_from_sv(chunk))
+
+        yield run, len(instrs)
+
+    return BenchCase(
+        "simulator.run/{}-p{}".format(backend, np_), setup, unit=THROUGHPUT_UNIT
+    )
+
+
+def _init_case(kind: str, np_: int):
+    @contextmanager
+    def setup():
+        from qiskit import QuantumCircuit
+        from qiskit_aer import Aer
+
+        from qdao.qiskit.data_preparation.initializer import ChunkInitialize, Initialize
+
+        instr = {"chunk": ChunkInitialize, "initialize": Initialize}[kind]
+        sim = Aer.get_backend("aer_simulator")
+        sim.set_options(method="statevector")
+        # A chunk of a normalized statevector is not normalized
+        chunk = np.full(1 << np_, 0.5 ** (np_ / 2 + 1), dtype=np.complex128)
+
+        def run():
+            circ = QuantumCircuit(np_)
+            circ.append(instr(chunk), range(np_))
+            circ.save_state()
+            sim.run(circ).result()
+
+        yield run, 1
+
+    return BenchCase("qiskit.init/{}-p{}".format(kind, np_), setup, default=np_ <= 16)
+
+
+def _import_case(module: str):
+    code = "import time; st = time.perf_counter(); import {}; "
+    code += "print(time.perf_counter() - st)"
+
+    @contextmanager
+    def setup():
+        # The module must be imported by a fresh interpreter every time
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+        def run():
+            out = subprocess.run(
+                [sys.executable, "-c", code.format(module)],
+                capture_output=True,
+                text=True,
+                check=True,
+                env=env,
+            )
+            return float(out.stdout)
+
+        yield run, 1
+
+    return BenchCase("import.{}".format(module), setup)
+
+
+CASES = {
+    case.name: case
+    for case in [
+        _engine_case("random", 12, 10, 8, "disk"),
+        _engine_case("random", 12, 10, 8, "memory"),
+        _engine_case("qft", 12, 8, 4, "disk"),
+        _manager_case("load_sv", 16, 10, 6, "disk"),
+        _manager_case("store_sv", 16, 10, 6, "disk"),
+        _manager_case("load_sv", 16, 10, 6, "memory"),
+        _manager_case("store_sv", 16, 10, 6, "memory"),
+        _partitioner_case("static", "random", 16, 12, 8, "qiskit"),
+        _partitioner_case("static", "qaoa", 16, 12, 8, "qiskit"),
+        # UniQ only supports Quafu circuits
+        _partitioner_case("uniq", "ghz", 16, 12, 6, "quafu"),
+        _simulator_case("qiskit", 16),
+        _simulator_case("quafu", 16),
+        _indexes_case(16, 4),
+        _import_case("qdao"),
+        _direct_io_case(False, 20, 16, 12),
+        _direct_io_case(True, 20, 16, 12),
+    ]
+    # Overhead of initializing Aer from a chunk, only p16 by default
+    + [
+        _init_case(kind, np_)
+        for kind in ["chunk", "initialize"]
+        for np_ in range(16, 27, 2)
+    ]
+    # Buffered and direct I/O of a statevector larger than RAM, on request
+    + [_direct_io_case(direct, 30, 26, 20) for direct in [False, True]]
+}
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def _version(package: str) -> Optional[str]:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return None
+
+
+def machine_fingerprint() -> Dict[str, Any]:
+    """Hardware and software identity of this machine"""
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        memory = None
+    return {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpu": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "memory": memory,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "qiskit": _version("qiskit"),
+        "qiskit-aer": _version("qiskit-aer"),
+        "pyquafu": _version("pyquafu"),
+    }
+
+
+def fingerprint_id(fingerprint: Dict[str, Any]) -> str:
+    """Short stable id of a machine fingerprint"""
+    data = json.dumps(fingerprint, sort_keys=True).encode()
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def measure_cases(
+    patterns: Optional[List[str]] = None, repeat: int = 5, warmup: int = 1
+) -> Dict[str, Measurement]:
+    """
+    Measure benchmark cases.
+
+    Args:
+        patterns (Optional[List[str]]): Shell-style patterns of case names
+            in `CASES`, defaults to all default cases.
+        repeat (int): Number of timed runs of each case.
+        warmup (int): Number of untimed runs before the timed ones.
+
+    Returns:
+        Dict[str, Measurement]: Measurement of each selected case.
+    """
+    results = {}
+    for name, case in CASES.items():
+        if not patterns and not case.default:
+            continue
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        logging.info("Measure {}".format(name))
+        results[name] = case.measure(repeat=repeat, warmup=warmup)
+    return results
+
+
+def compare(
+    baseline: Dict[str, Measurement],
+    current: Dict[str, Measurement],
+    threshold: float = 0.1,
+) -> List[Dict[str, Any]]:
+    """
+    Find regressions of measurements against a baseline.
+
+    A case regresses if its median is slower than the baseline median by
+    more than `threshold`, and its IQR lies entirely on the slower side of
+    the baseline IQR. Cases missing in either side are ignored.
+
+    Args:
+        baseline (Dict[str, Measurement]): Baseline measurements.
+        current (Dict[str, Measurement]): Current measurements.
+        threshold (float): Tolerated relative slowdown of the median.
+
+    Returns:
+        List[Dict[str, Any]]: Case name, slowdown and both medians of each
+            regression.
+    """
+    regressions = []
+    for name in sorted(set(baseline) & set(current)):
+        base, cur = baseline[name], current[name]
+        slowdown = cur.slowdown(base)
+        if cur.higher_is_better:
+            separated = cur.q3 < base.q1
+        else:
+            separated = cur.q1 > base.q3
+        if slowdown > 1 + threshold and separated:
+            regressions.append(
+                {
+                    "case": name,
+                    "slowdown": slowdown,
+                    "baseline": base.median,
+                    "current": cur.median,
+                    "unit": cur.unit,
+                }
+            )
+    return regressions
+
+
+def _baseline_path(baseline_dir: str, fingerprint: Dict[str, Any]) -> str:
+    return os.path.join(baseline_dir, "{}.json".format(fingerprint_id(fingerprint)))
+
+
+def load_baseline(
+    baseline_dir: str, fingerprint: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Measurement]]:
+    """Load the baseline of a machine, `None` if not recorded"""
+    fingerprint = fingerprint or machine_fingerprint()
+    path = _baseline_path(baseline_dir, fingerprint)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    return {name: Measurement.from_dict(d) for name, d in data["cases"].items()}
+
+
+def save_baseline(
+    baseline_dir: str,
+    measurements: Dict[str, Measurement],
+    fingerprint: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Save measurements as the baseline of a machine.
+
+    Cases already recorded but not measured this time are kept.
+
+    Returns:
+        str: Path of the baseline file.
+    """
+    fingerprint = fingerprint or machine_fingerprint()
+    path = _baseline_path(baseline_dir, fingerprint)
+    cases = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            cases = json.load(f)["cases"]
+    cases.update({name: m.to_dict() for name, m in measurements.items()})
+
+    os.makedirs(baseline_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"machine": fingerprint, "cases": cases}, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m qdao.bench.regression",
+        description="Record benchmark baselines of this machine, or check "
+        "for regressions against them. Exit code is 1 on regression and "
+        "2 if no baseline is recorded for this machine.",
+    )
+    parser.add_argument("command", choices=["record", "check", "list"])
+    parser.add_argument(
+        "--baseline-dir",
+        default=os.path.join("benchmarks", "baselines"),
+        help="Directory of baseline files, one per machine fingerprint",
+    )
+    parser.add_argument(
+        "--cases", nargs="+", default=None, help="Shell-style patterns of case names"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Tolerated relative slowdown"
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the exit code"""
+    args = _build_parser().parse_args(argv)
+    if args.command == "list":
+        for name, case in CASES.items():
+            print(
+                "{} [{}]{}".format(
+                    name, case.unit, "" if case.default else " (on request)"
+                )
+            )
+        return 0
+
+    fingerprint = machine_fingerprint()
+    baseline = None
+    if args.command == "check":
+        baseline = load_baseline(args.baseline_dir, fingerprint)
+        if baseline is None:
+            print(
+                "No baseline for machine {} in {}".format(
+                    fingerprint_id(fingerprint), args.baseline_dir
+                ),
+                file=sys.stderr,
+            )
+            return 2
+
+    current = measure_cases(args.cases, repeat=args.repeat, warmup=args.warmup)
+    if args.command == "record":
+        path = save_baseline(args.baseline_dir, current, fingerprint)
+        print("Recorded {} cases to {}".format(len(current), path))
+        return 0
+
+    regressions = compare(baseline, current, threshold=args.threshold)
+    for name, m in current.items():
+        base = baseline.get(name)
+        print(
+            "{:<56} {:>12.4g} {:<8} (IQR {:.3g}), baseline {}".format(
+                name,
+                m.median,
+                m.unit,
+                m.iqr,
+                "{:.4g}".format(base.median) if base else "-",
+            )
+        )
+    for r in regressions:
+        print(
+            "REGRESSION {}: {:.2f}x slower ({:.4g} -> {:.4g} {})".format(
+                r["case"], r["slowdown"], r["baseline"], r["current"], r["unit"]
+            ),
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+I/O Trace Replay Module
+=======================
+
+This module replays an I/O trace, recorded by `qdao --io-trace` or an
+`SvManager` with `io_trace=True`, on stores of `qdao.storage.STORES` and
+reports one JSON result per store and repetition. Stores are compared on
+the access pattern of a real circuit without running simulators.
+
+Functions:
+----------
+
+- replay_stores: Replay a trace on several stores.
+- main: Command line entry point, `python -m qdao.bench.replay --help`.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from qdao.bench.runner import scratch_dir
+from qdao.storage import STORES, IoTrace, replay
+
+
+def replay_stores(
+    trace: np.ndarray,
+    stores: List[str],
+    store_args: Optional[Dict[str, Dict[str, Any]]] = None,
+    init_dir: Optional[str] = None,
+    repeat: int = 1,
+    workdir: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Replay a trace on several stores.
+
+    Args:
+        trace (np.ndarray): The I/O trace, see `IoTrace.load`.
+        stores (List[str]): Names of stores in `STORES`.
+        store_args (Optional[Dict[str, Dict[str, Any]]]): Additional
+            arguments of each store, e.g., `{"sharded": {"num_shards": 8}}`.
+        init_dir (Optional[str]): Directory of `sv{i}.npy` storage units
+            populating the stores, e.g., `data/` after the recorded run,
+            otherwise stores are populated with random amplitudes.
+        repeat (int): Number of replays of each store.
+        workdir (Optional[str]): Directory under which a scratch directory
+            holding the store is created, defaults to the system temp dir.
+
+    Yields:
+        Dict[str, Any]: The store name and the result of `replay`.
+    """
+    store_args = store_args or {}
+    init = None
+    if init_dir is not None:
+        init = lambda unit: np.load(os.path.join(init_dir, "sv{}.npy".format(unit)))
+    for name in stores:
+        for _ in range(repeat):
+            with scratch_dir(workdir) as path:
+                store = STORES[name](path, **store_args.get(name, {}))
+                result = {"name": name}
+                result.update(replay(trace, store, init=init))
+                yield result
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m qdao.bench.replay",
+        description="Replay an I/O trace of storage units on stores, one "
+        "JSON result per line.",
+    )
+    parser.add_argument("trace", help="Path of the io_trace.npy file")
+    parser.add_argument(
+        "--stores", nargs="+", default=sorted(STORES), choices=sorted(STORES)
+    )
+    parser.add_argument("--num-shards", type=int, default=4)
+    parser.add_argument(
+        "--level", type=int, default=1, help="zlib level of the compressed store"
+    )
+    parser.add_argument(
+        "--init-dir",
+        default=None,
+        help="Directory of storage units populating the stores, random "
+        "amplitudes if not given",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--workdir", default=None, help="Directory for scratch stores")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the exit code"""
+    args = _build_parser().parse_args(argv)
+    trace = IoTrace.load(args.trace)
+    store_args = {
+        "sharded": {"num_shards": args.num_shards},
+        "compressed": {"level": args.level},
+    }
+    for result in replay_stores(
+        trace,
+        args.stores,
+        store_args=store_args,
+        init_dir=None if args.init_dir is None else os.path.abspath(args.init_dir),
+        repeat=args.repeat,
+        workdir=args.workdir,
+    ):
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
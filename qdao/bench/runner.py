@@ -0,0 +1,338 @@
+"""
+Benchmark Runner Module
+=======================
+
+This module runs `Engine` on generated circuits over a sweep of configurations
+and reports machine-readable results, one JSON object per run. Besides the
+total wall time, time spent in each phase of a run is recorded, so that a
+regression can be attributed to the partitioner, the storage or the simulator.
+
+Classes:
+--------
+
+- BenchConfig: One configuration of a benchmark sweep.
+
+Functions:
+----------
+
+- scratch_dir: Create a fresh directory for storage units, removed on exit.
+- run_config: Run one configuration and return its result.
+- sweep: Run the cartesian product of configuration values.
+- main: Command line entry point, `python -m qdao.bench --help`.
+"""
+import argparse
+import itertools
+import json
+import logging
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from qdao.bench.circuits import CIRCUITS, generate_circuit
+from qdao.circuit import PARTITIONERS, CircuitHelperProvider, PartitionerProvider
+from qdao.engine import PHASES, Engine, PhaseTimer
+from qdao.estimator import _max_gate_width
+
+
+class BenchConfig:
+    """
+    One configuration of a benchmark sweep.
+
+    Attributes:
+        circuit (str): Circuit family in `CIRCUITS`.
+        num_qubits (int): Number of qubits.
+        depth (int): Number of layers of the circuit.
+        num_primary (int): Number of primary qubits.
+        num_local (int): Number of local qubits.
+        partitioner (str): Partitioner in `PARTITIONERS`.
+        backend (str): Backend simulator.
+        sv_location (str): Location of storage units ('memory' or 'disk').
+        is_parallel (bool): Whether storage units are loaded and stored in parallel.
+        num_workers (int): Number of worker processes, 1 disables distributed mode.
+        seed (int): Seed of the circuit generator.
+    """
+
+    def __init__(
+        self,
+        circuit: str = "random",
+        num_qubits: int = 12,
+        depth: int = 10,
+        num_primary: int = 10,
+        num_local: int = 8,
+        partitioner: str = "static",
+        backend: str = "qiskit",
+        sv_location: str = "disk",
+        is_parallel: bool = False,
+        num_workers: int = 1,
+        seed: int = 0,
+    ) -> None:
+        self.circuit = circuit
+        self.num_qubits = num_qubits
+        self.depth = depth
+        self.num_primary = num_primary
+        self.num_local = num_local
+        self.partitioner = partitioner
+        self.backend = backend
+        self.sv_location = sv_location
+        self.is_parallel = is_parallel
+        self.num_workers = num_workers
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return {
+            "circuit": self.circuit,
+            "num_qubits": self.num_qubits,
+            "depth": self.depth,
+            "num_primary": self.num_primary,
+            "num_local": self.num_local,
+            "partitioner": self.partitioner,
+            "backend": self.backend,
+            "sv_location": self.sv_location,
+            "is_parallel": self.is_parallel,
+            "num_workers": self.num_workers,
+            "seed": self.seed,
+        }
+
+    def __repr__(self) -> str:
+        return "BenchConfig({})".format(
+            ", ".join("{}={}".format(k, v) for k, v in self.to_dict().items())
+        )
+
+
+@contextmanager
+def scratch_dir(root: Optional[str] = None) -> Iterator[str]:
+    """Create a fresh directory for storage units, removed on exit
+
+    Args:
+        root (Optional[str]): Directory under which it is created, defaults
+            to the system temp dir.
+    """
+    path = tempfile.mkdtemp(prefix="qdao-bench-", dir=root)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def run_config(
+    config: BenchConfig, circuit: Any = None, workdir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run one configuration and return its result.
+
+    Args:
+        config (BenchConfig): The configuration.
+        circuit (Any): The generated circuit, generated from `config` if not given.
+        workdir (Optional[str]): Directory under which a scratch directory
+            holding storage units is created, defaults to the system temp dir.
+
+    Returns:
+        Dict[str, Any]: The configuration, number of gates and sub-circuits,
+            total wall time in seconds (`time`) and time of each of `PHASES`.
+    """
+    if circuit is None:
+        circuit = generate_circuit(
+            config.circuit,
+            config.num_qubits,
+            depth=config.depth,
+            seed=config.seed,
+            backend=config.backend,
+        )
+    helper = CircuitHelperProvider.get_helper(config.backend)
+    helper.circ = circuit
+
+    with scratch_dir(workdir) as path:
+        part = PartitionerProvider.get_partitioner(
+            config.partitioner,
+            np=config.num_primary,
+            nl=config.num_local,
+            backend=config.backend,
+        )
+        engine = Engine(
+            circuit=circuit,
+            partitioner=part,
+            num_primary=config.num_primary,
+            num_local=config.num_local,
+            backend=config.backend,
+            sv_location=config.sv_location,
+            is_parallel=config.is_parallel,
+            num_workers=config.num_workers,
+            data_dir=path,
+        )
+        timer = PhaseTimer()
+        timer.attach(engine)
+        st = perf_counter()
+        engine.run()
+        elapsed = perf_counter() - st
+        transfer_stats = engine.transfer_stats
+        del engine
+
+    result = config.to_dict()
+    result.update(
+        {
+            "num_gates": len(list(helper.instructions)),
+            "num_sub_circuits": timer.num_sub_circuits,
+            "num_storage_ops": timer.num_storage_ops,
+            "time": elapsed,
+            "phases": timer.phases,
+        }
+    )
+    if transfer_stats is not None:
+        result["transfer_stats"] = transfer_stats
+    return result
+
+
+def sweep(
+    circuits: Sequence[str] = ("random",),
+    num_qubits: Sequence[int] = (12,),
+    num_primary: Sequence[int] = (10,),
+    num_local: Sequence[int] = (8,),
+    partitioners: Sequence[str] = ("static",),
+    backends: Sequence[str] = ("qiskit",),
+    sv_locations: Sequence[str] = ("disk",),
+    is_parallel: Sequence[bool] = (False,),
+    num_workers: Sequence[int] = (1,),
+    depth: int = 10,
+    seed: int = 0,
+    repeat: int = 1,
+    workdir: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run the cartesian product of configuration values.
+
+    Combinations that cannot be simulated, e.g., `num_local >= num_primary`
+    or `num_primary - num_local` smaller than the widest gate, are skipped.
+    A configuration failing to run yields a result with an `error` instead
+    of aborting the sweep.
+
+    Args:
+        circuits (Sequence[str]): Circuit families in `CIRCUITS`.
+        num_qubits (Sequence[int]): Numbers of qubits.
+        num_primary (Sequence[int]): Numbers of primary qubits.
+        num_local (Sequence[int]): Numbers of local qubits.
+        partitioners (Sequence[str]): Partitioners in `PARTITIONERS`.
+        backends (Sequence[str]): Backend simulators.
+        sv_locations (Sequence[str]): Locations of storage units.
+        is_parallel (Sequence[bool]): Whether to load and store in parallel.
+        num_workers (Sequence[int]): Numbers of worker processes.
+        depth (int): Number of layers of the circuits.
+        seed (int): Seed of the circuit generators.
+        repeat (int): Number of runs of each configuration.
+        workdir (Optional[str]): Directory for scratch storage, see `run_config`.
+
+    Yields:
+        Dict[str, Any]: Result of each run, see `run_config`, with the
+            index of the run in `repeat`.
+    """
+    for circ_name, nq, backend in itertools.product(circuits, num_qubits, backends):
+        circuit = generate_circuit(
+            circ_name, nq, depth=depth, seed=seed, backend=backend
+        )
+        helper = CircuitHelperProvider.get_helper(backend)
+        helper.circ = circuit
+        width = _max_gate_width(helper)
+
+        for np_, nl, part, loc, par, nw in itertools.product(
+            num_primary, num_local, partitioners, sv_locations, is_parallel, num_workers
+        ):
+            if not (0 < nl < np_ <= nq) or np_ - nl < width:
+                continue
+            config = BenchConfig(
+                circuit=circ_name,
+                num_qubits=nq,
+                depth=depth,
+                num_primary=np_,
+                num_local=nl,
+                partitioner=part,
+                backend=backend,
+                sv_location=loc,
+                is_parallel=par,
+                num_workers=nw,
+                seed=seed,
+            )
+            for i in range(repeat):
+                logging.info("Run {} ({}/{})".format(config, i + 1, repeat))
+                try:
+                    result = run_config(config, circuit=circuit, workdir=workdir)
+                except Exception as e:
+                    # E.g., a partitioner not supporting the backend
+                    logging.warning("{} failed: {!r}".format(config, e))
+                    result = dict(config.to_dict(), error=repr(e))
+                result["repeat"] = i
+                yield result
+
+
+def _parse_bool(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise argparse.ArgumentTypeError("Expect a boolean, got {}".format(value))
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m qdao.bench",
+        description="Run Engine over a sweep of generated circuits and "
+        "configurations, one JSON result per line.",
+    )
+    parser.add_argument(
+        "--circuits", nargs="+", default=["random"], choices=sorted(CIRCUITS)
+    )
+    parser.add_argument("--num-qubits", nargs="+", type=int, default=[12])
+    parser.add_argument("--num-primary", nargs="+", type=int, default=[10])
+    parser.add_argument("--num-local", nargs="+", type=int, default=[8])
+    parser.add_argument(
+        "--partitioners", nargs="+", default=["static"], choices=sorted(PARTITIONERS)
+    )
+    parser.add_argument(
+        "--backends", nargs="+", default=["qiskit"], choices=["qiskit", "quafu"]
+    )
+    parser.add_argument(
+        "--sv-locations", nargs="+", default=["disk"], choices=["disk", "memory"]
+    )
+    parser.add_argument("--is-parallel", nargs="+", type=_parse_bool, default=[False])
+    parser.add_argument("--num-workers", nargs="+", type=int, default=[1])
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--workdir", default=None, help="Directory for scratch storage units"
+    )
+    parser.add_argument(
+        "--output", default="-", help="File to write results to, '-' for stdout"
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the exit code"""
+    args = _build_parser().parse_args(argv)
+    results = sweep(
+        circuits=args.circuits,
+        num_qubits=args.num_qubits,
+        num_primary=args.num_primary,
+        num_local=args.num_local,
+        partitioners=args.partitioners,
+        backends=args.backends,
+        sv_locations=args.sv_locations,
+        is_parallel=args.is_parallel,
+        num_workers=args.num_workers,
+        depth=args.depth,
+        seed=args.seed,
+        repeat=args.repeat,
+        workdir=args.workdir,
+    )
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
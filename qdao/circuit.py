@@ -6,6 +6,12 @@ This module provides methods to partition original circuit into sub-circuits.
 
 Classes:
     QdaoCircuit: A wrapper for quantum circuits with associated real qubits.
+    RemappedGate: A gate of a sub-circuit recorded without copying the original gate.
+    QdaoStorageOp: Base class of operations executed directly on storage units.
+    DiagonalOp: A diagonal gate executed as a phase multiply on storage units.
+    PermutationOp: A permutation gate executed by relabeling storage units.
+    LayoutOp: A change of the logical-to-physical qubit layout.
+    GateFusion: Pre-pass that fuses gates on a small qubit set into unitary blocks.
     BasePartitioner: Abstract base class for circuit partitioning.
     BaselinePartitioner: Implements a naive circuit partitioning approach.
     StaticPartitioner: Partitioner that traverses operations in their original order.
@@ -17,39 +23,324 @@ Classes:
 """
 
 import logging
-from typing import Any, List
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 
-from qdao.qiskit.circuit import QiskitCircuitWrapper
-from qdao.quafu.circuit import QuafuCircuitHelper
+import numpy as np
+
+from qdao.exceptions import QdaoError
+from qdao.util import LazyRegistry
 
 
 class QdaoCircuit:
     """
     A class to represent a quantum circuit along with its real qubits.
 
+    A sub-circuit can also be described by a list of `RemappedGate` and a
+    `builder`, in which case the backend circuit is only materialized when
+    `circ` is first accessed.
+
     Attributes:
         circ (Any): The underlying quantum circuit object.
         real_qubits (List[int]): List of real qubits associated with the circuit.
+        gates (Optional[List[RemappedGate]]): Remapped gates of a lazily built circuit.
     """
-    def __init__(self, circ: Any, real_qubits: List[int]) -> None:
+    def __init__(
+        self,
+        circ: Any,
+        real_qubits: List[int],
+        gates: Optional[List["RemappedGate"]] = None,
+        builder: Optional[Callable[[List["RemappedGate"]], Any]] = None,
+    ) -> None:
         self._circ = circ
         self._real_qubits = real_qubits
+        self._gates = gates
+        self._builder = builder
 
     @property
     def circ(self) -> Any:
-        """Gets the underlying quantum circuit."""
+        """Gets the underlying quantum circuit, built once on first access."""
+        if self._circ is None and self._builder is not None:
+            self._circ = self._builder(self._gates)
+            self._builder = None
         return self._circ
 
     @circ.setter
     def circ(self, circ: Any):
         """Sets the underlying quantum circuit."""
         self._circ = circ
+        self._builder = None
 
     @property
     def real_qubits(self) -> List[int]:
         """Gets the list of real qubits."""
         return self._real_qubits
 
+    @property
+    def gates(self) -> Optional[List["RemappedGate"]]:
+        """Gets the remapped gates, `None` if the circuit is built eagerly."""
+        return self._gates
+
+
+class RemappedGate:
+    """
+    A gate of a sub-circuit, recorded by reference to the gate of the
+    original circuit and its positions in the sub-circuit. The original
+    gate is shared, never copied nor modified.
+
+    Attributes:
+        gate (Any): The gate of the original circuit.
+        pos (Tuple[int, ...]): Positions of the gate in the sub-circuit.
+    """
+
+    __slots__ = ("gate", "pos")
+
+    def __init__(self, gate: Any, pos: Tuple[int, ...]) -> None:
+        self.gate = gate
+        self.pos = pos
+
+    @property
+    def kind(self) -> str:
+        """Gets the name of the gate."""
+        return getattr(self.gate, "name", type(self.gate).__name__)
+
+    @property
+    def params(self) -> Any:
+        """Gets the parameters of the gate, `None` if not parameterized."""
+        return getattr(self.gate, "paras", None)
+
+
+class QdaoStorageOp(ABC):
+    """
+    An operation executed directly on storage units by `SvManager` instead
+    of being simulated chunk by chunk. Partitioners emit such operations
+    between sub-circuits.
+
+    Attributes:
+        qubits (List[int]): Qubits the operation acts on.
+    """
+
+    def __init__(self, qubits: List[int]) -> None:
+        self._qubits = qubits
+
+    @property
+    def qubits(self) -> List[int]:
+        """Gets the qubits the operation acts on."""
+        return self._qubits
+
+    @abstractmethod
+    def apply(self, manager: Any) -> None:
+        """Applies the operation through the statevector manager."""
+
+
+class DiagonalOp(QdaoStorageOp):
+    """
+    A diagonal gate, e.g., RZ, CZ, CP, T, S.
+
+    Attributes:
+        diag (np.ndarray): Diagonal of the gate matrix in little-endian order.
+    """
+
+    def __init__(self, qubits: List[int], diag: np.ndarray) -> None:
+        super().__init__(qubits)
+        self._diag = diag
+
+    @property
+    def diag(self) -> np.ndarray:
+        return self._diag
+
+    def apply(self, manager: Any) -> None:
+        manager.apply_diagonal(self._qubits, self._diag)
+
+
+class PermutationOp(QdaoStorageOp):
+    """
+    A basis permutation gate on global qubits, e.g., X, CX, SWAP.
+
+    Attributes:
+        perm (np.ndarray): `perm[j] = i` if basis state `j` is mapped to `i`.
+    """
+
+    def __init__(self, qubits: List[int], perm: np.ndarray) -> None:
+        super().__init__(qubits)
+        self._perm = perm
+
+    @property
+    def perm(self) -> np.ndarray:
+        return self._perm
+
+    def apply(self, manager: Any) -> None:
+        manager.apply_permutation(self._qubits, self._perm)
+
+
+class LayoutOp(QdaoStorageOp):
+    """
+    A change of the logical-to-physical qubit layout. Sub-circuits after it
+    act on physical qubits.
+
+    Attributes:
+        layout (List[int]): Physical position of each logical qubit.
+    """
+
+    def __init__(self, layout: List[int]) -> None:
+        super().__init__([q for q, p in enumerate(layout) if q != p])
+        self._layout = layout
+
+    @property
+    def layout(self) -> List[int]:
+        return self._layout
+
+    def apply(self, manager: Any) -> None:
+        manager.apply_layout(self._layout)
+
+
+def apply_matrix(
+    unitary: np.ndarray, matrix: np.ndarray, positions: List[int]
+) -> np.ndarray:
+    """
+    Left-multiply `unitary` with `matrix` acting on `positions`.
+
+    Both matrices are in little-endian order, i.e., bit `i` of a row index
+    of `matrix` corresponds to `positions[i]`, and bit `p` of a row index
+    of `unitary` corresponds to position `p`.
+
+    Args:
+        unitary (np.ndarray): A `(1<<k, 1<<k)` matrix.
+        matrix (np.ndarray): A `(1<<g, 1<<g)` matrix with `g = len(positions)`.
+        positions (List[int]): Positions in `range(k)` that `matrix` acts on.
+
+    Returns:
+        np.ndarray: The product as a `(1<<k, 1<<k)` matrix.
+    """
+    k = unitary.shape[0].bit_length() - 1
+    g = len(positions)
+    # numpy reshapes in big-endian order, axis `a` holds bit `k-1-a`
+    u_axes = [k - 1 - positions[g - 1 - a] for a in range(g)]
+    res = np.tensordot(
+        matrix.reshape([2] * (2 * g)),
+        unitary.reshape([2] * k + [1 << k]),
+        axes=(list(range(g, 2 * g)), u_axes),
+    )
+    return np.moveaxis(res, list(range(g)), u_axes).reshape(1 << k, 1 << k)
+
+
+class _FusedBlock:
+    """Gates collected into one fused block"""
+
+    def __init__(self) -> None:
+        self.qubits = set()
+        self.instrs = []
+        self.matrices = []
+
+    def merge(self, other: "_FusedBlock") -> None:
+        self.qubits |= other.qubits
+        self.instrs += other.instrs
+        self.matrices += other.matrices
+
+    def add(self, instr: Any, qubits: List[int], matrix: np.ndarray) -> None:
+        self.qubits |= set(qubits)
+        self.instrs.append((instr, qubits))
+        self.matrices.append(matrix)
+
+
+class GateFusion:
+    """
+    Fuse gates acting on a small qubit set into unitary blocks.
+
+    Gates are collected into blocks of at most `max_qubits` qubits. A gate
+    joins the open blocks sharing qubits with it if their union is small
+    enough, otherwise those blocks are closed. Since open blocks act on
+    disjoint qubits, they commute with each other and with every gate that
+    has been emitted while they were open, so reordering is safe.
+    Instructions without a matrix (e.g., measure, barrier, save) close the
+    blocks on their qubits and are emitted unchanged.
+
+    Each fused block becomes a single instruction in `gen_sub_circ`, which
+    saves one gate application per chunk for every gate that is fused away.
+    The circuit helper must generate such instructions, i.e., implement
+    `gen_unitary_instr(matrix, qubits)`.
+
+    Attributes:
+        max_qubits (int): Maximum number of qubits of a fused block.
+    """
+
+    def __init__(self, circ_helper: Any, max_qubits: int = 2) -> None:
+        if not callable(getattr(circ_helper, "gen_unitary_instr", None)):
+            raise QdaoError(
+                "Gate fusion is not supported by {}".format(type(circ_helper).__name__)
+            )
+        self._circ_helper = circ_helper
+        self.max_qubits = max_qubits
+
+    def run(self, instrs: List[Any]) -> List[Any]:
+        """
+        Fuse a list of instructions.
+
+        Args:
+            instrs (List[Any]): Instructions of the circuit set to the helper.
+
+        Returns:
+            List[Any]: Instructions where fused gates are replaced by
+                unitary instructions.
+        """
+        res = []
+        open_blocks = {}
+
+        def close(block):
+            for q in block.qubits:
+                open_blocks.pop(q, None)
+            res.append(self._gen_instr(block))
+
+        for instr in instrs:
+            qubits = list(self._circ_helper.get_instr_qubits(instr))
+            touched = []
+            for q in qubits:
+                block = open_blocks.get(q)
+                if block is not None and all(b is not block for b in touched):
+                    touched.append(block)
+
+            matrix = None
+            if len(qubits) <= self.max_qubits:
+                matrix = self._circ_helper.get_instr_matrix(instr)
+
+            if matrix is None:
+                for block in touched:
+                    close(block)
+                res.append(instr)
+                continue
+
+            union = set(qubits).union(*(b.qubits for b in touched))
+            new_block = _FusedBlock()
+            if len(union) <= self.max_qubits:
+                for block in touched:
+                    new_block.merge(block)
+            else:
+                for block in touched:
+                    close(block)
+            new_block.add(instr, qubits, matrix)
+            for q in new_block.qubits:
+                open_blocks[q] = new_block
+
+        closed = []
+        for block in open_blocks.values():
+            if all(b is not block for b in closed):
+                closed.append(block)
+        for block in closed:
+            close(block)
+
+        logging.info("Gate fusion: {} instructions -> {}".format(len(instrs), len(res)))
+        return res
+
+    def _gen_instr(self, block: _FusedBlock) -> Any:
+        if len(block.instrs) == 1:
+            return block.instrs[0][0]
+        qubits = sorted(block.qubits)
+        pos = {q: i for i, q in enumerate(qubits)}
+        unitary = np.eye(1 << len(qubits), dtype=np.complex128)
+        for (_, instr_qubits), matrix in zip(block.instrs, block.matrices):
+            unitary = apply_matrix(unitary, matrix, [pos[q] for q in instr_qubits])
+        return self._circ_helper.gen_unitary_instr(unitary, qubits)
+
 
 class BasePartitioner:
     """
@@ -59,12 +350,52 @@ class BasePartitioner:
         np (int): Number of primary qubits.
         nl (int): Number of local qubits.
         backend (str): The backend used for the partitioning process.
+        fusion (int): Maximum number of qubits of a fused gate block,
+            0 disables gate fusion before partitioning.
+        storage_ops (bool): Whether to execute diagonal gates and permutation
+            gates on global qubits as `QdaoStorageOp` instead of simulating
+            them, see `SUPPORTS_STORAGE_OPS`.
+        remap_qubits (bool): Whether to map the most frequently used qubits
+            to local positions by a `LayoutOp` at the beginning, see
+            `SUPPORTS_REMAP_QUBITS`.
     """
 
-    def __init__(self, np=4, nl=2, backend="qiskit") -> None:
+    # Maximum number of qubits of a gate to be checked for storage-level execution
+    MAX_STORAGE_OP_QUBITS = 3
+    # Whether a partitioner implements `storage_ops` and `remap_qubits`
+    SUPPORTS_STORAGE_OPS = False
+    SUPPORTS_REMAP_QUBITS = False
+
+    def __init__(
+        self,
+        np=4,
+        nl=2,
+        backend="qiskit",
+        fusion=0,
+        storage_ops=False,
+        remap_qubits=False,
+    ) -> None:
         self._np = np
         self._nl = nl
         self._circ_helper = CircuitHelperProvider.get_helper(backend)
+        self._fusion = fusion
+        # Fails early if the backend cannot fuse gates
+        self._gate_fusion = (
+            GateFusion(self._circ_helper, fusion) if fusion > 0 else None
+        )
+        if storage_ops and not self.SUPPORTS_STORAGE_OPS:
+            raise QdaoError(
+                "Storage-level operations are not supported by {}".format(
+                    type(self).__name__
+                )
+            )
+        if remap_qubits and not self.SUPPORTS_REMAP_QUBITS:
+            raise QdaoError(
+                "Qubit remapping is not supported by {}".format(type(self).__name__)
+            )
+        self._storage_ops = storage_ops
+        self._remap_qubits = remap_qubits
+        self._layout = None
 
     @property
     def np(self):
@@ -86,6 +417,100 @@ class BasePartitioner:
         """Sets the number of local qubits."""
         self._nl = n
 
+    @property
+    def layout(self):
+        """Gets the qubit layout chosen by the last run, `None` means identity."""
+        return self._layout
+
+    def _get_instructions(self, remap: bool = True) -> List[Any]:
+        """Instructions of the circuit set to the helper, fused if enabled
+
+        If qubit remapping is enabled, the layout is chosen and set to the
+        helper, i.e., qubits of instructions are physical afterwards.
+        """
+        self._circ_helper.layout = None
+        instrs = self._circ_helper.instructions
+        if self._gate_fusion is not None:
+            instrs = self._gate_fusion.run(instrs)
+        self._layout = None
+        if remap and self._remap_qubits:
+            self._layout = self._choose_layout(instrs)
+            self._circ_helper.layout = self._layout
+        return instrs
+
+    def _choose_layout(self, instrs: List[Any]):
+        """Map the `nl` most frequently used qubits to local positions
+
+        Qubits that are already local and selected keep their positions,
+        each newly selected qubit is swapped with an unselected local qubit.
+        """
+        nq = self._circ_helper.num_qubits
+        counts = [0] * nq
+        for instr in instrs:
+            for q in self._circ_helper.get_instr_qubits(instr):
+                counts[q] += 1
+        selected = sorted(range(nq), key=lambda q: (-counts[q], q))[: self._nl]
+
+        incoming = sorted(q for q in selected if q >= self._nl)
+        if not incoming:
+            return None
+        outgoing = sorted(q for q in range(self._nl) if q not in selected)
+        layout = list(range(nq))
+        for g, l in zip(incoming, outgoing):
+            layout[g], layout[l] = l, g
+        logging.info("Qubit layout: {}".format(layout))
+        return layout
+
+    def _layout_ops(self) -> List[Any]:
+        """Storage-level operation switching to the chosen layout, if any"""
+        if self._layout is None:
+            return []
+        return [LayoutOp(self._layout)]
+
+    def _get_storage_op(self, instr: Any, qubits: List[int]):
+        """Storage-level operation of an instruction acting on global qubits,
+        `None` if it has to be simulated"""
+        if not self._storage_ops or len(qubits) > self.MAX_STORAGE_OP_QUBITS:
+            return None
+        if all(q < self._nl for q in qubits):
+            return None
+        mat = self._circ_helper.get_instr_matrix(instr)
+        if mat is None:
+            return None
+
+        diag = np.diag(mat)
+        if np.allclose(mat, np.diag(diag)):
+            return DiagonalOp(qubits, diag.copy())
+
+        # Relabeling units needs every qubit to be global
+        if any(q < self._nl for q in qubits):
+            return None
+        if np.allclose(mat, np.round(mat.real)) and np.all(
+            np.isclose(np.abs(mat).sum(axis=0), 1.0)
+        ):
+            perm = np.argmax(np.abs(mat), axis=0)
+            if len(set(perm)) == len(perm) and np.allclose(
+                mat[perm, np.arange(len(perm))], 1.0
+            ):
+                return PermutationOp(qubits, perm)
+        return None
+
+    def iter_run(self, circuit: Any) -> Iterator[Any]:
+        """
+        Lazily partitions the given circuit into sub-circuits.
+
+        Each sub-circuit is generated only when it is consumed, so that
+        simulation can start before the whole circuit is partitioned.
+
+        Args:
+            circuit (Any): The quantum circuit to be partitioned.
+
+        Yields:
+            QdaoCircuit: Partitioned sub-circuits, interleaved with
+                `QdaoStorageOp` if enabled.
+        """
+        return iter(())
+
     def run(self, circuit: Any) -> List[QdaoCircuit]:
         """
         Partitions the given circuit into sub-circuits.
@@ -96,82 +521,117 @@ class BasePartitioner:
         Returns:
             List[QdaoCircuit]: A list of partitioned sub-circuits.
         """
-        sub_circs = []
-
-        return sub_circs
+        return list(self.iter_run(circuit))
 
 
 class BaselinePartitioner(BasePartitioner):
     """A naive implementation of circuit partitioning."""
 
-    def run(self, circuit: Any) -> List[QdaoCircuit]:
+    SUPPORTS_REMAP_QUBITS = True
+
+    def iter_run(self, circuit: Any) -> Iterator[Any]:
         """
         Runs the baseline partitioning algorithm on the given circuit.
 
         Args:
             circuit (Any): The quantum circuit to be partitioned.
 
-        Returns:
-            List[QdaoCircuit]: A list of partitioned sub-circuits.
+        Yields:
+            Any: Partitioned sub-circuits, preceded by a `LayoutOp` if
+                qubit remapping is enabled.
         """
         # Set cicuit of circuit helper
         self._circ_helper.circ = circuit
 
-        sub_circs = []
+        instrs = self._get_instructions()
+        yield from self._layout_ops()
 
         qset = set()
-        for instr in self._circ_helper.instructions:
+        for instr in instrs:
             # Each instruction forms a new sub-circuit
             sub_circ = self._circ_helper.gen_sub_circ([instr], self._nl, self._np)
-            sub_circs.append(sub_circ)
-            logging.info("Find sub-circuit: {}, qubits: {}".format(sub_circ.circ, qset))
-        return sub_circs
+            logging.info(
+                "Find sub-circuit: {}, qubits: {}".format(
+                    sub_circ.real_qubits, self._circ_helper.get_instr_qubits(instr)
+                )
+            )
+            yield sub_circ
 
 
 class StaticPartitioner(BasePartitioner):
-    """Static Partitioner that traverses operations in the original order."""
+    """Static Partitioner that traverses operations in the original order.
+
+    With `storage_ops` enabled, diagonal and permutation gates on global
+    qubits that are not in the current sub-circuit are deferred as
+    `QdaoStorageOp` until the current sub-circuit is closed, instead of
+    being counted against the `np - nl` budget. Their qubits are blocked
+    for the current sub-circuit, i.e., a later gate that does not commute
+    with them closes the current sub-circuit.
+    """
 
-    def run(self, circuit: Any) -> List[QdaoCircuit]:
+    SUPPORTS_STORAGE_OPS = True
+    SUPPORTS_REMAP_QUBITS = True
+
+    def iter_run(self, circuit: Any) -> Iterator[Any]:
         """
         Runs the static partitioning algorithm on the given circuit.
 
         Args:
             circuit (Any): The quantum circuit to be partitioned.
 
-        Returns:
-            List[QdaoCircuit]: A list of partitioned sub-circuits.
+        Yields:
+            Any: Partitioned sub-circuits (`QdaoCircuit`), interleaved with
+                `QdaoStorageOp` if enabled.
         """
         # Set cicuit of circuit helper
         self._circ_helper.circ = circuit
 
-        sub_circs = []
+        all_instrs = self._get_instructions()
+        yield from self._layout_ops()
 
         instrs = []
         qset = set()
-        for instr in self._circ_helper.instructions:
+        # Storage-level operations deferred after current sub-circuit
+        pending = []
+        blocked = set()
+
+        def close():
+            sub_circs = []
+            if instrs:
+                sub_circ = self._circ_helper.gen_sub_circ(instrs, self._nl, self._np)
+                sub_circs.append(sub_circ)
+                logging.info(
+                    "Find sub-circuit: {} gates, qubits: {}".format(len(instrs), qset)
+                )
+            return sub_circs + pending
+
+        for instr in all_instrs:
+            qubits = list(self._circ_helper.get_instr_qubits(instr))
             qs = set()
-            for q in self._circ_helper.get_instr_qubits(instr):
+            for q in qubits:
                 if q >= self._nl:
                     qs.add(q)
 
-            if len(qset | qs) <= (self._np - self._nl):
+            storage_op = self._get_storage_op(instr, qubits)
+            if storage_op is not None and not (
+                blocked.isdisjoint(qubits) and qs <= qset
+            ):
+                pending.append(storage_op)
+                blocked |= set(qubits)
+                continue
+
+            if blocked.isdisjoint(qubits) and len(qset | qs) <= (self._np - self._nl):
                 qset = qset | qs
                 instrs.append(instr)
             else:
-                sub_circ = self._circ_helper.gen_sub_circ(instrs, self._nl, self._np)
-                sub_circs.append(sub_circ)
-                logging.info(
-                    "Find sub-circuit: {}, qubits: {}".format(sub_circ.circ, qset)
-                )
+                yield from close()
                 # FIXME: Here the instr's qubits size may exceed
                 # (self._np - self._nl)
                 instrs = [instr]
                 qset = qs
-        if instrs:
-            sub_circ = self._circ_helper.gen_sub_circ(instrs, self._nl, self._np)
-            sub_circs.append(sub_circ)
-        logging.info("Find sub-circuit: {}, qubits: {}".format(sub_circ.circ, qset))
-        return sub_circs
+                pending = []
+                blocked = set()
+        yield from close()
 
 
 class DependencyMatrix:
@@ -296,22 +756,22 @@ class UniQPartitioner(BasePartitioner):
         [1] https://ieeexplore.ieee.org/abstract/document/10045784/
     """
 
-    def run(self, circuit: Any) -> List[QdaoCircuit]:
+    def iter_run(self, circuit: Any) -> Iterator[QdaoCircuit]:
         """
         Runs the UniQ partitioning algorithm on the given circuit.
 
         Args:
             circuit (Any): The quantum circuit to be partitioned.
 
-        Returns:
-            List[QdaoCircuit]: A list of partitioned sub-circuits.
+        Yields:
+            QdaoCircuit: Partitioned sub-circuits.
         """
         self._circ_helper.circ = circuit
         ops = []
-        ops += self._circ_helper.instructions
+        # The dependency matrix works on logical qubits
+        ops += self._get_instructions(remap=False)
         active = self._np
         m = self._circ_helper.circ.num
-        sub_circs = []
         while len(ops) > 0:
             need_qubit = active
             instrs = []
@@ -332,9 +792,8 @@ class UniQPartitioner(BasePartitioner):
                         instrs.append(ops[i])
                         ops.pop(i)
             sub_circ = self._circ_helper.gen_sub_circ(instrs, self._nl, self._np)
-            sub_circs.append(sub_circ)
-        logging.info("Find sub-circuit: {}".format(sub_circ.circ))
-        return sub_circs
+            logging.info("Find sub-circuit: {}".format(sub_circ.real_qubits))
+            yield sub_circ
 
 
 PARTITIONERS = {
@@ -344,7 +803,13 @@ PARTITIONERS = {
 }
 
 
-INITIALIZERS = {"qiskit": QiskitCircuitWrapper, "quafu": QuafuCircuitHelper}
+# Backends are imported on first use
+INITIALIZERS = LazyRegistry(
+    {
+        "qiskit": "qdao.qiskit.circuit:QiskitCircuitWrapper",
+        "quafu": "qdao.quafu.circuit:QuafuCircuitHelper",
+    }
+)
 
 
 class PartitionerProvider:
@@ -0,0 +1,286 @@
+"""
+Command Line Module
+===================
+
+This module provides the `qdao` console script, which simulates a QASM file
+with `Engine` and writes the requested results into an output directory:
+
+- `probabilities.npy`: Probabilities of basis states, marginal over `--qubits`.
+- `counts.json`: Counts of `--shots` measurement samples of `--qubits`.
+- `expectations.json`: Expectation values of diagonal Pauli strings.
+- `statevector.npy` or `statevector/sv{i}.npy`: The final statevector.
+- `stats.json`: Configuration, wall time of each step and of each phase of the run,
+  hits and misses of the RAM cache and the prefetcher, and writes of the
+  write-back queue if enabled.
+- `io_trace.npy`: Loads and stores of storage units if `--io-trace` is given,
+  see `qdao.storage`.
+
+Results are reduced in a single pass over storage units, see `qdao.results`.
+Run `qdao --help` for options.
+
+Functions:
+----------
+
+- main: Command line entry point.
+"""
+import argparse
+import json
+import logging
+import os
+from time import perf_counter
+from typing import Any, List, Optional
+
+import numpy as np
+
+from qdao.circuit import PARTITIONERS, PartitionerProvider
+from qdao.engine import Engine, PhaseTimer
+from qdao.results import (
+    PauliExpectations,
+    Probabilities,
+    SampleCounts,
+    StatevectorWriter,
+    UnitWriter,
+    reduce_units,
+)
+from qdao.storage import CACHE_POLICIES, PREFETCH_MODES
+from qdao.util import DATA_DIR, STRIPINGS
+
+
+def _load_circuit(path: str, backend: str) -> Any:
+    with open(path) as f:
+        qasm = f.read()
+    if backend == "quafu":
+        from quafu import QuantumCircuit
+
+        circ = QuantumCircuit(1)
+        circ.from_openqasm(qasm)
+        return circ
+
+    from qiskit import QuantumCircuit, transpile
+    from qiskit_aer import Aer
+
+    circ = QuantumCircuit.from_qasm_str(qasm)
+    circ.remove_final_measurements()
+    return transpile(circ, Aer.get_backend("aer_simulator"))
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="qdao",
+        description="Simulate a QASM circuit with QDAO. Storage units are "
+        "written to ./data in disk mode, see --data-dir.",
+    )
+    parser.add_argument("qasm", help="Path of the OpenQASM 2.0 file")
+    parser.add_argument("--backend", default="qiskit", choices=["qiskit", "quafu"])
+    parser.add_argument(
+        "--num-primary",
+        type=int,
+        default=None,
+        help="Number of primary qubits, chosen automatically together with "
+        "--num-local if both are omitted",
+    )
+    parser.add_argument("--num-local", type=int, default=None)
+    parser.add_argument("--partitioner", default="static", choices=sorted(PARTITIONERS))
+    parser.add_argument("--sv-location", default="disk", choices=["disk", "memory"])
+    parser.add_argument(
+        "--parallel", action="store_true", help="Load and store units in parallel"
+    )
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of chunks simulated at once with NumPy",
+    )
+    parser.add_argument(
+        "--cache-budget",
+        type=int,
+        default=0,
+        help="Bytes of RAM caching storage units on disk, 0 disables the cache",
+    )
+    parser.add_argument("--cache-policy", default="lru", choices=sorted(CACHE_POLICIES))
+    parser.add_argument(
+        "--prefetch-depth",
+        type=int,
+        default=0,
+        help="Number of chunks whose storage units are read ahead on disk",
+    )
+    parser.add_argument("--prefetch-mode", default="read", choices=PREFETCH_MODES)
+    parser.add_argument(
+        "--direct-io",
+        action="store_true",
+        help="Access storage units on disk with O_DIRECT, bypassing the page cache",
+    )
+    parser.add_argument(
+        "--data-dir",
+        nargs="+",
+        default=[DATA_DIR],
+        help="Directory of storage units on disk, units are striped across "
+        "several directories, e.g., one per disk",
+    )
+    parser.add_argument("--striping", default="round_robin", choices=sorted(STRIPINGS))
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=0,
+        help="Number of threads accessing storage units per data directory",
+    )
+    parser.add_argument(
+        "--write-back-budget",
+        type=int,
+        default=0,
+        help="Bytes of storage units written to disk in the background, "
+        "0 disables write-back",
+    )
+    parser.add_argument(
+        "--io-trace",
+        action="store_true",
+        help="Write io_trace.npy, a trace of storage unit loads and stores",
+    )
+    parser.add_argument("--output-dir", default="qdao-results")
+    parser.add_argument(
+        "--probabilities", action="store_true", help="Write probabilities.npy"
+    )
+    parser.add_argument(
+        "--shots", type=int, default=0, help="Write counts of this many samples"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--qubits",
+        nargs="+",
+        type=int,
+        default=None,
+        help="Qubits of probabilities and samples, all qubits if not given",
+    )
+    parser.add_argument(
+        "--observables",
+        nargs="+",
+        default=[],
+        help="Diagonal Pauli strings, e.g., ZZII, qubit 0 is the rightmost",
+    )
+    parser.add_argument(
+        "--statevector",
+        default="none",
+        choices=["none", "npy", "units"],
+        help="Write the statevector into one .npy file, or one file per unit",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point, returns the exit code"""
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if (args.num_primary is None) != (args.num_local is None):
+        parser.error("--num-primary and --num-local must be given together")
+    logging.basicConfig(level=args.log_level.upper())
+    timings = {}
+
+    st = perf_counter()
+    circ = _load_circuit(args.qasm, args.backend)
+    timings["load_circuit"] = perf_counter() - st
+
+    st = perf_counter()
+    auto_config = args.num_primary is None
+    num_primary = 4 if auto_config else args.num_primary
+    num_local = 2 if auto_config else args.num_local
+    part = PartitionerProvider.get_partitioner(
+        args.partitioner, np=num_primary, nl=num_local, backend=args.backend
+    )
+    engine = Engine(
+        circuit=circ,
+        partitioner=part,
+        num_primary=num_primary,
+        num_local=num_local,
+        backend=args.backend,
+        sv_location=args.sv_location,
+        is_parallel=args.parallel,
+        auto_config=auto_config,
+        num_workers=args.num_workers,
+        batch_size=args.batch_size,
+        io_trace=args.io_trace,
+        cache_budget=args.cache_budget,
+        cache_policy=args.cache_policy,
+        prefetch_depth=args.prefetch_depth,
+        prefetch_mode=args.prefetch_mode,
+        direct_io=args.direct_io,
+        data_dir=args.data_dir,
+        striping=args.striping,
+        io_threads=args.io_threads,
+        write_back_budget=args.write_back_budget,
+    )
+    timer = PhaseTimer()
+    timer.attach(engine)
+    timings["setup"] = perf_counter() - st
+
+    st = perf_counter()
+    engine.run()
+    timings["run"] = perf_counter() - st
+    cache = engine.manager.cache
+    cache_stats = None if cache is None else cache.stats
+    prefetcher = engine.manager.prefetcher
+    prefetch_stats = None if prefetcher is None else prefetcher.stats
+    write_back = engine.manager.write_back
+    write_back_stats = None if write_back is None else write_back.stats
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.io_trace:
+        engine.manager.io_trace.save(os.path.join(args.output_dir, "io_trace.npy"))
+    nq = engine.num_qubits
+    outputs = {}
+    if args.probabilities:
+        outputs["probabilities.npy"] = Probabilities(nq, args.qubits)
+    if args.shots > 0:
+        outputs["counts.json"] = SampleCounts(nq, args.shots, args.seed, args.qubits)
+    if args.observables:
+        outputs["expectations.json"] = PauliExpectations(nq, args.observables)
+    if args.statevector == "npy":
+        path = os.path.join(args.output_dir, "statevector.npy")
+        outputs["statevector.npy"] = StatevectorWriter(nq, path)
+    elif args.statevector == "units":
+        path = os.path.join(args.output_dir, "statevector")
+        outputs["statevector"] = UnitWriter(nq, path)
+
+    st = perf_counter()
+    results = reduce_units(engine.manager.iter_units(), list(outputs.values()))
+    for name, result in zip(outputs, results):
+        path = os.path.join(args.output_dir, name)
+        if name == "probabilities.npy":
+            np.save(path, result)
+        elif name.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump(result, f, indent=2)
+    timings["reduce"] = perf_counter() - st
+
+    stats = {
+        "qasm": args.qasm,
+        "num_qubits": nq,
+        "num_primary": engine.num_primary,
+        "num_local": engine.num_local,
+        "partitioner": args.partitioner,
+        "backend": args.backend,
+        "sv_location": args.sv_location,
+        "is_parallel": args.parallel,
+        "num_workers": args.num_workers,
+        "batch_size": args.batch_size,
+        "direct_io": engine.manager.direct_io,
+        "data_dir": args.data_dir,
+        "striping": args.striping,
+        "io_threads": args.io_threads,
+        "num_sub_circuits": timer.num_sub_circuits,
+        "num_storage_ops": timer.num_storage_ops,
+        "timings": timings,
+        "phases": timer.phases,
+    }
+    if engine.transfer_stats is not None:
+        stats["transfer_stats"] = engine.transfer_stats
+    if cache_stats is not None:
+        stats["cache_stats"] = cache_stats
+    if prefetch_stats is not None:
+        stats["prefetch_stats"] = prefetch_stats
+    if write_back_stats is not None:
+        stats["write_back_stats"] = write_back_stats
+    with open(os.path.join(args.output_dir, "stats.json"), "w") as f:
+        json.dump(stats, f, indent=2)
+    return 0
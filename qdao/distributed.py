@@ -0,0 +1,421 @@
+"""
+Distributed Execution Module
+============================
+
+This module shards storage units across worker processes, each owning an
+`SvManager` store of its shard. For every sub-circuit, chunks are scheduled
+to the worker holding most of their storage units, and units owned by
+other workers are moved over a pluggable transport.
+
+Modules:
+--------
+
+- multiprocessing: Spawns local worker processes and pipes between them.
+- qdao.manager: Manages the storage units of a shard.
+- qdao.simulator: Provides the simulator of each worker.
+
+Classes:
+--------
+
+- BaseTransport: MPI-like point-to-point transport between workers.
+- PipeTransport: Local transport based on `multiprocessing.Pipe`.
+- ChunkScheduler: Assigns chunks of a sub-circuit to workers.
+- WorkerPool: Starts workers and executes sub-circuits on them.
+
+Attributes:
+-----------
+
+- TRANSPORTS: A dictionary mapping transport names to their classes.
+"""
+import logging
+import multiprocessing as mp
+import traceback
+from abc import ABC, abstractmethod
+from multiprocessing.connection import wait
+from typing import Any, Dict, List
+
+import numpy as np
+
+from qdao.exceptions import QdaoError
+from qdao.manager import SvManager
+
+
+class BaseTransport(ABC):
+    """
+    MPI-like point-to-point transport between `size` workers.
+
+    Subclasses implement `send` and `recv`, collectives are built on top of
+    them so that a real cluster transport only needs the two primitives.
+
+    Attributes:
+        rank (int): Rank of current worker.
+        size (int): Number of workers.
+    """
+
+    def __init__(self, rank: int, size: int) -> None:
+        self._rank = rank
+        self._size = size
+
+    @property
+    def rank(self) -> int:
+        return self._rank
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @abstractmethod
+    def send(self, dst: int, obj: Any) -> None:
+        """Send a picklable object to worker `dst`, may block until received"""
+
+    @abstractmethod
+    def recv(self, src: int) -> Any:
+        """Receive an object from worker `src`"""
+
+    def alltoall(self, outgoing: Dict[int, Any]) -> Dict[int, Any]:
+        """Exchange one message with every other worker
+
+        Pairwise exchange in `size - 1` rounds, in round `r` worker `i`
+        exchanges with worker `i ^ r` and the lower rank sends first, so
+        blocking sends never deadlock.
+
+        Args:
+            outgoing (Dict[int, Any]): Message for each destination rank,
+                missing ranks receive `None`.
+
+        Returns:
+            Dict[int, Any]: Message from each source rank.
+        """
+        incoming = {}
+        for r in range(1, self._size):
+            peer = self._rank ^ r
+            if self._rank < peer:
+                self.send(peer, outgoing.get(peer))
+                incoming[peer] = self.recv(peer)
+            else:
+                incoming[peer] = self.recv(peer)
+                self.send(peer, outgoing.get(peer))
+        return incoming
+
+
+class PipeTransport(BaseTransport):
+    """
+    Local stand-in of a cluster transport using one `multiprocessing.Pipe`
+    per pair of workers.
+
+    Attributes:
+        conns (Dict[int, Connection]): Connection to each peer.
+    """
+
+    def __init__(self, rank: int, size: int, conns: Dict[int, Any]) -> None:
+        super().__init__(rank, size)
+        self._conns = conns
+
+    @classmethod
+    def create(cls, size: int, ctx: Any = mp) -> List["PipeTransport"]:
+        """Create connected transports of all ranks"""
+        conns = [dict() for _ in range(size)]
+        for i in range(size):
+            for j in range(i + 1, size):
+                conns[i][j], conns[j][i] = ctx.Pipe()
+        return [cls(rank, size, conns[rank]) for rank in range(size)]
+
+    def send(self, dst: int, obj: Any) -> None:
+        self._conns[dst].send(obj)
+
+    def recv(self, src: int) -> Any:
+        return self._conns[src].recv()
+
+
+TRANSPORTS = {"pipe": PipeTransport}
+
+
+class ChunkScheduler:
+    """
+    Assigns chunks to workers, preferring the worker that owns most of the
+    storage units of a chunk.
+
+    Storage units are sharded in contiguous blocks, i.e., the owner of a
+    unit is given by its highest `log2(num_workers)` bits. Chunks of a
+    sub-circuit that does not act on the corresponding top qubits are
+    therefore entirely local to one worker.
+
+    Attributes:
+        manager (SvManager): Manager used to compute units of chunks.
+        num_workers (int): Number of workers, must be a power of two.
+    """
+
+    def __init__(self, manager: SvManager, num_workers: int) -> None:
+        num_sus = 1 << (manager.num_qubits - manager.num_local)
+        if num_workers & (num_workers - 1) or num_workers > num_sus:
+            raise QdaoError(
+                "Number of workers should be a power of two "
+                "not larger than {}".format(num_sus)
+            )
+        self._manager = manager
+        self._num_workers = num_workers
+        self._shard_size = num_sus // num_workers
+
+    def owner(self, unit: int) -> int:
+        return unit // self._shard_size
+
+    def shard(self, rank: int) -> List[int]:
+        return list(range(rank * self._shard_size, (rank + 1) * self._shard_size))
+
+    def schedule(self, real_qubits: List[int]) -> List[int]:
+        """Assign each chunk of a sub-circuit to a worker
+
+        Chunks go to the worker owning most of their units among workers
+        that have not got their share of chunks yet.
+
+        Returns:
+            List[int]: Rank executing each chunk.
+        """
+        num_chunks = 1 << (self._manager.num_qubits - self._manager.num_primary)
+        cap = -(-num_chunks // self._num_workers)
+        load = [0] * self._num_workers
+        plan = []
+        for ichunk in range(num_chunks):
+            counts = [0] * self._num_workers
+            for _, unit in self._manager.chunk_units(real_qubits, ichunk):
+                counts[self.owner(unit)] += 1
+            rank = max(
+                (r for r in range(self._num_workers) if load[r] < cap),
+                key=lambda r: (counts[r], -load[r]),
+            )
+            load[rank] += 1
+            plan.append(rank)
+        return plan
+
+
+def _run_sub_circ(rank, manager, scheduler, transport, helper, sim, sub_circ, plan):
+    """Execute chunks assigned to current worker"""
+    nl = manager.num_local
+    units = {i: manager.chunk_units(sub_circ.real_qubits, i) for i in range(len(plan))}
+
+    # 1. Send owned units of chunks executed by other workers
+    outgoing = {}
+    for ichunk, r in enumerate(plan):
+        if r == rank:
+            continue
+        for _, unit in units[ichunk]:
+            if scheduler.owner(unit) == rank:
+                outgoing.setdefault(r, {})[unit] = manager.read_unit(unit)
+    remote = {}
+    for msg in transport.alltoall(outgoing).values():
+        remote.update(msg or {})
+
+    # 2. Simulate chunk by chunk and keep results of remote units
+    results = {}
+    num_local_units = 0
+    for ichunk, r in enumerate(plan):
+        if r != rank:
+            continue
+        chunk = np.empty(1 << manager.num_primary, dtype=np.complex128)
+        for isub, unit in units[ichunk]:
+            if scheduler.owner(unit) == rank:
+                chunk[isub << nl : (isub + 1) << nl] = manager.read_unit(unit)
+                num_local_units += 1
+            else:
+                chunk[isub << nl : (isub + 1) << nl] = remote[unit]
+        helper.circ = sub_circ.circ
+        sv = sim.run(helper.init_circ_from_sv(chunk))
+        for isub, unit in units[ichunk]:
+            vec = sv[isub << nl : (isub + 1) << nl]
+            owner = scheduler.owner(unit)
+            if owner == rank:
+                manager.write_unit(unit, vec)
+            else:
+                results.setdefault(owner, {})[unit] = vec
+
+    # 3. Send results back to owners
+    for msg in transport.alltoall(results).values():
+        for unit, vec in (msg or {}).items():
+            manager.write_unit(unit, vec)
+
+    return {"local_units": num_local_units, "remote_units": len(remote)}
+
+
+def _worker_main(rank, conn, transport, config):
+    """Command loop of a worker process"""
+    from qdao.circuit import CircuitHelperProvider
+    from qdao.simulator import SimulatorProvider
+
+    try:
+        manager = SvManager(
+            num_qubits=config["num_qubits"],
+            num_primary=config["num_primary"],
+            num_local=config["num_local"],
+            sv_location=config["sv_location"],
+            shm_name=config["shm_name"],
+            shard=config["shard"],
+            data_dir=config["data_dir"],
+            striping=config["striping"],
+        )
+        scheduler = ChunkScheduler(manager, transport.size)
+        helper = CircuitHelperProvider.get_helper(config["backend"])
+        sim = SimulatorProvider.get_simulator(
+            config["backend"], **config["backend_args"]
+        )
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+        return
+    conn.send(("ok", None))
+
+    while True:
+        cmd, args = conn.recv()
+        try:
+            if cmd == "close":
+                break
+            if cmd == "init":
+                manager.initialize(units=scheduler.shard(rank))
+                res = None
+            elif cmd == "run":
+                res = _run_sub_circ(
+                    rank, manager, scheduler, transport, helper, sim, *args
+                )
+            elif cmd == "gather":
+                res = {u: manager.read_unit(u) for u in scheduler.shard(rank)}
+            else:
+                raise ValueError("Unknown command: {}".format(cmd))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+            continue
+        conn.send(("ok", res))
+
+
+class WorkerPool:
+    """
+    Worker processes, each owning a shard of storage units.
+
+    Workers are spawned locally and connected by the given transport, so
+    the distributed mode can be tested without a cluster.
+
+    Attributes:
+        manager (SvManager): Manager of the coordinator, used for scheduling
+            and to hold gathered results in memory mode.
+        num_workers (int): Number of worker processes.
+        transport (str): Name of the transport in `TRANSPORTS`.
+        stats (Dict[str, int]): Number of storage units read locally and
+            received over the transport to execute chunks.
+    """
+
+    def __init__(
+        self,
+        manager: SvManager,
+        num_workers: int = 2,
+        backend: str = "qiskit",
+        transport: str = "pipe",
+        **backend_args
+    ) -> None:
+        if transport not in TRANSPORTS:
+            raise QdaoError("Unsupported transport: {}".format(transport))
+        self._manager = manager
+        self._num_workers = num_workers
+        self._scheduler = ChunkScheduler(manager, num_workers)
+        self._transport = transport
+        self._config = {
+            "num_qubits": manager.num_qubits,
+            "num_primary": manager.num_primary,
+            "num_local": manager.num_local,
+            "sv_location": manager.sv_location,
+            "shm_name": manager.shm_name,
+            "shard": None,
+            "data_dir": manager.data_dir,
+            "striping": manager.striping,
+            "backend": backend,
+            "backend_args": backend_args,
+        }
+        self._procs = []
+        self._conns = []
+        self._stats = {"local_units": 0, "remote_units": 0}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self._stats
+
+    @property
+    def shm_name(self):
+        """Shared memory block workers attach to in memory mode, if any"""
+        return self._config["shm_name"]
+
+    def start(self):
+        # Spawn instead of fork, simulators may not survive forking
+        ctx = mp.get_context("spawn")
+        transports = TRANSPORTS[self._transport].create(self._num_workers, ctx)
+        for rank in range(self._num_workers):
+            config = self._config
+            if config["sv_location"] != "disk" and config["shm_name"] is None:
+                # Without a shared statevector, workers only hold their shards
+                config = dict(config, shard=self._scheduler.shard(rank))
+            conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(
+                target=_worker_main,
+                args=(rank, child_conn, transports[rank], config),
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+            self._conns.append(conn)
+        self._wait()
+
+    def _wait(self) -> List[Any]:
+        """Wait for replies of all workers, fail fast on the first error"""
+        results = [None] * self._num_workers
+        pending = dict(enumerate(self._conns))
+        while pending:
+            for conn in wait(list(pending.values())):
+                rank = self._conns.index(conn)
+                try:
+                    status, res = conn.recv()
+                except EOFError:
+                    status, res = "error", "Worker {} exited".format(rank)
+                if status == "error":
+                    self.close(terminate=True)
+                    raise QdaoError("Worker {} failed:\n{}".format(rank, res))
+                results[rank] = res
+                del pending[rank]
+        return results
+
+    def _broadcast(self, cmd: str, *args) -> List[Any]:
+        for conn in self._conns:
+            conn.send((cmd, args))
+        return self._wait()
+
+    def initialize(self):
+        self._broadcast("init")
+
+    def run(self, sub_circ: Any):
+        """Execute a sub-circuit on all workers"""
+        plan = self._scheduler.schedule(sub_circ.real_qubits)
+        for res in self._broadcast("run", sub_circ, plan):
+            for key in self._stats:
+                self._stats[key] += res[key]
+
+    def gather(self) -> List[np.ndarray]:
+        """Collect all storage units, used in memory mode if workers do not
+        share the statevector of the coordinator"""
+        units = {}
+        for res in self._broadcast("gather"):
+            units.update(res)
+        return [units[u] for u in range(len(units))]
+
+    def close(self, terminate: bool = False):
+        for conn, proc in zip(self._conns, self._procs):
+            if terminate:
+                proc.terminate()
+            else:
+                try:
+                    conn.send(("close", ()))
+                except (BrokenPipeError, OSError):
+                    pass
+        for proc in self._procs:
+            proc.join()
+        self._procs, self._conns = [], []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close(terminate=any(exc))
@@ -11,37 +11,75 @@ Modules:
 - qdao.circuit: Contains classes and methods related to quantum circuit partitioning and handling.
 - qdao.manager: Manages statevector storage and retrieval.
 - qdao.simulator: Provides simulator interfaces for different quantum computing backends.
+- qdao.estimator: Estimates the cost of a configuration without simulating it.
+- qdao.distributed: Shards storage units across worker processes.
+- qdao.batch: Simulates batches of chunks with NumPy.
 - qdao.util: Utility functions for safe import, file name generation, and timing.
 
 Classes:
 --------
 - Engine: The main class that handles the execution of quantum circuits.
+- PhaseTimer: Accumulates wall time of the phases of one `Engine` run.
 
 Attributes:
 -----------
 - time_it: A decorator to measure the execution time of methods.
 - print_statistics: A function to print execution statistics.
+- PHASES: Names of the timed phases of a run.
 """
+import hashlib
 import logging
-from time import time
-from typing import Any, Optional
+import os
+import pickle
+from time import perf_counter, time
+from typing import Any, List, Optional, Union
 
 import numpy as np
 
+from qdao.batch import BatchSimulator
 from qdao.circuit import (
+    PARTITIONERS,
     BasePartitioner,
     CircuitHelperProvider,
     QdaoCircuit,
+    QdaoStorageOp,
     StaticPartitioner,
 )
+from qdao.distributed import WorkerPool
+from qdao.estimator import (
+    MEMORY_HEADROOM,
+    CostEstimate,
+    ThroughputProfile,
+    auto_configure,
+    available_memory,
+    estimate_cost,
+)
+from qdao.exceptions import QdaoError
 from qdao.manager import SvManager
-from qdao.simulator import SimulatorProvider
-from qdao.util import generate_secondary_file_name, safe_import
+from qdao.simulator import QdaoSimObj, SimulatorProvider
+from qdao.storage import aligned_empty
+from qdao.util import DATA_DIR, fsync_path, generate_secondary_file_name, safe_import
 
 time_it = safe_import("qutils", "time_it")
 print_statistics = safe_import("qutils", "print_statistics")
 
 
+def _num_chunk_buffers(parallel_io: bool, batch_size: int, prefetch_depth: int) -> int:
+    """Number of chunk-sized buffers alive at the same time, besides the
+    buffers of the simulator"""
+    # The chunk of the manager
+    num_buffers = 1
+    if batch_size > 1:
+        num_buffers += batch_size
+    if prefetch_depth:
+        # Units of the next `prefetch_depth` chunks and of the current one
+        num_buffers += prefetch_depth + 1
+    if parallel_io:
+        # Units read by threads before they are copied into the chunk
+        num_buffers += 1
+    return num_buffers
+
+
 class Engine:
     """
     Engine to execute a quantum circuit.
@@ -69,6 +107,23 @@ class Engine:
         is_parallel: bool = False,
         backend="qiskit",
         sv_location="disk",
+        auto_config: bool = False,
+        memory_budget: Optional[int] = None,
+        restore_layout: bool = True,
+        num_workers: int = 1,
+        transport: str = "pipe",
+        checkpoint: Optional[str] = None,
+        batch_size: int = 1,
+        io_trace: bool = False,
+        cache_budget: int = 0,
+        cache_policy: str = "lru",
+        prefetch_depth: int = 0,
+        prefetch_mode: str = "read",
+        direct_io: bool = False,
+        data_dir: Union[str, List[str]] = DATA_DIR,
+        striping: str = "round_robin",
+        io_threads: int = 0,
+        write_back_budget: int = 0,
         **backend_args
     ) -> None:
         """
@@ -81,28 +136,133 @@ class Engine:
         is_parallel (bool): Whether to run simulations in parallel.
         backend (str): Backend simulator to use.
         sv_location (str): Location to store statevectors.
+        auto_config (bool): Whether to choose `num_primary` and `num_local`
+            from available memory and probed throughput, see `auto_configure`.
+        memory_budget (Optional[int]): Memory budget in bytes for auto
+            configuration, defaults to a fraction of available RAM. Chunks
+            of batches, of prefetched units and of parallel loads, and the
+            cache and write-back budgets count against it. Cannot be used
+            with a given `manager`.
+        restore_layout (bool): Whether to move qubits back to identity layout
+            after simulation if the partitioner remapped qubits, otherwise
+            `layout` must be passed to `retrieve_sv`.
+        num_workers (int): Number of worker processes sharding storage
+            units, must be a power of two, 1 disables distributed mode.
+        transport (str): Transport moving storage units between workers,
+            see `qdao.distributed.TRANSPORTS`.
+        checkpoint (Optional[str]): Path of a file recording progress after
+            each sub-circuit, see `resume`. Storage units are double-buffered
+            on disk so that an interrupted sub-circuit can be restarted.
+        batch_size (int): Number of chunks simulated at once by
+            `BatchSimulator` instead of the backend simulator, which pays off
+            if `num_primary` is small. 1 simulates chunk by chunk.
+        io_trace (bool): Whether the manager records an I/O trace of
+            storage units, see `SvManager.io_trace`. Not supported in
+            distributed mode.
+        cache_budget (int): Bytes of RAM caching storage units on disk, see
+            `SvManager`. 0 disables the cache, which is not supported in
+            distributed mode or with checkpointing.
+        cache_policy (str): Eviction policy of the cache, "lru" or
+            "clairvoyant", see `qdao.storage.CACHE_POLICIES`.
+        prefetch_depth (int): Number of chunks whose storage units on disk
+            are read ahead, see `qdao.storage.Prefetcher`. 0 disables
+            prefetching, which is not supported in distributed mode.
+        prefetch_mode (str): "read" reads units ahead into memory, "advise"
+            only advises the kernel to read their files ahead.
+        direct_io (bool): Whether to access storage units on disk with
+            direct I/O, see `SvManager`. Not supported in distributed mode.
+        data_dir (Union[str, List[str]]): Directory of storage units on
+            disk, or directories they are striped across, e.g., one per
+            disk. Concurrent runs need separate directories.
+        striping (str): Policy mapping storage units to directories,
+            "round_robin" or "hash", see `qdao.util.STRIPINGS`.
+        io_threads (int): Number of threads accessing storage units per
+            directory, see `SvManager`. Not supported in distributed mode.
+        write_back_budget (int): Bytes of storage units on disk written in
+            the background, see `SvManager.write_back`. 0 disables
+            write-back, which is not supported in distributed mode.
         **backend_args: Additional arguments for the backend simulator. 
         """  
+        # Get circuit init helper based on backend name
+        # This is used to init a circuit from statevector
+        self._circ_helper = CircuitHelperProvider.get_helper(backend)
+
+        if checkpoint and (sv_location != "disk" or num_workers > 1):
+            raise QdaoError("Checkpointing is only supported for serial runs on disk")
+        if io_trace and num_workers > 1:
+            raise QdaoError("I/O tracing is not supported in distributed mode")
+        if prefetch_depth and num_workers > 1:
+            raise QdaoError("Prefetching is not supported in distributed mode")
+        if direct_io and num_workers > 1:
+            raise QdaoError("Direct I/O is not supported in distributed mode")
+        if io_threads and num_workers > 1:
+            raise QdaoError("I/O threads are not supported in distributed mode")
+        if write_back_budget and num_workers > 1:
+            raise QdaoError("Write-back is not supported in distributed mode")
+        if auto_config and isinstance(manager, SvManager):
+            raise QdaoError(
+                "Cannot auto-configure with a given manager, whose "
+                "num_primary and num_local are fixed"
+            )
+        if cache_budget and (checkpoint or num_workers > 1):
+            raise QdaoError(
+                "Caching storage units is only supported for serial runs "
+                "without checkpointing"
+            )
+
+        self._circ = circuit
+        self._circ_helper.circ = circuit
+        self._nq = self._circ_helper.num_qubits
+
+        self._num_buffers = _num_chunk_buffers(
+            is_parallel or io_threads > 0, batch_size, prefetch_depth
+        )
+        if auto_config:
+            part_name = next(
+                (n for n, c in PARTITIONERS.items() if type(partitioner) is c),
+                "static",
+            )
+            if memory_budget is None:
+                memory_budget = int(available_memory() * MEMORY_HEADROOM)
+            # Caches of storage units do not scale with chunks
+            memory_budget -= cache_budget + write_back_budget
+            est = auto_configure(
+                circuit,
+                backend=backend,
+                partitioner=part_name,
+                sv_location=sv_location,
+                num_buffers=self._num_buffers,
+                memory_budget=memory_budget,
+                storage_dir=data_dir,
+                # Checkpointing keeps two generations of storage units
+                storage_copies=2 if checkpoint else 1,
+            )
+            num_primary, num_local = est.num_primary, est.num_local
+            logging.info("Auto configuration: {}".format(est))
+
         if isinstance(partitioner, BasePartitioner):
             self._part = partitioner
+            if auto_config:
+                self._part.np, self._part.nl = num_primary, num_local
         else:
             self._part = StaticPartitioner(
                 np=num_primary, nl=num_local, backend=backend
             )
 
         # Get circuit simulator
-        self._sim = SimulatorProvider.get_simulator(backend, **backend_args)
-
-        # Get circuit init helper based on backend name
-        # This is used to init a circuit from statevector
-        self._circ_helper = CircuitHelperProvider.get_helper(backend)
-
-        self._circ = circuit
-        self._circ_helper.circ = circuit
-        self._nq = self._circ_helper.num_qubits
+        if batch_size > 1:
+            if num_workers > 1:
+                raise QdaoError("Batch simulation is not supported in distributed mode")
+            self._sim = BatchSimulator(backend)
+        else:
+            self._sim = SimulatorProvider.get_simulator(backend, **backend_args)
+        self._batch_size = batch_size
+        self._batch = None
 
         if isinstance(manager, SvManager):
             self._manager = manager
+            if checkpoint and not manager.double_buffer:
+                raise QdaoError("Checkpointing requires double-buffered storage")
         else:
             self._manager = SvManager(
                 num_qubits=self._nq,
@@ -110,8 +270,30 @@ class Engine:
                 num_local=num_local,
                 is_parallel=is_parallel,
                 sv_location=sv_location,
+                double_buffer=bool(checkpoint),
+                io_trace=io_trace,
+                cache_budget=cache_budget,
+                cache_policy=cache_policy,
+                prefetch_depth=prefetch_depth,
+                prefetch_mode=prefetch_mode,
+                direct_io=direct_io,
+                data_dir=data_dir,
+                striping=striping,
+                io_threads=io_threads,
+                write_back_budget=write_back_budget,
             )
+        self._checkpoint = checkpoint
+        self._ckpt_index = 0
+        self._ckpt_sig = None
+        if checkpoint:
+            self._manager.on_commit = lambda: self._save_checkpoint(self._ckpt_index)
 
+        self._backend = backend
+        self._backend_args = backend_args
+        self._restore_layout = restore_layout
+        self._num_workers = num_workers
+        self._transport = transport
+        self._transfer_stats = None
         self._np, self._nl = num_primary, num_local
         self._num_chunks = 1 << (self._nq - self._np)
 
@@ -122,6 +304,34 @@ class Engine:
     def num_chunks(self):
         return self._num_chunks
 
+    @property
+    def num_qubits(self):
+        return self._nq
+
+    @property
+    def num_primary(self):
+        return self._np
+
+    @property
+    def num_local(self):
+        return self._nl
+
+    @property
+    def manager(self) -> SvManager:
+        """Manager of the storage units holding the statevector"""
+        return self._manager
+
+    @property
+    def transfer_stats(self):
+        """Storage units read locally and moved between workers by the last
+        distributed run, `None` if not in distributed mode"""
+        return self._transfer_stats
+
+    @property
+    def layout(self):
+        """Physical position of each logical qubit in storage, `None` means identity"""
+        return self._manager.layout
+
     @time_it
     def _preprocess(self, sub_circ: QdaoCircuit, ichunk: int):
         """Preprocessing before running a sub-simulation
@@ -132,7 +342,8 @@ class Engine:
         """
         self._manager.chunk_idx = ichunk
         sv = self._manager.load_sv(sub_circ.real_qubits)
-        logging.debug("loaded sv: {}".format(sv))
+        # Formatted only if enabled, printing a chunk is slow
+        logging.debug("loaded sv: %s", sv)
 
         self._circ_helper.circ = sub_circ.circ
         return self._circ_helper.init_circ_from_sv(sv)
@@ -159,13 +370,39 @@ class Engine:
                 metadata recording the mapping between
                 virtual and real qubits
         """
-        for ichunk in range(self._num_chunks):
+        if self._batch_size > 1:
+            self._run_batched(sub_circ)
+            return
+        for ichunk in self._manager.chunk_order(sub_circ.real_qubits):
             simobj = self._preprocess(sub_circ, ichunk)
             st = time()
             sv = self._sim.run(simobj)
             assert sv.shape[0] == (1 << self._np)
             logging.info("Partial simulation consumes time: {}".format(time() - st))
             self._postprocess(sub_circ, ichunk, sv)
+        self._manager.finish_sweep()
+
+    def _run_batched(self, sub_circ: QdaoCircuit) -> None:
+        """Run single sub-circuit on batches of chunks
+
+        Chunks are loaded into and stored from rows of one batch buffer,
+        so that the simulator evolves all of them at once and their storage
+        units are accessed in one sorted pass, see `SvManager.load_batch`.
+        """
+        if self._batch is None:
+            size = min(self._batch_size, self._num_chunks)
+            # Rows are aligned for direct I/O
+            self._batch = aligned_empty(size << self._np).reshape(size, -1)
+        order = self._manager.chunk_order(sub_circ.real_qubits)
+        for start in range(0, self._num_chunks, len(self._batch)):
+            chunks = order[start : start + len(self._batch)]
+            batch = self._batch[: len(chunks)]
+            self._manager.load_batch(sub_circ.real_qubits, chunks, batch)
+            st = time()
+            batch = self._sim.run(QdaoSimObj(batch, sub_circ.circ))
+            logging.info("Batch simulation consumes time: {}".format(time() - st))
+            self._manager.store_batch(sub_circ.real_qubits, chunks, batch)
+        self._manager.finish_sweep()
 
     # def debug(self, sub_circ: QdaoCircuit):
     #    """
@@ -192,6 +429,30 @@ class Engine:
     #    print(sv_res)
     #    assert sv.equiv(sv_res)
 
+    def estimate(self, profile: Optional[ThroughputProfile] = None) -> CostEstimate:
+        """Dry-run the current configuration
+
+        Only the partitioner is executed, neither the simulator nor
+        the storage units are touched.
+
+        Args:
+            profile (Optional[ThroughputProfile]): Throughput used to
+                predict wall time, see `ThroughputProfile.calibrate`.
+
+        Returns:
+            CostEstimate: Number of sub-circuits, data movement,
+                peak memory and predicted wall time.
+        """
+        return estimate_cost(
+            self._circ,
+            backend=self._backend,
+            partitioner=self._part,
+            sv_location=self._manager.sv_location,
+            profile=profile,
+            num_buffers=self._num_buffers,
+            restore_layout=self._restore_layout,
+        )
+
     @time_it
     def _initialize(self):
         """
@@ -199,17 +460,227 @@ class Engine:
         """
         self._manager.initialize()
 
+    def _run_distributed(self, sub_circs):
+        """Run sub-circuits on worker processes owning shards of storage units"""
+        if self._manager.sv_location != "disk":
+            # Workers attach to the in-memory statevector if it is shared
+            self._manager.initialize(units=[])
+        num_sub_circs = 0
+        with WorkerPool(
+            self._manager,
+            num_workers=self._num_workers,
+            backend=self._backend,
+            transport=self._transport,
+            **self._backend_args
+        ) as pool:
+            pool.initialize()
+            for sub_circ in sub_circs:
+                if isinstance(sub_circ, QdaoStorageOp):
+                    raise QdaoError(
+                        "Storage-level operations are not supported "
+                        "in distributed mode"
+                    )
+                pool.run(sub_circ)
+                num_sub_circs += 1
+            if self._manager.sv_location != "disk" and pool.shm_name is None:
+                for unit, vec in enumerate(pool.gather()):
+                    self._manager.write_unit(unit, vec)
+            self._transfer_stats = dict(pool.stats)
+        logging.info("Number of sub-circuits: {}".format(num_sub_circs))
+        logging.info("Transfer statistics: {}".format(self._transfer_stats))
+
+    def _save_checkpoint(self, index: int, finished: bool = False):
+        """Atomically record that the first `index` sub-circuits are completed"""
+        state = {
+            "signature": self._ckpt_sig,
+            "index": index,
+            "finished": finished,
+            "manager": self._manager.get_state(),
+        }
+        tmp = self._checkpoint + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._checkpoint)
+        # The rename itself must survive a crash
+        fsync_path(os.path.dirname(os.path.abspath(self._checkpoint)))
+
+    def _execute(self, sub_circs, start: int = 0, signature: Optional[str] = None):
+        """Run a stream of sub-circuits and materialize the result
+
+        Progress is identified by a hash of the partitioning of the
+        completed prefix, so a stream can be checkpointed without being
+        materialized.
+
+        Args:
+            sub_circs (Iterable): Sub-circuits and storage-level operations.
+            start (int): Number of completed sub-circuits to skip.
+            signature (Optional[str]): Expected hash of the skipped prefix.
+        """
+        sig = hashlib.sha1(repr((self._nq, self._np, self._nl)).encode())
+
+        def check_prefix():
+            if signature is not None and sig.hexdigest() != signature:
+                raise QdaoError(
+                    "Checkpoint {} was recorded for another circuit "
+                    "or configuration".format(self._checkpoint)
+                )
+
+        num_sub_circs = 0
+        for i, sub_circ in enumerate(sub_circs):
+            num_sub_circs += 1
+            if i == start:
+                check_prefix()
+            prefix_sig = sig.hexdigest()
+            sig.update(
+                repr(
+                    type(sub_circ).__name__
+                    if isinstance(sub_circ, QdaoStorageOp)
+                    else sub_circ.real_qubits
+                ).encode()
+            )
+            if i < start:
+                continue
+
+            if isinstance(sub_circ, QdaoStorageOp):
+                # Storage-level operations can be repeated on resume
+                self._ckpt_index, self._ckpt_sig = i, prefix_sig
+                sub_circ.apply(self._manager)
+            else:
+                # A sub-circuit commits only once, after its sweep
+                self._ckpt_index, self._ckpt_sig = i + 1, sig.hexdigest()
+                self._run(sub_circ)
+                # self.debug(sub_circ)
+            if self._checkpoint:
+                self._ckpt_sig = sig.hexdigest()
+                self._save_checkpoint(i + 1)
+        if start >= num_sub_circs:
+            check_prefix()
+        logging.info("Number of sub-circuits: {}".format(num_sub_circs))
+
+        self._ckpt_index, self._ckpt_sig = num_sub_circs, sig.hexdigest()
+        self._manager.finalize(restore_layout=self._restore_layout)
+        if self._checkpoint:
+            self._save_checkpoint(num_sub_circs, finished=True)
+
     def run(self):
         """Run simulation
         1. Partition the circuit into sub-circuits
         2. For each sub-circuit, run simulations `1<<(nq-np)` times. Each simulation will initialize from a different part of the statevector.
+        3. Storage-level operations between sub-circuits are applied by the manager, and materialized at the end.
+
+        Sub-circuits are generated lazily while simulating, see
+        `BasePartitioner.iter_run`. With `num_workers > 1`, chunks of each
+        sub-circuit are executed by worker processes instead, see
+        `qdao.distributed.WorkerPool`.
         """
-        sub_circs = self._part.run(self._circ)
-        logging.info("Number of sub-circuits: {}".format(len(sub_circs)))
+        sub_circs = self._part.iter_run(self._circ)
+        if self._num_workers > 1:
+            self._run_distributed(sub_circs)
+            return
         self._initialize()
-        for sub_circ in sub_circs:
-            self._run(sub_circ)
-            # self.debug(sub_circ)
+        if self._checkpoint:
+            self._ckpt_index = 0
+            self._ckpt_sig = hashlib.sha1(
+                repr((self._nq, self._np, self._nl)).encode()
+            ).hexdigest()
+            self._save_checkpoint(0)
+        self._execute(sub_circs)
+
+    def resume(self):
+        """Resume an interrupted run from the checkpoint
+
+        Completed sub-circuits are skipped, and the interrupted one is
+        restarted from the storage units of the last committed sweep.
+        A new run is started if there is no checkpoint yet.
+        """
+        if not self._checkpoint:
+            raise QdaoError("Engine is created without checkpoint")
+        if not os.path.exists(self._checkpoint):
+            self.run()
+            return
+        with open(self._checkpoint, "rb") as f:
+            state = pickle.load(f)
+        if state["finished"]:
+            logging.info("Simulation has already finished")
+            return
+
+        logging.info("Resume from sub-circuit {}".format(state["index"]))
+        self._manager.set_state(state["manager"])
+        self._execute(
+            self._part.iter_run(self._circ),
+            start=state["index"],
+            signature=state["signature"],
+        )
 
 
 Engine.print_statistics = print_statistics
+
+
+PHASES = ["partition", "initialize", "load", "simulate", "store", "finalize"]
+
+
+class PhaseTimer:
+    """
+    Accumulates wall time of the phases of one `Engine` run.
+
+    Methods of the engine, its partitioner, manager and simulator are wrapped
+    on the instances, the classes are left untouched. In distributed mode,
+    chunks are loaded, simulated and stored by workers and only partitioning
+    is timed.
+
+    Attributes:
+        phases (Dict[str, float]): Seconds spent in each of `PHASES`.
+        num_sub_circuits (int): Number of sub-circuits generated.
+        num_storage_ops (int): Number of storage-level operations generated.
+    """
+
+    def __init__(self) -> None:
+        self.phases = {phase: 0.0 for phase in PHASES}
+        self.num_sub_circuits = 0
+        self.num_storage_ops = 0
+
+    def _wrap(self, obj: Any, name: str, phase: str):
+        func = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            st = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.phases[phase] += perf_counter() - st
+
+        setattr(obj, name, timed)
+
+    def _wrap_iter(self, obj: Any, name: str, phase: str):
+        func = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            it = iter(func(*args, **kwargs))
+            while True:
+                st = perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    self.phases[phase] += perf_counter() - st
+                if isinstance(item, QdaoStorageOp):
+                    self.num_storage_ops += 1
+                else:
+                    self.num_sub_circuits += 1
+                yield item
+
+        setattr(obj, name, timed)
+
+    def attach(self, engine: Engine) -> None:
+        """Time the phases of `engine.run`"""
+        self._wrap_iter(engine._part, "iter_run", "partition")
+        self._wrap(engine, "_initialize", "initialize")
+        self._wrap(engine._manager, "load_sv", "load")
+        self._wrap(engine._manager, "load_batch", "load")
+        self._wrap(engine._sim, "run", "simulate")
+        self._wrap(engine._manager, "store_sv", "store")
+        self._wrap(engine._manager, "store_batch", "store")
+        self._wrap(engine._manager, "finalize", "finalize")
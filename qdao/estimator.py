@@ -0,0 +1,639 @@
+"""
+Cost Estimator Module
+=====================
+
+This module provides a dry-run cost model for `Engine` configurations. The
+partitioner is executed on the target circuit, but no sub-circuit is simulated
+and no storage unit is touched. The resulting partition is combined with the
+storage layout of `SvManager` to report the data movement and memory footprint
+of a configuration, and with a `ThroughputProfile` to predict its wall time.
+
+Classes:
+--------
+
+- ThroughputProfile: Storage and simulator throughput numbers of a machine.
+- CostEstimate: The estimated cost of running a circuit with one configuration.
+
+Functions:
+----------
+
+- estimate_cost: Estimate the cost of one (num_primary, num_local) configuration.
+- sweep_configs: Rank (num_primary, num_local) pairs for a circuit by predicted time.
+- auto_configure: Choose (num_primary, num_local) from available memory and disk.
+- available_memory: Available RAM of this machine in bytes.
+"""
+import os
+import shutil
+import tempfile
+from time import time
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from qdao.circuit import (
+    BasePartitioner,
+    CircuitHelperProvider,
+    DiagonalOp,
+    LayoutOp,
+    PartitionerProvider,
+    QdaoStorageOp,
+)
+from qdao.exceptions import QdaoError
+from qdao.manager import plan_layout
+
+# Size of a single amplitude (np.complex128) in bytes
+AMP_SIZE = 16
+
+# Number of chunk-sized buffers a backend holds in addition to
+# `SvManager.chunk` while simulating a chunk.
+SIM_BUFFER_COPIES = {"qiskit": 3, "quafu": 2}
+
+# Fraction of available memory that auto configuration is allowed to use
+MEMORY_HEADROOM = 0.8
+
+
+class ThroughputProfile:
+    """
+    Throughput numbers used to translate data movement and gate counts into time.
+
+    Attributes:
+        io_bandwidth (float): Storage unit read/write bandwidth in bytes per second.
+        io_latency (float): Fixed cost of a single storage unit read/write in seconds.
+        sim_throughput (float): Simulated amplitude updates per second, i.e.,
+            number of gates times chunk size divided by simulation time.
+        sim_overhead (float): Fixed cost of a single simulator call in seconds.
+    """
+
+    def __init__(
+        self,
+        io_bandwidth: float = 5e8,
+        io_latency: float = 1e-4,
+        sim_throughput: float = 5e8,
+        sim_overhead: float = 1e-3,
+    ) -> None:
+        self.io_bandwidth = io_bandwidth
+        self.io_latency = io_latency
+        self.sim_throughput = sim_throughput
+        self.sim_overhead = sim_overhead
+
+    def to_dict(self) -> dict:
+        return {
+            "io_bandwidth": self.io_bandwidth,
+            "io_latency": self.io_latency,
+            "sim_throughput": self.sim_throughput,
+            "sim_overhead": self.sim_overhead,
+        }
+
+    @classmethod
+    def calibrate(
+        cls,
+        circuit: Any = None,
+        num_primary: int = 10,
+        num_local: int = 8,
+        backend: str = "qiskit",
+        sv_location: str = "disk",
+        repeat: int = 4,
+        storage_dir: Optional[Union[str, List[str]]] = None,
+    ) -> "ThroughputProfile":
+        """
+        Measure the throughput of this machine.
+
+        Storage throughput is probed by writing and reading storage units of
+        `1<<num_local` amplitudes in every directory of `storage_dir`. Files
+        are flushed and dropped from the page cache before they are read, so
+        that the device is measured. If `circuit` is given, simulator
+        throughput is probed by simulating the first sub-circuit of its
+        partition on a single chunk, otherwise the default simulator numbers
+        are kept.
+
+        Args:
+            circuit (Any): Circuit used to probe the simulator.
+            num_primary (int): Number of primary qubits used for probing.
+            num_local (int): Number of local qubits used for probing.
+            backend (str): Backend simulator to probe.
+            sv_location (str): Location of storage units ('memory' or 'disk').
+            repeat (int): Number of repetitions of each probe.
+            storage_dir (Optional[Union[str, List[str]]]): Directory that will
+                hold storage units, or directories they are striped across,
+                defaults to the system temp dir.
+
+        Returns:
+            ThroughputProfile: The calibrated profile.
+        """
+        profile = cls()
+        profile._calibrate_storage(num_local, sv_location, repeat, storage_dir)
+        if circuit is not None:
+            profile._calibrate_simulator(
+                circuit, num_primary, num_local, backend, repeat
+            )
+        return profile
+
+    def _calibrate_storage(
+        self,
+        num_local: int,
+        sv_location: str,
+        repeat: int,
+        storage_dir: Optional[Union[str, List[str]]],
+    ):
+        su = np.zeros(1 << num_local, dtype=np.complex128)
+        tiny = np.zeros(1, dtype=np.complex128)
+
+        if sv_location != "disk":
+            dst = np.empty_like(su)
+            st = time()
+            for _ in range(repeat):
+                np.copyto(dst, su)
+            self.io_bandwidth = repeat * su.nbytes / max(time() - st, 1e-9)
+            self.io_latency = 0.0
+            return
+
+        if storage_dir is None:
+            dirs = [None]
+        else:
+            dirs = [storage_dir] if isinstance(storage_dir, str) else storage_dir
+
+        # Striped units are accessed in turn, i.e., times of directories add up
+        tiny_time = su_time = 0.0
+        for path in dirs:
+            if path is not None:
+                os.makedirs(path, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(prefix="qdao_calib_", dir=path)
+            try:
+                fn = os.path.join(tmp_dir, "probe.npy")
+                tiny_time += _time_io(fn, tiny, repeat)
+                su_time += _time_io(fn, su, repeat)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        num_ops = 2 * repeat * len(dirs)
+        self.io_latency = tiny_time / num_ops
+        elapsed = su_time - num_ops * self.io_latency
+        self.io_bandwidth = num_ops * su.nbytes / max(elapsed, 1e-9)
+
+    def _calibrate_simulator(
+        self,
+        circuit: Any,
+        num_primary: int,
+        num_local: int,
+        backend: str,
+        repeat: int,
+    ):
+        from qdao.simulator import SimulatorProvider
+
+        helper = CircuitHelperProvider.get_helper(backend)
+        helper.circ = circuit
+        num_primary = min(num_primary, helper.num_qubits)
+        num_local = min(num_local, num_primary)
+
+        part = PartitionerProvider.get_partitioner(
+            "static", np=num_primary, nl=num_local, backend=backend
+        )
+        sub_circ = next(part.iter_run(circuit))
+        empty_circ = helper.gen_sub_circ([], num_local, num_primary)
+
+        sim = SimulatorProvider.get_simulator(backend)
+        sv = np.zeros(1 << num_primary, dtype=np.complex128)
+        sv[0] = 1.0
+
+        def _time_run(circ):
+            helper.circ = circ
+            st = time()
+            for _ in range(repeat):
+                sim.run(helper.init_circ_from_sv(sv))
+            return (time() - st) / repeat
+
+        self.sim_overhead = _time_run(empty_circ.circ)
+        elapsed = _time_run(sub_circ.circ) - self.sim_overhead
+        num_gates = len(list(helper.instructions))
+        self.sim_throughput = num_gates * len(sv) / max(elapsed, 1e-9)
+
+
+def _time_io(fn: str, vec: np.ndarray, repeat: int) -> float:
+    """Seconds to write `vec` to `fn` and read it back from the device `repeat` times"""
+    st = time()
+    for _ in range(repeat):
+        np.save(fn, vec)
+        _drop_page_cache(fn)
+        np.load(fn)
+    return time() - st
+
+
+def _drop_page_cache(fn: str):
+    """Flush a file and drop its pages from the page cache if supported"""
+    fd = os.open(fn, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+class CostEstimate:
+    """
+    Estimated cost of running a circuit with a given `Engine` configuration.
+
+    Attributes:
+        num_qubits (int): Number of qubits in the circuit.
+        num_primary (int): Number of primary qubits.
+        num_local (int): Number of local qubits.
+        num_sub_circuits (int): Number of sub-circuits found by the partitioner.
+        num_chunks (int): Number of chunks simulated per sub-circuit.
+        num_gates (int): Total number of gates over all sub-circuits.
+        num_storage_units (int): Number of storage units, i.e., files on disk.
+        num_storage_files (int): Number of storage-unit files (0 in memory mode).
+        io_ops (int): Number of storage unit reads and writes.
+        bytes_moved (int): Number of bytes moved through `SvManager`.
+        peak_memory (int): Peak memory footprint in bytes.
+        io_time (float): Predicted time spent on storage access in seconds.
+        sim_time (float): Predicted time spent on simulation in seconds.
+    """
+
+    def __init__(
+        self,
+        num_qubits: int,
+        num_primary: int,
+        num_local: int,
+        num_sub_circuits: int,
+        num_gates: int,
+        num_storage_files: int,
+        io_ops: int,
+        bytes_moved: int,
+        peak_memory: int,
+        io_time: float,
+        sim_time: float,
+    ) -> None:
+        self.num_qubits = num_qubits
+        self.num_primary = num_primary
+        self.num_local = num_local
+        self.num_sub_circuits = num_sub_circuits
+        self.num_chunks = 1 << (num_qubits - num_primary)
+        self.num_gates = num_gates
+        self.num_storage_units = 1 << (num_qubits - num_local)
+        self.num_storage_files = num_storage_files
+        self.io_ops = io_ops
+        self.bytes_moved = bytes_moved
+        self.peak_memory = peak_memory
+        self.io_time = io_time
+        self.sim_time = sim_time
+
+    @property
+    def predicted_time(self) -> float:
+        """Predicted wall time in seconds."""
+        return self.io_time + self.sim_time
+
+    def to_dict(self) -> dict:
+        return {
+            "num_qubits": self.num_qubits,
+            "num_primary": self.num_primary,
+            "num_local": self.num_local,
+            "num_sub_circuits": self.num_sub_circuits,
+            "num_chunks": self.num_chunks,
+            "num_gates": self.num_gates,
+            "num_storage_units": self.num_storage_units,
+            "num_storage_files": self.num_storage_files,
+            "io_ops": self.io_ops,
+            "bytes_moved": self.bytes_moved,
+            "peak_memory": self.peak_memory,
+            "io_time": self.io_time,
+            "sim_time": self.sim_time,
+            "predicted_time": self.predicted_time,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            "CostEstimate(np={}, nl={}, sub_circuits={}, bytes_moved={}, "
+            "peak_memory={}, predicted_time={:.3f}s)".format(
+                self.num_primary,
+                self.num_local,
+                self.num_sub_circuits,
+                self.bytes_moved,
+                self.peak_memory,
+                self.predicted_time,
+            )
+        )
+
+
+def estimate_cost(
+    circuit: Any,
+    num_primary: int = 4,
+    num_local: int = 2,
+    backend: str = "qiskit",
+    partitioner: Union[str, BasePartitioner] = "static",
+    sv_location: str = "disk",
+    profile: Optional[ThroughputProfile] = None,
+    num_buffers: int = 1,
+    restore_layout: bool = True,
+) -> CostEstimate:
+    """
+    Estimate the cost of running `circuit` without simulating it.
+
+    Each sub-circuit loads and stores the whole statevector once, i.e.,
+    `1<<(nq-nl)` storage unit reads and writes, and runs `1<<(nq-np)`
+    simulations of `1<<np` amplitudes. Initialization writes every
+    storage unit once. So does each reorganization pass of
+    `SvManager.apply_layout`, i.e., of layout changes after the first
+    sub-circuit and of restoring the layout at finalize, and the pass
+    applying diagonal gates left after the last sub-circuit.
+
+    Args:
+        circuit (Any): Quantum circuit to be estimated.
+        num_primary (int): Number of primary qubits.
+        num_local (int): Number of local qubits.
+        backend (str): Backend simulator.
+        partitioner (Union[str, BasePartitioner]): Name in `PARTITIONERS`
+            or a partitioner instance.
+        sv_location (str): Location of storage units ('memory' or 'disk').
+        profile (Optional[ThroughputProfile]): Throughput used to predict
+            time, the default profile is used if not given.
+        num_buffers (int): Number of chunk buffers that are alive at the
+            same time, e.g., when loading and simulating are overlapped.
+        restore_layout (bool): Whether the qubit layout is restored to
+            identity at finalize, see `Engine`.
+
+    Returns:
+        CostEstimate: The estimated cost.
+    """
+    profile = profile or ThroughputProfile()
+
+    if isinstance(partitioner, BasePartitioner):
+        part = partitioner
+        num_primary, num_local = part.np, part.nl
+    else:
+        part = PartitionerProvider.get_partitioner(
+            partitioner, np=num_primary, nl=num_local, backend=backend
+        )
+
+    helper = CircuitHelperProvider.get_helper(backend)
+    helper.circ = circuit
+    nq = helper.num_qubits
+
+    num_chunks = 1 << (nq - num_primary)
+    num_sus = 1 << (nq - num_local)
+    chunk_size = 1 << num_primary
+
+    # Diagonal gates are applied while loading the next sweep and
+    # permutations of global qubits relabel storage units, thus they do not
+    # move data by themselves. Layout changes are free only while storage
+    # units still hold "|000...0>", see `SvManager.apply_layout`.
+    num_sub_circs = 0
+    num_passes = 0
+    num_gates = 0
+    sim_time = 0.0
+    layout, is_initial, pending_phases = None, True, False
+    for sub_circ in part.iter_run(circuit):
+        if isinstance(sub_circ, LayoutOp):
+            if not is_initial:
+                n = _num_layout_passes(layout, sub_circ.layout, num_primary, num_local)
+                num_passes += n
+                pending_phases = pending_phases and n == 0
+            layout = sub_circ.layout
+            continue
+        if isinstance(sub_circ, QdaoStorageOp):
+            is_initial = False
+            pending_phases = pending_phases or isinstance(sub_circ, DiagonalOp)
+            continue
+        is_initial, pending_phases = False, False
+        num_sub_circs += 1
+        helper.circ = sub_circ.circ
+        n = len(list(helper.instructions))
+        num_gates += n
+        sim_time += num_chunks * (
+            profile.sim_overhead + n * chunk_size / profile.sim_throughput
+        )
+
+    if restore_layout and layout is not None and not is_initial:
+        n = _num_layout_passes(layout, list(range(nq)), num_primary, num_local)
+        num_passes += n
+        pending_phases = pending_phases and n == 0
+    num_passes += int(pending_phases)
+
+    num_sweeps = num_sub_circs + num_passes
+    sv_bytes = (1 << nq) * AMP_SIZE
+    io_ops = num_sus * (1 + 2 * num_sweeps)
+    bytes_moved = sv_bytes * (1 + 2 * num_sweeps)
+    io_time = io_ops * profile.io_latency + bytes_moved / profile.io_bandwidth
+
+    peak_memory = _peak_memory(nq, num_primary, backend, sv_location, num_buffers)
+
+    return CostEstimate(
+        num_qubits=nq,
+        num_primary=num_primary,
+        num_local=num_local,
+        num_sub_circuits=num_sub_circs,
+        num_gates=num_gates,
+        num_storage_files=num_sus if sv_location == "disk" else 0,
+        io_ops=io_ops,
+        bytes_moved=bytes_moved,
+        peak_memory=peak_memory,
+        io_time=io_time,
+        sim_time=sim_time,
+    )
+
+
+def _num_layout_passes(
+    layout: Optional[List[int]], target: List[int], num_primary: int, num_local: int
+) -> int:
+    steps = plan_layout(layout, target, num_primary, num_local)
+    return sum(kind == "pass" for kind, _, _ in steps)
+
+
+def _peak_memory(
+    num_qubits: int,
+    num_primary: int,
+    backend: str,
+    sv_location: str,
+    num_buffers: int,
+) -> int:
+    chunk_bytes = (1 << num_primary) * AMP_SIZE
+    peak_memory = chunk_bytes * (num_buffers + SIM_BUFFER_COPIES.get(backend, 1))
+    if sv_location == "memory":
+        peak_memory += (1 << num_qubits) * AMP_SIZE
+    return peak_memory
+
+
+def _max_gate_width(helper) -> int:
+    return max(
+        (len(list(helper.get_instr_qubits(i))) for i in helper.instructions),
+        default=1,
+    )
+
+
+def sweep_configs(
+    circuit: Any,
+    candidates: Optional[Iterable[Tuple[int, int]]] = None,
+    backend: str = "qiskit",
+    partitioner: str = "static",
+    sv_location: str = "disk",
+    profile: Optional[ThroughputProfile] = None,
+    max_memory: Optional[int] = None,
+    num_buffers: int = 1,
+) -> List[CostEstimate]:
+    """
+    Rank (num_primary, num_local) pairs for `circuit` without simulating.
+
+    Args:
+        circuit (Any): Quantum circuit to be estimated.
+        candidates (Optional[Iterable[Tuple[int, int]]]): (num_primary, num_local)
+            pairs to be estimated. If not given, all pairs with
+            `0 < nl < np <= nq` whose `np - nl` is not smaller than the
+            widest gate are estimated.
+        backend (str): Backend simulator.
+        partitioner (str): Name in `PARTITIONERS`.
+        sv_location (str): Location of storage units ('memory' or 'disk').
+        profile (Optional[ThroughputProfile]): Throughput used to predict time.
+        max_memory (Optional[int]): Configurations whose peak memory exceeds
+            this number of bytes are dropped.
+        num_buffers (int): Number of chunk buffers alive at the same time.
+
+    Returns:
+        List[CostEstimate]: Estimates sorted by predicted time, fastest first.
+    """
+    if candidates is None:
+        helper = CircuitHelperProvider.get_helper(backend)
+        helper.circ = circuit
+        nq = helper.num_qubits
+        width = _max_gate_width(helper)
+        candidates = [
+            (p, l) for p in range(2, nq + 1) for l in range(1, p) if p - l >= width
+        ]
+
+    estimates = []
+    for num_primary, num_local in candidates:
+        est = estimate_cost(
+            circuit,
+            num_primary=num_primary,
+            num_local=num_local,
+            backend=backend,
+            partitioner=partitioner,
+            sv_location=sv_location,
+            profile=profile,
+            num_buffers=num_buffers,
+        )
+        if max_memory is not None and est.peak_memory > max_memory:
+            continue
+        estimates.append(est)
+
+    return sorted(estimates, key=lambda est: est.predicted_time)
+
+
+def available_memory() -> int:
+    """
+    Available RAM of this machine in bytes.
+
+    `MemAvailable` of `/proc/meminfo` is used if present, which accounts
+    for reclaimable page cache, otherwise the number of free pages.
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def _existing_dir(path: str) -> str:
+    """`path`, or its closest existing ancestor if it is not created yet"""
+    path = os.path.abspath(path)
+    while not os.path.isdir(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def auto_configure(
+    circuit: Any,
+    backend: str = "qiskit",
+    partitioner: str = "static",
+    sv_location: str = "disk",
+    num_buffers: int = 1,
+    memory_budget: Optional[int] = None,
+    storage_dir: Union[str, List[str]] = ".",
+    profile: Optional[ThroughputProfile] = None,
+    num_candidates: int = 3,
+    storage_copies: int = 1,
+) -> CostEstimate:
+    """
+    Choose (num_primary, num_local) that minimizes the predicted runtime.
+
+    The memory budget defaults to `MEMORY_HEADROOM` of the available RAM.
+    The `num_candidates` largest `num_primary` that fit into the budget are
+    considered, each combined with every feasible `num_local`, and the
+    configuration with the smallest predicted time is returned.
+
+    Args:
+        circuit (Any): Quantum circuit to be simulated.
+        backend (str): Backend simulator.
+        partitioner (str): Name in `PARTITIONERS`.
+        sv_location (str): Location of storage units ('memory' or 'disk').
+        num_buffers (int): Number of chunk buffers alive at the same time,
+            e.g., 2 when loading the next chunk overlaps simulation.
+        memory_budget (Optional[int]): Memory budget in bytes.
+        storage_dir (Union[str, List[str]]): Directory holding storage
+            units, or directories they are striped across, used to check
+            free disk space and probe storage throughput in disk mode.
+        profile (Optional[ThroughputProfile]): Throughput used to predict
+            time. If not given, the machine is probed with `circuit`.
+        num_candidates (int): Number of `num_primary` values to consider.
+        storage_copies (int): Number of copies of the statevector on disk,
+            e.g., 2 for double-buffered storage.
+
+    Returns:
+        CostEstimate: Estimate of the chosen configuration.
+
+    Raises:
+        QdaoError: The statevector does not fit into the memory budget
+            or the free disk space.
+    """
+    helper = CircuitHelperProvider.get_helper(backend)
+    helper.circ = circuit
+    nq = helper.num_qubits
+    width = _max_gate_width(helper)
+
+    if memory_budget is None:
+        memory_budget = int(available_memory() * MEMORY_HEADROOM)
+
+    sv_bytes = (1 << nq) * AMP_SIZE
+    if sv_location == "disk":
+        dirs = [storage_dir] if isinstance(storage_dir, str) else storage_dir
+        # Each directory holds its share of striped storage units
+        share = -(-sv_bytes * storage_copies // len(dirs))
+        for path in dirs:
+            if share > shutil.disk_usage(_existing_dir(path)).free:
+                raise QdaoError(
+                    f"{storage_copies} copies of the statevector of {nq} qubits"
+                    f" ({sv_bytes} bytes each) do not fit into free disk space"
+                    f" of {path}"
+                )
+
+    nps = [
+        p
+        for p in range(nq, width, -1)
+        if _peak_memory(nq, p, backend, sv_location, num_buffers) <= memory_budget
+    ][:num_candidates]
+    if not nps:
+        raise QdaoError(
+            f"No configuration of {nq} qubits fits into memory budget {memory_budget}"
+        )
+
+    if profile is None:
+        profile = ThroughputProfile.calibrate(
+            circuit,
+            num_primary=min(nps[-1], 12),
+            num_local=min(nps[-1], 12) - width,
+            backend=backend,
+            sv_location=sv_location,
+            storage_dir=storage_dir if sv_location == "disk" else None,
+        )
+
+    candidates = [(p, l) for p in nps for l in range(1, p - width + 1)]
+    return sweep_configs(
+        circuit,
+        candidates=candidates,
+        backend=backend,
+        partitioner=partitioner,
+        sv_location=sv_location,
+        profile=profile,
+        num_buffers=num_buffers,
+    )[0]
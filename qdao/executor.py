@@ -10,15 +10,15 @@ Classes:
     PoolParallelExecutor: Executes a function in parallel using a thread pool.
     ConstantPoolParallelExecutor: Executes a function in parallel using a constant-sized thread pool.
     AsyncIoExecutor: Executes a function in parallel using asyncio for asynchronous I/O operations.
+    DeviceParallelExecutor: Executes a function in parallel using one thread pool per storage device.
 """
 
-import asyncio
 import concurrent.futures
 import multiprocessing as mp
 import time
 from multiprocessing.pool import ThreadPool
 from threading import Thread
-from typing import Optional
+from typing import List, Optional
 
 
 class ParallelExecutor:
@@ -165,6 +165,8 @@ class AsyncIoExecutor:
         func(*args)
 
     async def _execute_one_batch(self, func, args_list):
+        import asyncio
+
         tasks = []
 
         for args in args_list:
@@ -180,4 +182,54 @@ class AsyncIoExecutor:
             func (callable): The function to execute.
             args_list (list): The list of argument lists for the function.
         """
+        # Imported here since asyncio is slow to import and rarely used
+        import asyncio
+
         asyncio.run(self._execute_one_batch(func, args_list))
+
+
+class DeviceParallelExecutor:
+
+    """
+    Executes a function in parallel using one thread pool per storage device.
+
+    Calls touching storage units on different devices, e.g., disks that
+    storage units are striped across, run on separate pools, so that every
+    device has `num_threads` requests in flight and a slow device does not
+    hold the threads of the others.
+    """
+
+    def __init__(self, num_devices: int, num_threads: int = 2) -> None:
+        self._pools = [
+            concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+            for _ in range(num_devices)
+        ]
+
+    @property
+    def num_devices(self) -> int:
+        return len(self._pools)
+
+    def execute(self, func, args_list, devices: List[int]):
+        """
+        Execute the function on the pools of the given devices and wait.
+
+        Args:
+            func (callable): The function to execute.
+            args_list (list): The list of argument lists for the function.
+            devices (List[int]): Device of each argument list.
+
+        Raises:
+            Exception: The first exception raised by a call, after all
+                calls finished.
+        """
+        futures = [
+            self._pools[dev].submit(func, *args)
+            for args, dev in zip(args_list, devices)
+        ]
+        concurrent.futures.wait(futures)
+        for f in futures:
+            f.result()
+
+    def shutdown(self):
+        for pool in self._pools:
+            pool.shutdown(wait=False)
@@ -14,10 +14,12 @@ Modules:
 - logging: Provides a flexible framework for emitting log messages from Python programs.
 - multiprocessing: Supports spawning processes using an API similar to the threading module.
 - os: Provides a portable way of using operating system dependent functionality.
+- multiprocessing.shared_memory: Backs the in-memory statevector so that other processes can attach.
 - threading: Constructs higher-level threading interfaces.
 - typing: Provides runtime support for type hints.
 - numpy: Provides support for large, multi-dimensional arrays and matrices.
 - qdao.executor: Contains executor classes for parallel execution.
+- qdao.storage: Traces, caches, prefetches, writes back and directly reads and writes storage units.
 - qdao.util: Provides utility functions for safe import and file name generation.
 
 Classes:
@@ -25,6 +27,11 @@ Classes:
 
 - SvManager: Manages statevector storage and retrieval.
 
+Functions:
+----------
+
+- plan_layout: Plans the qubit swaps and passes changing the qubit layout.
+
 Attributes:
 -----------
 
@@ -35,8 +42,12 @@ import concurrent.futures
 import logging
 import multiprocessing as mp
 import os
+import shutil
+import sys
+import weakref
+from multiprocessing import shared_memory
 from threading import Thread
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 
@@ -44,9 +55,22 @@ from qdao.executor import (
     AsyncIoExecutor,
     BatchParallelExecutor,
     ConstantPoolParallelExecutor,
+    DeviceParallelExecutor,
     ParallelExecutor,
     PoolParallelExecutor,
 )
+from qdao.storage import (
+    CACHE_POLICIES,
+    LOAD,
+    STORE,
+    IoTrace,
+    Prefetcher,
+    WriteBackQueue,
+    aligned_empty,
+    direct_io_supported,
+    load_direct,
+    save_direct,
+)
 from qdao.util import *
 
 print_statistics = safe_import("qutils", "print_statistics")
@@ -69,8 +93,44 @@ class SvManager:
         _chunk (np.ndarray): Current chunk of the statevector.
         _is_parallel (bool): Indicates if operations should be parallelized.
         _executor (BatchParallelExecutor): Executor for parallel operations.
-        _global_sv (List[np.ndarray]): List of statevector chunks in memory.
+        _global_sv (np.ndarray): Statevector in memory, viewed as one row per
+            storage unit and backed by a shared memory block.
+        _shm (Optional[SharedMemory]): Shared memory block of `_global_sv`.
+        _shard_rows (Optional[Dict[int, int]]): Row of `_global_sv` holding
+            each storage unit of the shard, `None` if it holds all units.
         _sv_location (str): Location of statevector storage ('memory' or 'disk').
+        _unit_table (Optional[np.ndarray]): Maps a logical storage unit index to
+            the physical storage unit holding it, `None` means identity.
+        _pending_phases (list): Diagonal gates that are multiplied into
+            storage units when they are loaded in the next sweep.
+        _layout (Optional[List[int]]): Physical position of each logical
+            qubit, `None` means identity.
+        _is_initial (bool): Whether storage units still hold "|000...0>",
+            which is invariant under any qubit layout.
+        _double_buffer (bool): Whether a sweep reads storage units from one
+            buffer and writes them to the other, so that the previous
+            generation of storage units survives an interrupted sweep.
+        _gen (int): Number of committed sweeps, the parity selects the buffer
+            to read from.
+        _num_sweeps (int): Number of finished sweeps, the parity selects the
+            direction storage units are accessed in, see `chunk_order`.
+        _io_trace (Optional[IoTrace]): Records loads and stores of storage
+            units if enabled.
+        _cache (Optional[UnitCache]): RAM cache in front of storage units on
+            disk, `None` if disabled.
+        _prefetcher (Optional[Prefetcher]): Reads storage units on disk ahead
+            of `load_sv`, `None` if disabled.
+        _direct_io (bool): Whether storage units on disk are read and written
+            with direct I/O, bypassing the page cache.
+        _data_dirs (List[str]): Directories storage units on disk are
+            striped across.
+        _striping (str): Policy in `STRIPINGS` mapping storage units to
+            `_data_dirs`.
+        _io_executor (Optional[DeviceParallelExecutor]): Reads and writes
+            storage units with one thread pool per directory, `None` if
+            disabled.
+        _write_back (Optional[WriteBackQueue]): Writes storage units on
+            disk in the background, `None` if disabled.
     """
 
     def __init__(
@@ -80,6 +140,19 @@ class SvManager:
         num_local: int = 2,
         is_parallel: bool = False,
         sv_location="disk",
+        shm_name: Optional[str] = None,
+        shard: Optional[List[int]] = None,
+        double_buffer: bool = False,
+        io_trace: bool = False,
+        cache_budget: int = 0,
+        cache_policy: str = "lru",
+        prefetch_depth: int = 0,
+        prefetch_mode: str = "read",
+        direct_io: bool = False,
+        data_dir: Union[str, List[str]] = DATA_DIR,
+        striping: str = "round_robin",
+        io_threads: int = 0,
+        write_back_budget: int = 0,
     ) -> None:
         """
         Initializes the SvManager with the specified parameters.
@@ -90,6 +163,38 @@ class SvManager:
             num_local (int): Number of qubits in secondary storage.
             is_parallel (bool): Indicates if operations should be parallelized.
             sv_location (str): Location of statevector storage ('memory' or 'disk').
+            shm_name (Optional[str]): Attach to the in-memory statevector of
+                another manager, e.g., in a worker process, see `shm_name`.
+            shard (Optional[List[int]]): Storage units held in memory, e.g.,
+                by a worker process that cannot attach to the statevector of
+                the coordinator. Defaults to all storage units.
+            double_buffer (bool): Whether to keep two generations of storage
+                units on disk, e.g., for checkpointing.
+            io_trace (bool): Whether to record an I/O trace of storage
+                units, see `io_trace`.
+            cache_budget (int): Bytes of RAM caching storage units on disk,
+                dirty units are written back when evicted or at `finalize`.
+                0 disables the cache.
+            cache_policy (str): Eviction policy in `CACHE_POLICIES`.
+            prefetch_depth (int): Number of chunks whose storage units on
+                disk are read ahead while a sweep is loaded in `chunk_order`,
+                0 disables prefetching.
+            prefetch_mode (str): "read" reads units ahead into memory,
+                "advise" only advises the kernel to read their files ahead.
+            direct_io (bool): Whether to read and write storage units on disk
+                with direct I/O (`O_DIRECT`), into a page-aligned chunk. Falls
+                back to buffered I/O if the file system does not support it.
+            data_dir (Union[str, List[str]]): Directory of storage units on
+                disk, or directories they are striped across, e.g., one per
+                disk. Runs sharing a directory overwrite each other.
+            striping (str): Policy mapping storage units to directories,
+                "round_robin" or "hash", see `qdao.util.STRIPINGS`.
+            io_threads (int): Number of threads reading and writing storage
+                units on disk per directory, see `DeviceParallelExecutor`.
+                0 accesses units as configured by `is_parallel`.
+            write_back_budget (int): Bytes of storage units on disk being
+                written in the background, see `write_back`. 0 writes units
+                before `store_sv` returns.
         """
         self._nq, self._np, self._nl = num_qubits, num_primary, num_local
         self._chunk_idx = 0
@@ -97,20 +202,117 @@ class SvManager:
         self._is_parallel = is_parallel
         self._executor = BatchParallelExecutor()
 
+        # Storage units on disk are striped across directories
+        if striping not in STRIPINGS:
+            raise ValueError("Unknown striping: {}".format(striping))
+        self._data_dirs = [data_dir] if isinstance(data_dir, str) else list(data_dir)
+        if not self._data_dirs:
+            raise ValueError("At least one data directory is required")
+        self._striping = striping
+        self._io_executor = None
+        if io_threads:
+            if sv_location != "disk":
+                raise ValueError("I/O threads are only supported on disk")
+            self._io_executor = DeviceParallelExecutor(len(self._data_dirs), io_threads)
+            weakref.finalize(self, self._io_executor.shutdown)
+
         # Save statevector in memory
-        self._global_sv = []
+        self._global_sv = None
+        self._shm = None
+        self._shard_rows = None
+        if shard is not None:
+            if sv_location == "disk" or shm_name is not None:
+                raise ValueError("A shard is only supported in private memory")
+            self._shard_rows = {unit: row for row, unit in enumerate(shard)}
+        if shm_name is not None:
+            self._attach_global_sv(shm_name)
+
+        # Storage-level operations, see `apply_diagonal` and `apply_permutation`
+        self._unit_table = None
+        self._pending_phases = []
+
+        # Logical-to-physical qubit layout, see `apply_layout`
+        self._layout = None
+        self._is_initial = True
+
+        # Double-buffered storage, see `finish_sweep`
+        if double_buffer and sv_location != "disk":
+            raise ValueError("Double-buffered storage is only supported on disk")
+        self._double_buffer = double_buffer
+        self._gen = 0
+        self._on_commit = None
+        self._num_sweeps = 0
+        self._io_trace = IoTrace() if io_trace else None
+
+        # RAM cache of storage units on disk, see `cache`
+        self._cache = None
+        if cache_budget:
+            if sv_location != "disk":
+                raise ValueError("Caching storage units is only supported on disk")
+            if double_buffer:
+                raise ValueError(
+                    "Caching storage units is not supported with double-buffered "
+                    "storage, which must be persisted every sweep"
+                )
+            if cache_policy not in CACHE_POLICIES:
+                raise ValueError("Unknown cache policy: {}".format(cache_policy))
+            self._cache = CACHE_POLICIES[cache_policy](
+                cache_budget // (16 << num_local), self._read_file, self._write_file
+            )
+
+        # Read storage units of the next chunks ahead, see `chunk_order`
+        self._prefetcher = None
+        if prefetch_depth:
+            if sv_location != "disk":
+                raise ValueError("Prefetching storage units is only supported on disk")
+            self._prefetcher = Prefetcher(
+                self._read_unit_file,
+                lambda unit: self._file_name(unit, self._read_slot()),
+                depth=prefetch_depth,
+                mode=prefetch_mode,
+                skip=None if self._cache is None else self._cache.__contains__,
+            )
 
         # Storage Location Setting
         # you can choose memory or disk
         # self._sv_location = 'memory'
         self._sv_location = sv_location
 
-        if not os.path.isdir("data"):
-            os.mkdir("data")
+        if sv_location == "disk":
+            for path in self._data_dirs:
+                os.makedirs(path, exist_ok=True)
+
+        # Direct I/O bypassing the page cache, see `qdao.storage.save_direct`
+        self._direct_io = False
+        if direct_io:
+            if sv_location != "disk":
+                raise ValueError("Direct I/O is only supported on disk")
+            unsupported = [p for p in self._data_dirs if not direct_io_supported(p)]
+            if not unsupported:
+                self._direct_io = True
+                self._chunk = aligned_empty(1 << num_primary)
+                self._chunk[:] = 0
+            else:
+                logging.warning(
+                    "{} does not support direct I/O, using buffered I/O".format(
+                        ", ".join(unsupported)
+                    )
+                )
+
+        # Write storage units in the background, see `write_back`
+        self._write_back = None
+        if write_back_budget:
+            if sv_location != "disk":
+                raise ValueError("Write-back is only supported on disk")
+            self._write_back = WriteBackQueue(
+                self._write_unit_file,
+                max(1, write_back_budget // (16 << num_local)),
+                num_threads=max(2, io_threads * len(self._data_dirs)),
+            )
 
     @property
     def num_qubits(self):
-        return self._np
+        return self._nq
 
     @property
     def num_primary(self):
@@ -120,6 +322,79 @@ class SvManager:
     def num_local(self):
         return self._nl
 
+    @property
+    def sv_location(self):
+        return self._sv_location
+
+    @property
+    def data_dir(self) -> Union[str, List[str]]:
+        """Directory of storage units on disk, or the list of directories
+        they are striped across"""
+        if len(self._data_dirs) == 1:
+            return self._data_dirs[0]
+        return list(self._data_dirs)
+
+    @property
+    def striping(self) -> str:
+        return self._striping
+
+    @property
+    def layout(self):
+        return self._layout
+
+    @property
+    def double_buffer(self):
+        return self._double_buffer
+
+    @property
+    def generation(self):
+        return self._gen
+
+    @property
+    def on_commit(self):
+        return self._on_commit
+
+    @on_commit.setter
+    def on_commit(self, func):
+        """Callback invoked after each committed sweep of double-buffered storage"""
+        self._on_commit = func
+
+    @property
+    def cache(self):
+        """RAM cache of storage units, `None` if disabled"""
+        return self._cache
+
+    @property
+    def direct_io(self) -> bool:
+        """Whether storage units are accessed with direct I/O"""
+        return self._direct_io
+
+    @property
+    def prefetcher(self) -> Optional[Prefetcher]:
+        """Reads storage units ahead, `None` if disabled"""
+        return self._prefetcher
+
+    @property
+    def write_back(self) -> Optional[WriteBackQueue]:
+        """Writes storage units in the background, `None` if disabled
+
+        A unit being written is waited for before its file is read again,
+        so a sub-circuit starts loading while the stores of the previous
+        one are still in flight. All writes are finished at the end of a
+        committed sweep and in `finalize`.
+        """
+        return self._write_back
+
+    @property
+    def io_trace(self) -> Optional[IoTrace]:
+        """Loads and stores of storage units, `None` unless enabled"""
+        return self._io_trace
+
+    @property
+    def shm_name(self) -> Optional[str]:
+        """Name of the shared memory block of the in-memory statevector"""
+        return None if self._shm is None else self._shm.name
+
     @property
     def chunk_idx(self):
         return self._chunk_idx
@@ -134,7 +409,11 @@ class SvManager:
 
     @chunk.setter
     def chunk(self, data: np.ndarray):
-        self._chunk = data
+        if self._direct_io and data is not self._chunk:
+            # Storage units are read and written from the page-aligned chunk
+            self._chunk[:] = data
+        else:
+            self._chunk = data
 
     def _get_global_qubits(self, org_qubits: List[int]):
         glob_q = []
@@ -149,46 +428,229 @@ class SvManager:
     def _get_start_group_id(self, num_primary_groups: int, chunk_idx: int):
         return chunk_idx * num_primary_groups
 
+    def _num_sus(self):
+        return 1 << (self._nq - self._nl)
+
+    def _physical_unit(self, unit: int):
+        if self._unit_table is None:
+            return unit
+        return int(self._unit_table[unit])
+
+    def _row(self, unit: int) -> int:
+        """Row of `_global_sv` holding a physical storage unit"""
+        if self._shard_rows is None:
+            return unit
+        return self._shard_rows[unit]
+
+    def _view_global_sv(self, shm: shared_memory.SharedMemory):
+        self._shm = shm
+        self._global_sv = np.ndarray(
+            (self._num_sus(), 1 << self._nl), dtype=np.complex128, buffer=shm.buf
+        )
+
+    def _alloc_global_sv(self):
+        """Allocate the in-memory statevector as one shared memory block
+
+        Writing beyond the capacity of a tmpfs-backed block raises SIGBUS
+        instead of an error, so a private array is used if `/dev/shm` is
+        too small, other processes cannot attach to it then. A manager of
+        a shard only allocates rows of its own storage units.
+        """
+        if self._shard_rows is not None:
+            self._global_sv = np.zeros(
+                (len(self._shard_rows), 1 << self._nl), dtype=np.complex128
+            )
+            return
+        size = 16 << self._nq
+        if os.path.isdir("/dev/shm"):
+            st = os.statvfs("/dev/shm")
+            if st.f_bavail * st.f_frsize < size:
+                logging.warning(
+                    "Not enough shared memory for {} bytes, "
+                    "using private memory".format(size)
+                )
+                self._global_sv = np.zeros(
+                    (self._num_sus(), 1 << self._nl), dtype=np.complex128
+                )
+                return
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        self._view_global_sv(shm)
+        weakref.finalize(self, _release_shm, shm, True)
+
+    def _attach_global_sv(self, name: str):
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # Registered again in the resource tracker, which is harmless
+            # for processes spawned by the creator since they share it
+            shm = shared_memory.SharedMemory(name=name)
+        self._view_global_sv(shm)
+        weakref.finalize(self, _release_shm, shm, False)
+
     def _init_single_su(self, i):
         # Init a storage unit
-        su = np.zeros(1 << self._nl, dtype=np.complex128)
-        if i == 0:
-            su[0] = 1.0
-
         if self._sv_location == "disk":
-            fn = generate_secondary_file_name(i)
-            np.save(fn, su)
+            su = np.zeros(1 << self._nl, dtype=np.complex128)
+            if i == 0:
+                su[0] = 1.0
+            fn = self._file_name(i, self._read_slot())
+            self._save_file(fn, su)
         else:
-            self._global_sv.append(su)
+            row = self._row(i)
+            self._global_sv[row] = 0.0
+            if i == 0:
+                self._global_sv[row, 0] = 1.0
 
     @time_it
-    def initialize(self):
+    def initialize(self, units: Optional[List[int]] = None):
+        """Initialize storage units to the state "|000...0>"
+
+        Args:
+            units (Optional[List[int]]): Storage units to initialize, e.g.,
+                the shard owned by a worker process, defaults to the shard of
+                the manager or all units.
+        """
         # Calc number of storage units
-        num_sus = 1 << (self._nq - self._nl)
-        init_single_su_params = [[i] for i in range(num_sus)]
-        if self._is_parallel:
-            self._executor.execute(self._init_single_su, init_single_su_params)
+        num_sus = self._num_sus()
+        if units is None:
+            units = range(num_sus) if self._shard_rows is None else self._shard_rows
+        self._unit_table = None
+        self._pending_phases = []
+        self._layout = None
+        self._is_initial = True
+        self._gen = 0
+        self._num_sweeps = 0
+        if self._cache is not None:
+            self._cache.clear(write_back=False)
+        if self._prefetcher is not None:
+            self._prefetcher.plan([])
+        if self._write_back is not None:
+            self._write_back.barrier()
+        if self._sv_location != "disk" and self._global_sv is None:
+            self._alloc_global_sv()
+        init_single_su_params = [[i] for i in units]
+        if self._parallel_io:
+            self._execute(self._init_single_su, init_single_su_params, unit_pos=0)
         else:
-            for i in range(num_sus):
+            for i in units:
                 self._init_single_su(i)
 
-    def _load_single_su(self, isub: int, fn: str):
-        # Populate to current chunk
+    def _trace(self, op: int, unit: int, chunk_idx: Optional[int]):
+        chunk_idx = self._chunk_idx if chunk_idx is None else chunk_idx
+        self._io_trace.record(op, unit, 16 << self._nl, chunk_idx, self._num_sweeps)
+
+    def _file_name(self, unit: int, slot: int = 0) -> str:
+        return generate_secondary_file_name(
+            unit, slot, data_dir=self._data_dirs, striping=self._striping
+        )
+
+    def _dir_index(self, unit: int) -> int:
+        if len(self._data_dirs) == 1:
+            return 0
+        return STRIPINGS[self._striping](unit, len(self._data_dirs))
+
+    def _execute(self, func, params: list, unit_pos: int = 1):
+        """Call `func` on each of `params` in parallel, on the thread pool
+        of the directory holding the unit at `unit_pos` if `io_threads`"""
+        if self._io_executor is not None:
+            devices = [self._dir_index(p[unit_pos]) for p in params]
+            self._io_executor.execute(func, params, devices)
+        else:
+            self._executor.execute(func, params)
+
+    @property
+    def _parallel_io(self) -> bool:
+        return self._is_parallel or self._io_executor is not None
+
+    def _read_slot(self) -> int:
+        return self._gen & 1 if self._double_buffer else 0
+
+    def _write_slot(self) -> int:
+        return (self._gen + 1) & 1 if self._double_buffer else 0
+
+    def _read_unit_file(self, unit: int, out: Optional[np.ndarray] = None):
+        if self._write_back is not None:
+            self._write_back.wait(unit)
+        fn = self._file_name(unit, self._read_slot())
+        if self._direct_io:
+            return load_direct(fn, 1 << self._nl, out)
+        return np.load(fn)
+
+    def _save_file(self, fn: str, vec: np.ndarray):
+        if self._direct_io:
+            save_direct(fn, vec)
+        else:
+            np.save(fn, vec)
+
+    def _read_file(self, unit: int) -> np.ndarray:
+        if self._prefetcher is not None:
+            vec = self._prefetcher.take(unit)
+            if vec is not None:
+                return vec
+        return self._read_unit_file(unit)
+
+    def _write_unit_file(self, unit: int, vec: np.ndarray):
+        fn = self._file_name(unit, self._write_slot())
+        if self._double_buffer and os.path.exists(fn):
+            # The file may be a hard link to the other buffer
+            os.remove(fn)
+        self._save_file(fn, vec)
+        if self._double_buffer:
+            # A committed generation must survive a crash, see `_commit`
+            fsync_path(fn)
+
+    def _write_file(self, unit: int, vec: np.ndarray):
+        if self._write_back is None:
+            self._write_unit_file(unit, vec)
+            return
+        # `vec` is a slice of the chunk, which is reused by the next load
+        buf = aligned_empty(len(vec)) if self._direct_io else np.empty_like(vec)
+        buf[:] = vec
+        self._write_back.put(unit, buf)
+
+    def _read_su(self, unit: int) -> np.ndarray:
+        if self._sv_location == "disk":
+            if self._cache is not None:
+                return self._cache.get(unit)
+            return self._read_file(unit)
+        return self._global_sv[self._row(unit)]
 
+    def _write_su(self, unit: int, vec: np.ndarray):
         if self._sv_location == "disk":
-            vec = np.load(fn)
+            if self._cache is not None:
+                self._cache.put(unit, vec)
+            else:
+                self._write_file(unit, vec)
         else:
-            vec = self._global_sv[isub]
+            self._global_sv[self._row(unit)] = vec
+
+    def _load_single_su(self, isub: int, unit: int, chunk=None, chunk_idx=None):
+        # Populate to current chunk
+        chunk = self._chunk if chunk is None else chunk
+        if self._io_trace is not None:
+            self._trace(LOAD, unit, chunk_idx)
 
         chk_start = isub << self._nl
         chk_end = (isub << self._nl) + (1 << self._nl)
-        self._chunk[chk_start:chk_end] = vec
+        if self._direct_io and self._cache is None and self._prefetcher is None:
+            # Read into the aligned chunk without copying
+            self._read_unit_file(unit, chunk[chk_start:chk_end])
+        else:
+            chunk[chk_start:chk_end] = self._read_su(unit)
+        if self._pending_phases:
+            chunk[chk_start:chk_end] *= self._unit_phases(unit)
 
-    @time_it
-    def load_sv(self, org_qubits: List[int]):
-        """Load a `chunk` of statevector into memory
-        Reference: sim-beta/statevector/src/statevector.cpp
-        TODO: detailed description
+    def chunk_units(self, org_qubits: List[int], chunk_idx: Optional[int] = None):
+        """Storage units forming a chunk
+
+        Args:
+            org_qubits (List[int]): Qubits of the sub-circuit.
+            chunk_idx (Optional[int]): Index of the chunk, defaults to
+                current `chunk_idx`.
+
+        Returns:
+            List[Tuple[int, int]]: `(isub, unit)` pairs, i.e., logical
+                storage unit `unit` is the `isub`-th slice of the chunk.
         """
         # if len(org_qubits) <= self._nl:
         if len(org_qubits) < self._nl:
@@ -196,16 +658,18 @@ class SvManager:
                 "Number of qubits in a sub-circuit "
                 "should be larger than local qubits"
             )
+        if chunk_idx is None:
+            chunk_idx = self._chunk_idx
 
         global_qubits = self._get_global_qubits(org_qubits)
         LGDIM = len(global_qubits)  # Logical global qubits' size
         isub = 0
         num_prim_grps = self._num_primary_groups(LGDIM)
 
-        start_group_id = self._get_start_group_id(num_prim_grps, self._chunk_idx)
+        start_group_id = self._get_start_group_id(num_prim_grps, chunk_idx)
         end_group_id = start_group_id + num_prim_grps
 
-        load_single_su_params = []
+        units = []
         for gid in range(start_group_id, end_group_id):
             inds = indexes(global_qubits, gid)
             for idx in range(1 << LGDIM):
@@ -213,73 +677,449 @@ class SvManager:
 
                 assert (isub << self._nl) + (1 << self._nl) <= (1 << self._np)
 
-                fn = generate_secondary_file_name(inds[idx])
-                load_single_su_params.append((isub, fn))
-                # self._load_single_su(isub, fn)
+                units.append((isub, inds[idx]))
+        return units
+
+    def chunk_order(self, org_qubits: List[int]) -> List[int]:
+        """Order of chunks in a sweep that accesses storage units sequentially
+
+        Chunks are sorted by the physical storage unit of their first slice,
+        and units within a chunk are accessed in sorted order as well, see
+        `_access_order`. Every other sweep runs backwards, so that a sweep
+        starts with the units the previous one accessed last, which are
+        most likely still cached. The order is announced to a clairvoyant
+        `cache` and to the `prefetcher`, which reads units ahead as chunks
+        are loaded in this order.
+
+        Args:
+            org_qubits (List[int]): Qubits of the sub-circuit.
+
+        Returns:
+            List[int]: Chunk indices in the order to be simulated.
+        """
+        global_qubits = self._get_global_qubits(org_qubits)
+        num_prim_grps = self._num_primary_groups(len(global_qubits))
+        num_chunks = 1 << (self._nq - self._np)
+        first_units = [
+            self._physical_unit(indexes(global_qubits, ichunk * num_prim_grps)[0])
+            for ichunk in range(num_chunks)
+        ]
+        order = sorted(range(num_chunks), key=first_units.__getitem__)
+        if self._num_sweeps & 1:
+            order.reverse()
+        plan_cache = self._cache is not None and self._cache.needs_plan
+        if plan_cache or self._prefetcher is not None:
+            self._plan_sweep(org_qubits, order, plan_cache)
+        return order
+
+    def _plan_sweep(self, org_qubits: List[int], order: List[int], plan_cache: bool):
+        """Announce units of a sweep to the cache and the prefetcher, the
+        next sweep is estimated to access units sorted in the opposite
+        direction"""
+        reverse = bool(self._num_sweeps & 1)
+        chunks = []
+        for ichunk in order:
+            units = [u for _, u in self.chunk_units(org_qubits, ichunk)]
+            chunks.append(sorted(map(self._physical_unit, units), reverse=reverse))
+        if plan_cache:
+            next_seq = range(self._num_sus())
+            self._cache.plan(
+                [u for units in chunks for u in units],
+                next_seq if reverse else next_seq[::-1],
+            )
+        if self._prefetcher is not None:
+            self._prefetcher.plan(chunks)
+
+    def _access_order(self, org_qubits: List[int]) -> List[Tuple[int, int]]:
+        """`(isub, physical unit)` pairs of the current chunk in access order"""
+        params = [
+            (isub, self._physical_unit(unit))
+            for isub, unit in self.chunk_units(org_qubits)
+        ]
+        params.sort(key=lambda p: p[1], reverse=bool(self._num_sweeps & 1))
+        return params
+
+    @time_it
+    def load_sv(self, org_qubits: List[int]):
+        """Load a `chunk` of statevector into memory
+        Reference: sim-beta/statevector/src/statevector.cpp
+        TODO: detailed description
+        """
+        load_single_su_params = self._access_order(org_qubits)
+        if self._prefetcher is not None:
+            self._prefetcher.advance()
 
         # with mp.Pool(mp.cpu_count()) as pool:
         #    pool.starmap(self._load_single_su, load_single_su_params)
         #    pool.close()
         #    pool.join()
-        if self._is_parallel:
+        if self._parallel_io:
             # executor = ParallelExecutor(self._load_single_su, load_single_su_params)
             # executor.execute()
-            self._executor.execute(self._load_single_su, load_single_su_params)
+            self._execute(self._load_single_su, load_single_su_params)
         else:
-            for isub, fn in load_single_su_params:
-                self._load_single_su(isub, fn)
+            for isub, unit in load_single_su_params:
+                self._load_single_su(isub, unit)
 
         return self._chunk
 
-    def _store_single_su(self, isub: int, fn: str):
+    def _store_single_su(self, isub: int, unit: int, chunk=None, chunk_idx=None):
         # Save corresponding slice to secondary storage
+        chunk = self._chunk if chunk is None else chunk
         chk_start = isub << self._nl
         chk_end = (isub << self._nl) + (1 << self._nl)
-
-        if self._sv_location == "disk":
-            np.save(fn, self._chunk[chk_start:chk_end])
-        else:
-            self._global_sv[isub] = self._chunk[chk_start:chk_end]
-            # np.save(fn, self._chunk[chk_start:chk_end])
-            # print(self._chunk[chk_start:chk_end])
+        if self._io_trace is not None:
+            self._trace(STORE, unit, chunk_idx)
+        self._write_su(unit, chunk[chk_start:chk_end])
 
     @time_it
     def store_sv(self, org_qubits: List[int]):
-        # if len(org_qubits) <= self._nl:
-        if len(org_qubits) < self._nl:
-            raise ValueError(
-                "Number of qubits in a sub-circuit should be larger than local qubits"
-            )
-
-        global_qubits = self._get_global_qubits(org_qubits)
-        LGDIM = len(global_qubits)  # Logical global qubits' size
-        isub = 0
-        num_prim_grps = self._num_primary_groups(LGDIM)
-
-        start_group_id = self._get_start_group_id(num_prim_grps, self._chunk_idx)
-        end_group_id = start_group_id + num_prim_grps
-
-        store_single_su_params = []
-        for gid in range(start_group_id, end_group_id):
-            inds = indexes(global_qubits, gid)
-            for idx in range(1 << LGDIM):
-                isub = (1 << LGDIM) * (gid - start_group_id) + idx
-                assert (isub << self._nl) + (1 << self._nl) <= (1 << self._np)
-                fn = generate_secondary_file_name(inds[idx])
-                store_single_su_params.append((isub, fn))
-                # self._store_single_su(isub, fn)
+        store_single_su_params = self._access_order(org_qubits)
+        self._is_initial = False
 
         # with mp.Pool(mp.cpu_count()) as pool:
         #    pool.starmap(self._store_single_su, store_single_su_params)
         #    pool.close()
         #    pool.join()
-        if self._is_parallel:
+        if self._parallel_io:
             # executor = ParallelExecutor(self._store_single_su, store_single_su_params)
             # executor.execute()
-            self._executor.execute(self._store_single_su, store_single_su_params)
+            self._execute(self._store_single_su, store_single_su_params)
+        else:
+            for isub, unit in store_single_su_params:
+                self._store_single_su(isub, unit)
+
+    def _batch_access_order(self, org_qubits: List[int], chunks: List[int], batch):
+        """`(isub, physical unit, row, chunk)` of a batch of chunks, sorted
+        by unit across chunks"""
+        params = [
+            (isub, self._physical_unit(unit), row, ichunk)
+            for row, ichunk in zip(batch, chunks)
+            for isub, unit in self.chunk_units(org_qubits, ichunk)
+        ]
+        params.sort(key=lambda p: p[1], reverse=bool(self._num_sweeps & 1))
+        return params
+
+    @time_it
+    def load_batch(self, org_qubits: List[int], chunks: List[int], batch: np.ndarray):
+        """Load chunks into the rows of `batch`
+
+        Storage units of all chunks are accessed in one sorted pass, which
+        is sequential if the batch covers every chunk of a sweep.
+
+        Args:
+            org_qubits (List[int]): Qubits of the sub-circuit.
+            chunks (List[int]): Chunk index of each row.
+            batch (np.ndarray): A `(len(chunks), 1 << num_primary)` buffer.
+        """
+        params = self._batch_access_order(org_qubits, chunks, batch)
+        if self._prefetcher is not None:
+            self._prefetcher.advance(len(chunks))
+        if self._parallel_io:
+            self._execute(self._load_single_su, params)
+        else:
+            for isub, unit, row, ichunk in params:
+                self._load_single_su(isub, unit, row, ichunk)
+        return batch
+
+    @time_it
+    def store_batch(self, org_qubits: List[int], chunks: List[int], batch: np.ndarray):
+        """Store the rows of `batch` into the storage units of `chunks`,
+        see `load_batch`"""
+        params = self._batch_access_order(org_qubits, chunks, batch)
+        self._is_initial = False
+        if self._parallel_io:
+            self._execute(self._store_single_su, params)
+        else:
+            for isub, unit, row, ichunk in params:
+                self._store_single_su(isub, unit, row, ichunk)
+
+    def _unit_phases(self, unit: int) -> np.ndarray:
+        """Product of pending diagonals over the amplitudes of a physical unit"""
+        offsets = np.arange(1 << self._nl)
+        phases = np.ones(1 << self._nl, dtype=np.complex128)
+        for qubits, diag, inv_table in self._pending_phases:
+            logical = unit if inv_table is None else int(inv_table[unit])
+            idx = np.zeros(1 << self._nl, dtype=np.int64)
+            for i, q in enumerate(qubits):
+                if q < self._nl:
+                    idx |= ((offsets >> q) & 1) << i
+                else:
+                    idx |= ((logical >> (q - self._nl)) & 1) << i
+            phases *= diag[idx]
+        return phases
+
+    def apply_diagonal(self, qubits: List[int], diag: np.ndarray):
+        """Apply a diagonal gate as an elementwise phase multiply
+
+        The phases are not applied immediately, but multiplied into each
+        storage unit when it is loaded during the next sweep, i.e., the
+        next sub-circuit. This makes diagonal gates free of data movement.
+        `finish_sweep` must be called once every unit has been loaded.
+
+        Args:
+            qubits (List[int]): Qubits the gate acts on.
+            diag (np.ndarray): Diagonal of the gate matrix in little-endian
+                order of `qubits`.
+        """
+        inv_table = None
+        if self._unit_table is not None:
+            inv_table = np.empty_like(self._unit_table)
+            inv_table[self._unit_table] = np.arange(len(self._unit_table))
+        self._pending_phases.append((list(qubits), np.asarray(diag), inv_table))
+        self._is_initial = False
+
+    def apply_permutation(self, qubits: List[int], perm: np.ndarray):
+        """Apply a basis permutation on global qubits by relabeling units
+
+        No amplitude is moved, only the unit index table is updated.
+
+        Args:
+            qubits (List[int]): Qubits the gate acts on, all of them must be
+                global qubits, i.e., not smaller than `num_local`.
+            perm (np.ndarray): `perm[j] = i` if the gate maps basis state
+                `j` to `i`, in little-endian order of `qubits`.
+        """
+        if any(q < self._nl for q in qubits):
+            raise ValueError(
+                "Permutation on local qubits cannot be applied by relabeling units"
+            )
+        units = np.arange(self._num_sus())
+        table = units if self._unit_table is None else self._unit_table
+        global_qubits = [q - self._nl for q in qubits]
+
+        inv_perm = np.argsort(perm)
+        i = np.zeros_like(units)
+        for k, g in enumerate(global_qubits):
+            i |= ((units >> g) & 1) << k
+        j = inv_perm[i]
+
+        # New unit `s` holds what old unit `perm^-1(s)` held
+        src = units.copy()
+        for k, g in enumerate(global_qubits):
+            src = (src & ~(1 << g)) | (((j >> k) & 1) << g)
+        self._unit_table = table[src]
+        self._is_initial = False
+
+    def finish_sweep(self):
+        """Every storage unit has been loaded once, pending phases are applied
+
+        With double-buffered storage, every unit has also been written to
+        the other buffer, which becomes the current generation.
+        """
+        self._pending_phases = []
+        self._num_sweeps += 1
+        if self._prefetcher is not None:
+            self._prefetcher.plan([])
+        self._commit()
+
+    def _commit(self):
+        if not self._double_buffer:
+            return
+        # Units of the new generation are durable before it is recorded
+        if self._write_back is not None:
+            self._write_back.barrier()
+        for path in self._data_dirs:
+            fsync_path(path)
+        self._gen += 1
+        if self._on_commit is not None:
+            self._on_commit()
+
+    def get_state(self) -> dict:
+        """Metadata needed to resume from the current generation"""
+        return {
+            "gen": self._gen,
+            "unit_table": self._unit_table,
+            "pending_phases": self._pending_phases,
+            "layout": self._layout,
+            "is_initial": self._is_initial,
+        }
+
+    def set_state(self, state: dict):
+        """Resume from metadata returned by `get_state`, storage units of the
+        recorded generation must be intact"""
+        self._gen = state["gen"]
+        self._unit_table = state["unit_table"]
+        self._pending_phases = list(state["pending_phases"])
+        self._layout = state["layout"]
+        self._is_initial = state["is_initial"]
+
+    def _permute_pass(self, perm: List[int], layout: Optional[List[int]]):
+        """Move the amplitudes of physical qubit `p` to physical qubit `perm[p]`
+
+        This is a single sweep over all storage units, the global qubits
+        being moved must fit in a chunk together with the local qubits.
+        `layout` is the qubit layout after the pass.
+        """
+        real_qubits = sorted(
+            set(range(self._nl)) | {p for p in range(self._nq) if perm[p] != p}
+        )
+        if len(real_qubits) > self._np:
+            raise ValueError(
+                "Cannot move more than {} global qubits in one pass".format(
+                    self._np - self._nl
+                )
+            )
+        k = len(real_qubits)
+        pos = {p: i for i, p in enumerate(real_qubits)}
+        # Chunk bit `src[j]` is moved to chunk bit `j`
+        src = [0] * k
+        for i, p in enumerate(real_qubits):
+            src[pos[perm[p]]] = i
+        # Axis `1 + a` of the reshaped chunk is chunk bit `k - 1 - a`
+        axes = [0] + [k - src[k - 1 - a] for a in range(k)]
+
+        for ichunk in self.chunk_order(real_qubits):
+            self._chunk_idx = ichunk
+            chunk = self.load_sv(real_qubits)
+            self.chunk = chunk.reshape((-1,) + (2,) * k).transpose(axes).reshape(-1)
+            self.store_sv(real_qubits)
+        self._set_layout(layout)
+        self.finish_sweep()
+
+    def _set_layout(self, layout: List[int]):
+        self._layout = None if layout == list(range(self._nq)) else list(layout)
+
+    @time_it
+    def apply_layout(self, layout: Optional[List[int]]):
+        """Move logical qubits to the given physical positions
+
+        Sub-circuits generated under a layout act on physical qubits, i.e.,
+        the layout decides which logical qubits are local. Changing the
+        layout is free while storage units still hold "|000...0>".
+        Otherwise, the layout is reached by a sequence of qubit swaps:
+        swaps between global qubits relabel storage units, and swaps
+        involving local qubits are batched into reorganization passes
+        moving at most `num_primary - num_local` global qubits each.
+        `layout` is up to date after each pass, so an interrupted call can
+        be repeated.
+
+        Args:
+            layout (Optional[List[int]]): Physical position of each logical
+                qubit, `None` means identity.
+        """
+        identity = list(range(self._nq))
+        target = identity if layout is None else list(layout)
+        if sorted(target) != identity:
+            raise ValueError("Invalid layout: {}".format(layout))
+
+        if not self._is_initial:
+            steps = plan_layout(self._layout, target, self._np, self._nl)
+            for kind, arg, step_layout in steps:
+                if kind == "pass":
+                    self._permute_pass(arg, step_layout)
+                else:
+                    self.apply_permutation(arg, np.array([0, 2, 1, 3]))
+                    self._set_layout(step_layout)
+
+        self._set_layout(target)
+
+    def _link_sweep(self, src: List[int]):
+        """Write physical unit `src[unit]` of current generation as unit
+        `unit` of the next generation, by hard links if possible"""
+        for unit, phys in enumerate(src):
+            fn_src = self._file_name(int(phys), self._read_slot())
+            fn_dst = self._file_name(unit, self._write_slot())
+            if os.path.exists(fn_dst):
+                os.remove(fn_dst)
+            try:
+                os.link(fn_src, fn_dst)
+            except OSError:
+                shutil.copyfile(fn_src, fn_dst)
+        self._commit()
+
+    @time_it
+    def finalize(self, restore_layout: bool = True):
+        """Materialize pending storage-level operations
+
+        The layout is restored to identity unless `restore_layout` is
+        False, pending phases are applied by a streaming pass over all
+        storage units, and units are renamed so that logical unit `i` is
+        stored in physical unit `i` again, e.g., for `retrieve_sv`.
+        With double-buffered storage, each step is a committed sweep and
+        the final generation is moved to the first buffer.
+
+        Args:
+            restore_layout (bool): Whether to move qubits back to identity
+                layout, otherwise `layout` must be passed to `retrieve_sv`.
+        """
+        if restore_layout and self._layout is not None:
+            self.apply_layout(None)
+        if self._pending_phases:
+            for unit in range(self._num_sus()):
+                if self._io_trace is not None:
+                    self._trace(LOAD, unit, -1)
+                    self._trace(STORE, unit, -1)
+                self._write_su(unit, self._read_su(unit) * self._unit_phases(unit))
+            self._pending_phases = []
+            self._commit()
+        if self._cache is not None:
+            # Units are read from files from now on, e.g., by `retrieve_sv`
+            self._cache.clear()
+        if self._prefetcher is not None:
+            self._prefetcher.plan([])
+        if self._write_back is not None:
+            self._write_back.barrier()
+
+        if self._double_buffer:
+            if self._unit_table is not None:
+                table, self._unit_table = self._unit_table, None
+                self._link_sweep(table)
+            if self._read_slot():
+                self._link_sweep(range(self._num_sus()))
+            return
+
+        if self._unit_table is None:
+            return
+        if self._sv_location == "disk":
+            for unit in range(self._num_sus()):
+                os.replace(self._file_name(unit), self._file_name(unit) + ".tmp")
+            for unit, phys in enumerate(self._unit_table):
+                src = self._file_name(int(phys)) + ".tmp"
+                if self._dir_index(int(phys)) == self._dir_index(unit):
+                    os.replace(src, self._file_name(unit))
+                else:
+                    # Directories may be on different file systems
+                    shutil.move(src, self._file_name(unit))
         else:
-            for isub, fn in store_single_su_params:
-                self._store_single_su(isub, fn)
+            # Follow cycles of the table, i.e., move units in place
+            visited = np.zeros(len(self._unit_table), dtype=bool)
+            for start in range(len(self._unit_table)):
+                if visited[start] or self._unit_table[start] == start:
+                    continue
+                tmp = self._global_sv[start].copy()
+                unit = start
+                while True:
+                    visited[unit] = True
+                    phys = int(self._unit_table[unit])
+                    if phys == start:
+                        self._global_sv[unit] = tmp
+                        break
+                    self._global_sv[unit] = self._global_sv[phys]
+                    unit = phys
+        self._unit_table = None
+
+    def read_unit(self, unit: int) -> np.ndarray:
+        """Amplitudes of physical storage unit `unit`, e.g., for a worker
+        process moving units of its shard"""
+        return self._read_su(unit)
+
+    def write_unit(self, unit: int, vec: np.ndarray):
+        """Overwrite the amplitudes of physical storage unit `unit`"""
+        self._write_su(unit, vec)
+
+    def iter_units(self) -> Iterator[np.ndarray]:
+        """Iterate storage units in the order of the statevector
+
+        This allows reducing the final statevector, e.g., to probabilities,
+        without holding it in memory at once. Must be used after `finalize`,
+        amplitudes are in the order of `layout` if it was not restored.
+
+        Yields:
+            np.ndarray: Amplitudes of each storage unit.
+        """
+        for unit in range(self._num_sus()):
+            yield self._read_su(self._physical_unit(unit))
 
     # @time_it
     # def store_sv(self, org_qubits: List[int]):
@@ -343,4 +1183,80 @@ class SvManager:
     #            pass
 
 
+def plan_layout(
+    layout: Optional[List[int]],
+    target: List[int],
+    num_primary: int,
+    num_local: int,
+) -> List[Tuple[str, List[int], List[int]]]:
+    """Plan the qubit swaps moving from `layout` to `target`
+
+    Swaps between global qubits are steps of their own, swaps involving
+    local qubits are batched into reorganization passes moving at most
+    `num_primary - num_local` global qubits each.
+
+    Args:
+        layout (Optional[List[int]]): Current physical position of each
+            logical qubit, `None` means identity.
+        target (List[int]): Physical positions to reach.
+        num_primary (int): Number of primary qubits.
+        num_local (int): Number of local qubits.
+
+    Returns:
+        List[Tuple[str, List[int], List[int]]]: Steps `(kind, arg, layout)`
+            with the layout after the step. A "swap" step relabels storage
+            units to swap the global qubits `arg`, a "pass" step sweeps over
+            all storage units to move physical qubit `p` to `arg[p]`.
+    """
+    num_qubits = len(target)
+    identity = list(range(num_qubits))
+    cur = list(identity if layout is None else layout)
+    where = [0] * num_qubits
+    for q, p in enumerate(cur):
+        where[p] = q
+
+    steps = []
+    # Swaps batched in a pass, and the layout after them
+    batch, moved, batch_layout = list(identity), set(), None
+
+    def flush():
+        nonlocal batch, moved, batch_layout
+        if batch_layout is not None:
+            steps.append(("pass", batch, batch_layout))
+        batch, moved, batch_layout = list(identity), set(), None
+
+    for q in range(num_qubits):
+        a, b = cur[q], target[q]
+        if a == b:
+            continue
+        # Swap physical qubits `a` and `b`
+        r = where[b]
+        cur[q], cur[r] = b, a
+        where[a], where[b] = r, q
+
+        if a >= num_local and b >= num_local:
+            flush()
+            steps.append(("swap", [a, b], list(cur)))
+            continue
+        moving = {p for p in (a, b) if p >= num_local}
+        if len(moved | moving) > num_primary - num_local:
+            flush()
+        moved |= moving
+        swap = {a: b, b: a}
+        batch = [swap.get(p, p) for p in batch]
+        batch_layout = list(cur)
+    flush()
+    return steps
+
+
+def _release_shm(shm: shared_memory.SharedMemory, unlink: bool):
+    try:
+        shm.close()
+    except BufferError:
+        # Views of the statevector are still alive
+        pass
+    if unlink:
+        shm.unlink()
+
+
 SvManager.print_statistics = print_statistics
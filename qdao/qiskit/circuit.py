@@ -1,7 +1,8 @@
 from typing import List, Optional
 
 import numpy as np
-from qiskit.circuit import CircuitInstruction, QuantumCircuit
+from qiskit.circuit import CircuitInstruction, Gate, QuantumCircuit
+from qiskit.circuit.library import UnitaryGate
 
 from qdao.base_circuit_wrapper import BaseCircWrapper
 
@@ -10,6 +11,27 @@ from qdao.base_circuit_wrapper import BaseCircWrapper
 # QuantumCircuit.initialize = initialize
 
 
+def prepend_initialize(sv: np.ndarray, circ: QuantumCircuit) -> QuantumCircuit:
+    """New circuit initializing `sv` before running `circ`
+
+    Comments:
+        1. Currently qiskit QuantumCircuit.initialize will
+           append an initialize instruction at the end of
+           the circuit, we need create a new instance and
+           init from statevector at the begining
+        2. `sv` is a chunk, which is not normalized, it is trusted
+           and carried without validation, see `ChunkInitialize`
+    """
+    from .data_preparation.initializer import ChunkInitialize
+
+    nq = circ.num_qubits
+    init_circ = QuantumCircuit(nq)
+    # FIXME: To test the performance of qiskit, do not initialize
+    init_circ.append(ChunkInitialize(sv), range(nq))
+    init_circ.compose(circ, inplace=True)
+    return init_circ
+
+
 class QiskitCircuitWrapper(BaseCircWrapper):
     """
     Wrapper class for Qiskit QuantumCircuit.
@@ -21,6 +43,7 @@ class QiskitCircuitWrapper(BaseCircWrapper):
     """
     def __init__(self, circ: Optional[QuantumCircuit] = None) -> None:
         self._circ = circ or None
+        self._layout = None
 
     @property
     def circ(self):
@@ -30,6 +53,17 @@ class QiskitCircuitWrapper(BaseCircWrapper):
     def circ(self, circ: QuantumCircuit):
         self._circ = circ
 
+    @property
+    def layout(self):
+        return self._layout
+
+    @layout.setter
+    def layout(self, layout: Optional[List[int]]):
+        self._layout = layout
+
+    def _physical(self, q: int) -> int:
+        return q if self._layout is None else self._layout[q]
+
     @property
     def num_qubits(self):
         if not isinstance(self._circ, QuantumCircuit):
@@ -44,33 +78,44 @@ class QiskitCircuitWrapper(BaseCircWrapper):
 
     def get_instr_qubits(self, instruction: CircuitInstruction):
         for q in instruction.qubits:
-            yield q._index
+            yield self._physical(q._index)
+
+    def get_instr_matrix(self, instruction: CircuitInstruction):
+        op = instruction.operation
+        if not isinstance(op, Gate) or instruction.clbits:
+            return None
+        if getattr(op, "condition", None) is not None:
+            return None
+        try:
+            return op.to_matrix()
+        except Exception:
+            # E.g., unbound parameters or gates without definition
+            return None
+
+    def gen_unitary_instr(self, matrix: np.ndarray, qubits: List[int]):
+        if not isinstance(self._circ, QuantumCircuit):
+            raise ValueError("Please set circ")
+        return CircuitInstruction(
+            UnitaryGate(matrix, check_input=False),
+            qubits=[self._circ.qubits[q] for q in qubits],
+        )
 
     def init_circ_from_sv(self, sv: np.ndarray):
-        """Initialize qiskit QuantumCircuit from given statevector
-        
+        """Pair the circuit with the statevector it starts from
+
         Args:
             sv (np.ndarray): Statevector to initialize the circuit with.
 
         Comments:
-            1. Currently qiskit QuantumCircuit.initialize will
-               append an initialize instruction at the end of
-               the circuit, we need create a new instance and
-               init from statevector at the begining
+            1. The statevector is not copied into an initialize instruction,
+               `QiskitSimulator` evolves it in place if possible, see
+               `prepend_initialize` otherwise.
         """
         from qdao.simulator import QdaoSimObj
 
-        from .data_preparation.initializer import Initialize
-
         if not isinstance(self._circ, QuantumCircuit):
             raise ValueError("Please set circ before initializing from sv!")
-
-        nq = self._circ.num_qubits
-        circ = QuantumCircuit(nq)
-        # FIXME: To test the performance of qiskit, do not initialize
-        circ.append(Initialize(sv), range(nq))
-        circ.compose(self._circ, inplace=True)
-        return QdaoSimObj(sv, circ)
+        return QdaoSimObj(sv, self._circ)
 
     def gen_sub_circ(
         self, instrs: List[CircuitInstruction], num_local: int, num_primary: int
@@ -96,7 +141,7 @@ class QiskitCircuitWrapper(BaseCircWrapper):
         qset = set(range(num_local))
         for instr in instrs:
             for q in instr.qubits:
-                qset.add(q._index)
+                qset.add(self._physical(q._index))
 
         sub_circ = QuantumCircuit(num_primary)
 
@@ -104,9 +149,7 @@ class QiskitCircuitWrapper(BaseCircWrapper):
 
         assert len(real_qubits) <= num_primary
 
-        qubit_map = {
-            self._circ.qubits[q]: sub_circ.qubits[i] for i, q in enumerate(real_qubits)
-        }
+        qubit_map = {q: sub_circ.qubits[i] for i, q in enumerate(real_qubits)}
 
         for instr in instrs:
             op = instr.operation.copy()
@@ -114,7 +157,7 @@ class QiskitCircuitWrapper(BaseCircWrapper):
                 raise NotImplementedError(
                     "Currently not support measure/control operations"
                 )
-            qubits = [qubit_map[q] for q in instr.qubits]
+            qubits = [qubit_map[self._physical(q._index)] for q in instr.qubits]
             sub_instr = CircuitInstruction(op, qubits=qubits)
             sub_circ.append(sub_instr)
 
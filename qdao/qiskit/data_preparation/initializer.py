@@ -19,6 +19,7 @@ from __future__ import annotations
 import typing
 from collections.abc import Sequence
 
+import numpy as np
 from qiskit.circuit.instruction import Instruction
 from qiskit.circuit.quantumcircuit import QuantumCircuit
 from qiskit.circuit.quantumregister import QuantumRegister
@@ -98,3 +99,39 @@ class Initialize(Instruction):
 
     def broadcast_arguments(self, qargs, cargs):
         return self._stateprep.broadcast_arguments(qargs, cargs)
+
+
+class ChunkInitialize(Instruction):
+    """Initialization to a chunk of a statevector, for QDAO internal use only.
+
+    A chunk is a slice of a normalized statevector, so its norm is usually
+    less than 1. Unlike :class:`Initialize`, the amplitudes are trusted:
+    they are neither validated one by one nor normalized. The chunk buffer
+    is carried as a single parameter, which Aer reads as a
+    ``set_statevector`` instruction, the definition is only built for
+    other simulators.
+    """
+
+    _directive = True
+
+    def __init__(self, sv: np.ndarray) -> None:
+        """
+        Args:
+            sv: Amplitudes of the chunk, whose length is a power of 2.
+        """
+        num_qubits = len(sv).bit_length() - 1
+        if len(sv) != 1 << num_qubits or num_qubits == 0:
+            raise ValueError("Desired statevector length not a positive power of 2.")
+        super().__init__(
+            "set_statevector",
+            num_qubits,
+            0,
+            [np.ascontiguousarray(sv, dtype=np.complex128)],
+        )
+
+    def _define(self):
+        q = QuantumRegister(self.num_qubits, "q")
+        initialize_circuit = QuantumCircuit(q, name="init_def")
+        initialize_circuit.reset(q)
+        initialize_circuit.append(StatePreparation(self.params[0]), q)
+        self.definition = initialize_circuit
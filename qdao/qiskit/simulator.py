@@ -1,17 +1,67 @@
 import logging
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import numpy as np
+from qiskit import QuantumCircuit
 from qiskit_aer import Aer
+from qiskit_aer.quantum_info.states.aer_state import AerState
 from qdao.exceptions import QdaoError
 
+from .circuit import prepend_initialize
+
+# Instructions that do not change the statevector
+_SKIPPED_INSTRS = {"barrier", "id", "save_statevector", "save_state"}
+
+
+def _compile(
+    circ: QuantumCircuit, qubits: Optional[List[int]] = None
+) -> Tuple[List[Tuple[List[int], np.ndarray]], float]:
+    """Unitary matrices of the instructions of `circ` and its global phase,
+    instructions without a matrix are replaced by their definitions"""
+    qubits = list(range(circ.num_qubits)) if qubits is None else qubits
+    ops, phase = [], float(circ.global_phase)
+    for instr in circ.data:
+        op = instr.operation
+        if op.name in _SKIPPED_INSTRS:
+            continue
+        if instr.clbits:
+            raise QdaoError(
+                "Currently not support measure/control operations: {}".format(op.name)
+            )
+        targets = [qubits[circ.find_bit(q).index] for q in instr.qubits]
+        try:
+            ops.append((targets, op.to_matrix()))
+        except Exception:
+            if op.definition is None:
+                raise QdaoError("Cannot simulate {} in place".format(op.name))
+            sub_ops, sub_phase = _compile(op.definition, targets)
+            ops.extend(sub_ops)
+            phase += sub_phase
+    return ops, phase
+
 
 class QiskitSimulator:
+    """
+    Simulates sub-circuits with Qiskit Aer.
+
+    On CPU, the chunk is handed to Aer without copying it and is evolved in
+    place, i.e., the returned statevector is the input buffer. Otherwise, the
+    chunk is copied into an initialize instruction and the statevector is
+    copied out of the result.
+
+    Args:
+        provider (Optional[str]): Use another provider, e.g., "ddsim".
+        fusion (Optional[bool]): Whether Aer fuses gates.
+        device (str): Device of Aer.
+        inplace (bool): Whether to evolve chunks in place if possible.
+    """
+
     def __init__(
         self,
         provider: Optional[str] = None,
         fusion: Optional[bool] = False,
         device: str = "CPU",
+        inplace: bool = True,
     ) -> None:
         if provider:
             if provider == "ddsim":
@@ -25,8 +75,52 @@ class QiskitSimulator:
         self._sim.set_options(method="statevector")
         self._sim.set_options(device=device)
 
+        self._state = None
+        if inplace and not provider and device == "CPU":
+            self._state = AerState(
+                method="statevector", device=device, fusion_enable=bool(fusion)
+            )
+        # Matrices of the last sub-circuit, which is run once per chunk
+        self._compiled = None
+
+    @property
+    def inplace(self) -> bool:
+        return self._state is not None
+
+    def _compiled_ops(self, circ: QuantumCircuit):
+        if self._compiled is None or self._compiled[0] is not circ:
+            ops, phase = _compile(circ)
+            # Aer keeps the global phase of a renewed state, so it is
+            # multiplied into the first gate instead
+            if phase and ops:
+                ops[0] = (ops[0][0], ops[0][1] * np.exp(1j * phase))
+            elif phase:
+                ops = [([0], np.eye(2) * np.exp(1j * phase))]
+            self._compiled = (circ, ops)
+        return self._compiled[1]
+
+    def _run_inplace(self, sv: np.ndarray, circ: QuantumCircuit) -> np.ndarray:
+        ops = self._compiled_ops(circ)
+        state = self._state
+        state.allocate_qubits(circ.num_qubits)
+        # Aer copies instead if `sv` is not a contiguous complex128 buffer
+        state.initialize(sv, copy=False)
+        try:
+            for qubits, mat in ops:
+                state.apply_unitary(qubits, mat)
+            state.flush()
+            return state.move_to_ndarray()
+        finally:
+            state.close()
+            state.renew()
+
     def run(self, simobj) -> np.ndarray:
-        res = self._sim.run(simobj.circ).result()
+        """Simulate `simobj.circ` starting from the statevector `simobj.objs[0]`"""
+        sv, circ = simobj.objs[0], simobj.circ
+        if self._state is not None:
+            return self._run_inplace(sv, circ)
+
+        res = self._sim.run(prepend_initialize(sv, circ)).result()
         if not res.success:
             raise QdaoError(
                 f"Running simulation using qiskit failed due to: {res.status}"
@@ -34,6 +128,6 @@ class QiskitSimulator:
         try:
             sv = res.get_statevector().data
         except Exception as e:
-            sv = np.zeros(1 << simobj.circ.num_qubits)
+            sv = np.zeros(1 << circ.num_qubits)
             logging.info(f"No state vector for this sub-circuit: {e}")
-        return sv
\ No newline at end of file
+        return sv
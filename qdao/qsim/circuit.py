@@ -19,13 +19,18 @@ Classes:
 
 - QsimCircuitHelper: Helper class for managing Qsim quantum circuits.
 
+Functions:
+----------
+
+- build_sub_circ: Materializes remapped gates of a sub-circuit into a cirq circuit.
+
 Attributes:
 -----------
 
 - Circuit: The main class for representing a quantum circuit in Cirq.
 - GateOperation: The class for representing gate operations in Cirq.
 """
-import copy
+import functools
 import logging
 from typing import List, Optional
 
@@ -36,7 +41,7 @@ import cirq
 
 # from qsimcirq.qsim_circuit import (_translate_ControlledGate, QSimCircuit
 #                                 )
-from qdao.circuit import QdaoCircuit
+from qdao.circuit import QdaoCircuit, RemappedGate
 
 from cirq.circuits import Circuit
 
@@ -52,6 +57,18 @@ from cirq.ops.gate_operation import GateOperation
 # gate_kind = _cirq_gate_kind(qsim_gate)
 
 
+def build_sub_circ(num_primary: int, gates: List[RemappedGate]) -> Circuit:
+    """Materialize remapped gates into a cirq circuit of `num_primary` qubits
+
+    Each operation applies the gate of the original operation on the
+    remapped line qubits, the gate itself is shared.
+    """
+    sub_qubits = cirq.LineQubit.range(num_primary)
+    return cirq.Circuit(
+        gate.gate.gate.on(*[sub_qubits[p] for p in gate.pos]) for gate in gates
+    )
+
+
 class QsimCircuitHelper:
     """
     Helper class for managing and manipulating Qsim quantum circuits.
@@ -145,7 +162,8 @@ class QsimCircuitHelper:
         Args:
             instrs (List[QuantumGate]): A list of instructions
         Return:
-            QdaoCircuit
+            QdaoCircuit, of which the cirq circuit is built from remapped
+            gates on first access
         """
 
         if not isinstance(self._circ, Circuit):
@@ -163,11 +181,6 @@ class QsimCircuitHelper:
                 # q.x index of q
                 qset.add(q.x)
 
-        # Size of sub-circ is fixed at num_primary
-        sub_circ = cirq.Circuit()
-        # sub_qubits: corresponds to operations in a sub_circ
-        sub_qubits = cirq.LineQubit.range(num_primary)
-
         # Sorting []
         real_qubits = sorted(list(qset))
 
@@ -175,25 +188,17 @@ class QsimCircuitHelper:
 
         qubit_map = {q: i for i, q in enumerate(real_qubits)}
 
+        gates = []
         for instr in instrs:
             # Check whether current circuit exceeds num_primary
-            bind = False
-            new_instr = copy.deepcopy(instr)
-            new_pos = [qubit_map[q.x] for q in instr.qubits]
+            new_pos = tuple(qubit_map[q.x] for q in instr.qubits)
             # num_primary limitaion
             # 0~(num_primary-1)
-            for x in new_pos:
-                if x > (num_primary - 1):
-                    bind = True
-                    break
             # Out of bound
-            if bind:
+            if any(x > (num_primary - 1) for x in new_pos):
                 break
 
-            new_instr.pos = new_pos
-
-            # Add an op
-            sub_circ.append(new_instr)
+            gates.append(RemappedGate(instr, new_pos))
 
             logging.debug(
                 "New_instr::pos::{}, real_qubits::{}".format(new_pos, real_qubits)
@@ -202,4 +207,9 @@ class QsimCircuitHelper:
         # logging.debug(sub_circ.draw_circuit())
         logging.info("\nGenerated sub-circ, real_qubits::{}".format(real_qubits))
 
-        return QdaoCircuit(sub_circ, real_qubits)
+        return QdaoCircuit(
+            None,
+            real_qubits,
+            gates=gates,
+            builder=functools.partial(build_sub_circ, num_primary),
+        )
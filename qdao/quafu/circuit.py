@@ -18,6 +18,11 @@ Classes:
 
 - QuafuCircuitHelper: Helper class for managing Quafu quantum circuits.
 
+Functions:
+----------
+
+- build_sub_circ: Materializes remapped gates of a sub-circuit into a Quafu circuit.
+
 Attributes:
 -----------
 
@@ -27,8 +32,9 @@ Attributes:
 - ControlledGate: Represents controlled gates.
 """
 import copy
+import functools
 import logging
-from typing import List, Optional
+from typing import Any, List, Optional
 
 import numpy as np
 from qdao.base_circuit_wrapper import BaseCircWrapper
@@ -40,6 +46,36 @@ from quafu.circuits.quantum_circuit import (
 )
 
 
+def build_sub_circ(num_primary: int, gates: List[Any]) -> QuantumCircuit:
+    """
+    Materializes remapped gates into a Quafu circuit of `num_primary` qubits.
+
+    Each gate is a shallow copy of the original one with remapped positions,
+    i.e., gate matrices are shared with the original circuit.
+
+    Args:
+        num_primary (int): The number of primary qubits.
+        gates (List[RemappedGate]): Gates of the sub-circuit.
+
+    Returns:
+        QuantumCircuit: The sub-circuit.
+    """
+    sub_circ = QuantumCircuit(num_primary)
+    for gate in gates:
+        new_instr = copy.copy(gate.gate)
+        if isinstance(new_instr, SingleQubitGate):
+            new_instr.pos = gate.pos[0]
+        else:
+            new_instr.pos = list(gate.pos)
+            if isinstance(new_instr, ControlledGate):
+                # Positions of a controlled gate are its controls then targets
+                num_ctrls = len(new_instr.ctrls)
+                new_instr.ctrls = new_instr.pos[:num_ctrls]
+                new_instr.targs = new_instr.pos[num_ctrls:]
+        sub_circ.add_gate(new_instr)
+    return sub_circ
+
+
 class QuafuCircuitHelper(BaseCircWrapper):
     """
     Helper class for managing and manipulating Quafu quantum circuits.
@@ -50,17 +86,20 @@ class QuafuCircuitHelper(BaseCircWrapper):
 
     Attributes:
         _circ (QuantumCircuit): The quantum circuit object.
+        _layout (Optional[List[int]]): Physical position of each logical qubit.
 
     Methods:
         circ: Returns or sets the quantum circuit object.
         num_qubits: Returns the number of qubits in the circuit.
         instructions: Returns the list of instructions in the circuit.
         get_instr_qubits: Returns the qubits involved in a given instruction.
+        get_instr_matrix: Returns the unitary matrix of a given gate.
         init_circ_from_sv: Initializes a circuit from a given state vector.
         gen_sub_circ: Generates a sub-circuit based on a list of instructions.
     """
     def __init__(self, circ: Optional[QuantumCircuit] = None) -> None:
         self._circ = circ or None
+        self._layout = None
 
     @property
     def circ(self):
@@ -70,6 +109,17 @@ class QuafuCircuitHelper(BaseCircWrapper):
     def circ(self, circ: QuantumCircuit):
         self._circ = circ
 
+    @property
+    def layout(self):
+        return self._layout
+
+    @layout.setter
+    def layout(self, layout: Optional[List[int]]):
+        self._layout = layout
+
+    def _physical(self, q: int) -> int:
+        return q if self._layout is None else self._layout[q]
+
     @property
     def num_qubits(self):
         """Get the number of qubits in the original circuit"""
@@ -91,8 +141,31 @@ class QuafuCircuitHelper(BaseCircWrapper):
 
     def get_instr_qubits(self, instruction: QuantumGate):
         if isinstance(instruction, SingleQubitGate):
-            return [instruction.pos]
-        return instruction.pos
+            return [self._physical(instruction.pos)]
+        if self._layout is None:
+            return instruction.pos
+        return [self._layout[q] for q in instruction.pos]
+
+    def get_instr_matrix(self, instruction: QuantumGate):
+        if not isinstance(instruction, QuantumGate):
+            return None
+        try:
+            matrix = np.asarray(instruction.matrix)
+        except NotImplementedError:
+            return None
+        if isinstance(instruction, SingleQubitGate):
+            return matrix
+        # Quafu matrices are big-endian in ascending order of positions,
+        # axis `a` of the reshaped result is bit `k - 1 - a` of `pos`
+        pos = list(instruction.pos)
+        k = len(pos)
+        rank = np.argsort(np.argsort(pos))
+        axes = [int(rank[k - 1 - a]) for a in range(k)]
+        return (
+            matrix.reshape((2,) * (2 * k))
+            .transpose(axes + [k + a for a in axes])
+            .reshape(1 << k, 1 << k)
+        )
 
     def init_circ_from_sv(self, sv: np.ndarray):
         from qdao.simulator import QdaoSimObj
@@ -113,12 +186,13 @@ class QuafuCircuitHelper(BaseCircWrapper):
             num_primary (int): The number of primary qubits.
 
         Returns:
-            QdaoCircuit: The generated sub-circuit.
+            QdaoCircuit: The generated sub-circuit, of which the Quafu circuit
+                is built from remapped gates on first access.
         """
         if not isinstance(self._circ, QuantumCircuit):
             raise ValueError("Please set self._circ")
 
-        from qdao.circuit import QdaoCircuit
+        from qdao.circuit import QdaoCircuit, RemappedGate
 
         # 1. Get the set of qubits
         qset = set(range(num_local))
@@ -130,33 +204,33 @@ class QuafuCircuitHelper(BaseCircWrapper):
             for q in self.get_instr_qubits(instr):
                 qset.add(q)
 
-        # Fix qbit
-        sub_circ = QuantumCircuit(num_primary)
         # Sorting []
         real_qubits = sorted(list(qset))
 
         assert len(real_qubits) <= num_primary
 
         qubit_map = {q: i for i, q in enumerate(real_qubits)}
+        if self._layout is not None:
+            qubit_map = {
+                q: qubit_map[p] for q, p in enumerate(self._layout) if p in qubit_map
+            }
 
+        gates = []
         for instr in instrs:
-            new_instr = copy.deepcopy(instr)
             if isinstance(instr, SingleQubitGate):
-                new_pos = qubit_map[instr.pos]
+                new_pos = (qubit_map[instr.pos],)
             else:
-                new_pos = [qubit_map[q] for q in instr.pos]
-                if isinstance(instr, ControlledGate):
-                    new_ctrls = [qubit_map[q] for q in instr.ctrls]
-                    new_targs = [qubit_map[q] for q in instr.targs]
-                    new_instr.ctrls = new_ctrls
-                    new_instr.targs = new_targs
-
-            new_instr.pos = new_pos
-            sub_circ.add_gate(new_instr)
+                new_pos = tuple(qubit_map[q] for q in instr.pos)
+            gates.append(RemappedGate(instr, new_pos))
             logging.debug(
                 "New_instr::pos::{}, real_qubits::{}".format(new_pos, real_qubits)
             )
 
         # logging.debug(sub_circ.draw_circuit())
         logging.info("\nGenerated sub-circ, real_qubits::{}".format(real_qubits))
-        return QdaoCircuit(sub_circ, real_qubits)
+        return QdaoCircuit(
+            None,
+            real_qubits,
+            gates=gates,
+            builder=functools.partial(build_sub_circ, num_primary),
+        )
@@ -1,23 +1,42 @@
 import numpy as np
-from quafu.simulators.simulator import simulate
+from quafu.simulators.qfvm import simulate_circuit
+
+from qdao.exceptions import QdaoError
 
 
 class QuafuSimulator:
+    """
+    Simulates sub-circuits with the qfvm simulator of Quafu.
+
+    The chunk is evolved in place, i.e., the returned statevector is the
+    input buffer, and exactly `circ.num` qubits are simulated.
+    """
+
     def __init__(self) -> None:
         pass
 
     def run(self, simobj) -> np.ndarray:
-        sv = simulate(
-            simobj.circ, psi=simobj.objs[0], output="state_vector"
-        ).get_statevector()
-
-        # FIXME: Quafu will return sv less than QuantumCircuit size
-        expected_sv_size = 1 << simobj.circ.num
-        if sv.shape[0] < expected_sv_size:
-            assert expected_sv_size % sv.shape[0] == 0
-
-        # Calculate repeat number
-        rep_num = expected_sv_size // sv.shape[0]
-        if rep_num == 1:
+        sv, circ = simobj.objs[0], simobj.circ
+        if sv.shape[0] != 1 << circ.num:
+            raise QdaoError(
+                "Statevector of {} amplitudes does not match a circuit of {} "
+                "qubits".format(sv.shape[0], circ.num)
+            )
+        if sv.dtype != np.complex128 or not sv.flags.c_contiguous:
+            # qfvm would silently simulate a converted copy
+            sv = np.ascontiguousarray(sv, dtype=np.complex128)
+
+        # qfvm cannot simulate a circuit without gates
+        if not circ.used_qubits:
             return sv
-        return np.tile(sv, rep_num)
+
+        res = simulate_circuit(circ, sv)
+        if res.shape != sv.shape:
+            raise QdaoError(
+                "Quafu simulated {} amplitudes instead of {}".format(
+                    res.shape[0], sv.shape[0]
+                )
+            )
+        if not np.shares_memory(res, sv):
+            sv[:] = res
+        return sv
@@ -0,0 +1,254 @@
+"""
+Simulation Results Module
+=========================
+
+This module reduces the final statevector to results in a single streaming
+pass over storage units, see `SvManager.iter_units`, so that results of
+circuits whose statevector does not fit in memory can be obtained. Amplitude
+`j` of unit `i` is the amplitude of basis state `(i << num_local) + j`, and
+qubit 0 is the least significant bit, as in Qiskit.
+
+Classes:
+--------
+
+- UnitReducer: Base class of reducers consuming storage units in order.
+- Probabilities: Probabilities of basis states, optionally marginal over some qubits.
+- SampleCounts: Measurement samples drawn without materializing probabilities.
+- PauliExpectations: Expectation values of diagonal Pauli strings.
+- StatevectorWriter: Writes the statevector into a single `.npy` file.
+- UnitWriter: Writes the statevector as one `.npy` file per storage unit.
+
+Functions:
+----------
+
+- reduce_units: Feed storage units to reducers in one pass.
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from qdao.exceptions import QdaoError
+from qdao.util import SECONDARY_PREFIX, SECONDARY_SUFFIX
+
+
+def _bits(index: np.ndarray, qubits: List[int]) -> np.ndarray:
+    """Value of `qubits` of each basis state index, qubits[0] is the lowest bit"""
+    key = np.zeros_like(index)
+    for j, q in enumerate(qubits):
+        key |= ((index >> q) & 1) << j
+    return key
+
+
+class UnitReducer(ABC):
+    """
+    Base class of reducers consuming storage units in order.
+
+    Attributes:
+        num_qubits (int): Number of qubits of the statevector.
+    """
+
+    def __init__(self, num_qubits: int) -> None:
+        self.num_qubits = num_qubits
+
+    @abstractmethod
+    def update(self, unit: int, vec: np.ndarray) -> None:
+        """Consume the amplitudes `vec` of storage unit `unit`"""
+
+    @abstractmethod
+    def result(self) -> Any:
+        """Result after all storage units are consumed"""
+
+    @staticmethod
+    def _indexes(unit: int, vec: np.ndarray) -> np.ndarray:
+        return np.arange(unit * len(vec), (unit + 1) * len(vec), dtype=np.int64)
+
+
+class Probabilities(UnitReducer):
+    """
+    Probabilities of basis states, marginal over `qubits` if given.
+
+    Attributes:
+        qubits (Optional[List[int]]): Qubits to keep, all qubits if `None`.
+    """
+
+    def __init__(self, num_qubits: int, qubits: Optional[List[int]] = None) -> None:
+        super().__init__(num_qubits)
+        self.qubits = qubits
+        width = num_qubits if qubits is None else len(qubits)
+        self._probs = np.zeros(1 << width)
+
+    def update(self, unit: int, vec: np.ndarray) -> None:
+        probs = np.abs(vec) ** 2
+        if self.qubits is None:
+            self._probs[unit * len(vec) : (unit + 1) * len(vec)] = probs
+        else:
+            key = _bits(self._indexes(unit, vec), self.qubits)
+            self._probs += np.bincount(key, weights=probs, minlength=len(self._probs))
+
+    def result(self) -> np.ndarray:
+        return self._probs
+
+
+class SampleCounts(UnitReducer):
+    """
+    Measurement samples drawn without materializing probabilities.
+
+    The number of shots landing in each storage unit is drawn from a
+    binomial distribution conditioned on the preceding units, which is
+    equivalent to sampling from the full distribution.
+
+    Attributes:
+        shots (int): Number of samples.
+        qubits (Optional[List[int]]): Qubits measured, all qubits if `None`.
+    """
+
+    def __init__(
+        self,
+        num_qubits: int,
+        shots: int,
+        seed: Optional[int] = None,
+        qubits: Optional[List[int]] = None,
+    ) -> None:
+        super().__init__(num_qubits)
+        self.shots = shots
+        self.qubits = qubits
+        self._rng = np.random.default_rng(seed)
+        self._remaining_shots = shots
+        self._remaining_mass = 1.0
+        self._counts = {}
+
+    def update(self, unit: int, vec: np.ndarray) -> None:
+        probs = np.abs(vec) ** 2
+        mass = probs.sum()
+        if self._remaining_shots == 0 or mass == 0:
+            self._remaining_mass -= mass
+            return
+        # Probability of a shot landing in this unit given it missed the previous
+        p = 1.0
+        if self._remaining_mass > 0:
+            p = min(1.0, mass / self._remaining_mass)
+        shots = int(self._rng.binomial(self._remaining_shots, p))
+        self._remaining_shots -= shots
+        self._remaining_mass -= mass
+        if shots == 0:
+            return
+
+        index = self._indexes(unit, vec)
+        if self.qubits is not None:
+            index = _bits(index, self.qubits)
+        drawn = self._rng.multinomial(shots, probs / mass)
+        for key, count in zip(index[drawn > 0], drawn[drawn > 0]):
+            self._counts[int(key)] = self._counts.get(int(key), 0) + int(count)
+
+    def result(self) -> Dict[str, int]:
+        """Counts of each measured bitstring, qubit 0 is the rightmost bit"""
+        width = self.num_qubits if self.qubits is None else len(self.qubits)
+        return {
+            format(key, "0{}b".format(width)): count
+            for key, count in sorted(self._counts.items())
+        }
+
+
+class PauliExpectations(UnitReducer):
+    """
+    Expectation values of diagonal Pauli strings, e.g., "ZZII".
+
+    Labels follow Qiskit, i.e., the rightmost character acts on qubit 0.
+    Strings containing X or Y need amplitudes of different storage units
+    at once and are not supported.
+
+    Attributes:
+        paulis (List[str]): Pauli strings of 'I' and 'Z'.
+    """
+
+    def __init__(self, num_qubits: int, paulis: List[str]) -> None:
+        super().__init__(num_qubits)
+        self.paulis = paulis
+        self._masks = []
+        for label in paulis:
+            if len(label) != num_qubits or set(label) - {"I", "Z"}:
+                raise QdaoError(
+                    "Unsupported observable {}, expect a string of I and Z "
+                    "of length {}".format(label, num_qubits)
+                )
+            self._masks.append([q for q, c in enumerate(reversed(label)) if c == "Z"])
+        self._values = np.zeros(len(paulis))
+
+    def update(self, unit: int, vec: np.ndarray) -> None:
+        probs = np.abs(vec) ** 2
+        index = self._indexes(unit, vec)
+        for i, qubits in enumerate(self._masks):
+            parity = np.zeros_like(index)
+            for q in qubits:
+                parity ^= (index >> q) & 1
+            self._values[i] += probs.sum() - 2 * probs[parity == 1].sum()
+
+    def result(self) -> Dict[str, float]:
+        return {label: float(v) for label, v in zip(self.paulis, self._values)}
+
+
+class StatevectorWriter(UnitReducer):
+    """
+    Writes the statevector into a single `.npy` file, which is memory-mapped
+    so that it is never held in memory at once.
+
+    Attributes:
+        path (str): Path of the output file.
+    """
+
+    def __init__(self, num_qubits: int, path: str) -> None:
+        super().__init__(num_qubits)
+        self.path = path
+        self._sv = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.complex128, shape=(1 << num_qubits,)
+        )
+
+    def update(self, unit: int, vec: np.ndarray) -> None:
+        self._sv[unit * len(vec) : (unit + 1) * len(vec)] = vec
+
+    def result(self) -> str:
+        self._sv.flush()
+        del self._sv
+        return self.path
+
+
+class UnitWriter(UnitReducer):
+    """
+    Writes the statevector as one `.npy` file per storage unit, named as
+    storage units on disk, i.e., `sv{i}.npy`.
+
+    Attributes:
+        directory (str): Output directory.
+    """
+
+    def __init__(self, num_qubits: int, directory: str) -> None:
+        super().__init__(num_qubits)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def update(self, unit: int, vec: np.ndarray) -> None:
+        name = SECONDARY_PREFIX + str(unit) + SECONDARY_SUFFIX
+        np.save(os.path.join(self.directory, name), vec)
+
+    def result(self) -> str:
+        return self.directory
+
+
+def reduce_units(units: Iterable[np.ndarray], reducers: List[UnitReducer]) -> List[Any]:
+    """
+    Feed storage units to reducers in one pass.
+
+    Args:
+        units (Iterable[np.ndarray]): Storage units in order, e.g.,
+            `SvManager.iter_units()`.
+        reducers (List[UnitReducer]): Reducers to be fed.
+
+    Returns:
+        List[Any]: Result of each reducer.
+    """
+    for unit, vec in enumerate(units):
+        for reducer in reducers:
+            reducer.update(unit, vec)
+    return [reducer.result() for reducer in reducers]
@@ -9,8 +9,8 @@ a unified interface, making it easy to switch between different backend provider
 Modules:
 --------
 
-- qdao.qiskit.simulator: Contains the QiskitSimulator class.
-- qdao.quafu.simulator: Contains the QuafuSimulator class.
+- qdao.qiskit.simulator: Contains the QiskitSimulator class, imported on first use.
+- qdao.quafu.simulator: Contains the QuafuSimulator class, imported on first use.
 
 Classes:
 --------
@@ -21,11 +21,11 @@ Classes:
 Attributes:
 -----------
 
-- SIMS: A dictionary mapping backend names to their respective simulator classes.
+- SIMS: A registry mapping backend names to their respective simulator classes,
+  which are imported on first use.
 """
 
-from qdao.qiskit.simulator import QiskitSimulator
-from qdao.quafu.simulator import QuafuSimulator
+from qdao.util import LazyRegistry
 
 
 class QdaoSimObj:
@@ -65,7 +65,13 @@ class QdaoSimObj:
         return self._run_options
 
 
-SIMS = {"qiskit": QiskitSimulator, "quafu": QuafuSimulator}
+# Backends are imported on first use
+SIMS = LazyRegistry(
+    {
+        "qiskit": "qdao.qiskit.simulator:QiskitSimulator",
+        "quafu": "qdao.quafu.simulator:QuafuSimulator",
+    }
+)
 
 
 class SimulatorProvider:
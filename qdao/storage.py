@@ -0,0 +1,980 @@
+"""
+Storage Module
+==============
+
+This module provides I/O traces of storage units and pluggable stores to
+replay them on. An `SvManager` created with `io_trace=True` records every
+load and store of a storage unit, and `replay` drives any store with the
+recorded accesses at full speed, so that stores can be compared on the
+access patterns of real circuits without running simulators, see
+`python -m qdao.bench.replay --help`.
+
+It also provides RAM caches of storage units, which an `SvManager` on disk
+puts in front of its files if given a `cache_budget`, and a prefetcher
+reading the units of the next chunks of a sweep ahead of the engine if
+given a `prefetch_depth`, and a write-back queue storing units in the
+background if given a `write_back_budget`.
+
+Storage units can be read and written with direct I/O (`O_DIRECT`), which
+bypasses the page cache that only thrashes if the statevector is much
+larger than RAM. Such units are still `.npy` files, whose header is padded
+to `DIRECT_IO_ALIGNMENT` bytes so that amplitudes start at an aligned
+offset, see `save_direct`.
+
+Modules:
+--------
+
+- abc: Abstract base classes of stores and caches.
+- concurrent.futures: Background reads of the prefetcher and writes of the write-back queue.
+- heapq: Priority queue of the clairvoyant cache.
+- logging: Warns if the prefetcher cannot advise the kernel.
+- os: Positional reads and writes of shard files, page cache advice and direct I/O.
+- struct: Headers of `.npy` files written with direct I/O.
+- threading: Guards caches accessed by parallel loads and stores, bounds the write-back queue.
+- time: Timestamps of trace records.
+- zlib: Compression of storage units.
+- numpy: Provides the trace records and storage units.
+
+Classes:
+--------
+
+- IoTrace: Records loads and stores of storage units.
+- BaseStore: Reads and writes storage units of a fixed size.
+- FileStore: One `.npy` file per storage unit, as `SvManager` on disk.
+- MemmapStore: All storage units in one memory-mapped file.
+- CompressedStore: One zlib-compressed file per storage unit.
+- ShardedStore: Storage units interleaved over a few shard files.
+- UnitCache: RAM cache of storage units with lazy write-back.
+- LruCache: Evicts the least recently used storage unit.
+- ClairvoyantCache: Evicts the storage unit used furthest in the future.
+- Prefetcher: Reads storage units of the next chunks of a sweep ahead.
+- WriteBackQueue: Writes storage units in the background.
+
+Functions:
+----------
+
+- replay: Replay an I/O trace on a store.
+- aligned_empty: Allocate an array aligned for direct I/O.
+- direct_io_supported: Whether a directory supports direct I/O.
+- save_direct: Save a storage unit as a `.npy` file with direct I/O.
+- load_direct: Load a storage unit saved by `save_direct` with direct I/O.
+
+Attributes:
+-----------
+
+- TRACE_DTYPE: Record type of an I/O trace.
+- LOAD: Operation code of a load.
+- STORE: Operation code of a store.
+- STORES: A dictionary mapping store names to their classes.
+- CACHE_POLICIES: A dictionary mapping eviction policies to cache classes.
+- PREFETCH_MODES: Modes of the prefetcher.
+- DIRECT_IO_ALIGNMENT: Alignment of buffers, offsets and sizes of direct I/O.
+"""
+import concurrent.futures
+import heapq
+import logging
+import os
+import struct
+import weakref
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock, Semaphore
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from qdao.exceptions import QdaoError
+
+LOAD = 0
+STORE = 1
+
+TRACE_DTYPE = np.dtype(
+    [
+        ("op", "u1"),
+        ("unit", "<i8"),
+        ("nbytes", "<i8"),
+        ("time", "<f8"),
+        ("chunk", "<i8"),
+        ("sweep", "<i4"),
+    ]
+)
+
+
+class IoTrace:
+    """
+    Records loads and stores of storage units.
+
+    Each record holds the operation, the physical storage unit, its size in
+    bytes, the time since the trace started in seconds, the chunk being
+    loaded or stored, -1 for units accessed one by one, e.g., by
+    `SvManager.finalize`, and the sweep, i.e., the index of the sub-circuit
+    or reorganization pass, see `SvManager.finish_sweep`.
+    """
+
+    def __init__(self) -> None:
+        self._records = []
+        self._start = perf_counter()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, op: int, unit: int, nbytes: int, chunk: int, sweep: int):
+        # Appending to a list is atomic, units may be accessed by threads
+        self._records.append(
+            (op, unit, nbytes, perf_counter() - self._start, chunk, sweep)
+        )
+
+    def clear(self):
+        self._records = []
+        self._start = perf_counter()
+
+    def to_array(self) -> np.ndarray:
+        """Records as a structured array of `TRACE_DTYPE`"""
+        return np.array(self._records, dtype=TRACE_DTYPE)
+
+    def save(self, path: str):
+        """Save records into a `.npy` file, see `load`"""
+        np.save(path, self.to_array())
+
+    @staticmethod
+    def load(path: str) -> np.ndarray:
+        trace = np.load(path)
+        if trace.dtype != TRACE_DTYPE:
+            raise QdaoError("{} is not an I/O trace".format(path))
+        return trace
+
+
+class BaseStore(ABC):
+    """
+    Reads and writes storage units of a fixed size.
+
+    Subclasses extend `open` and implement `read` and `write`. A store is opened for
+    `num_units` units of `unit_size` amplitudes under the directory `root`,
+    which is created if missing.
+
+    Attributes:
+        root (str): Directory of the files of the store.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._num_units = 0
+        self._unit_size = 0
+
+    def open(self, num_units: int, unit_size: int):
+        os.makedirs(self.root, exist_ok=True)
+        self._num_units = num_units
+        self._unit_size = unit_size
+
+    @abstractmethod
+    def read(self, unit: int) -> np.ndarray:
+        """Amplitudes of a unit"""
+
+    @abstractmethod
+    def write(self, unit: int, vec: np.ndarray):
+        """Overwrite the amplitudes of a unit"""
+
+    def flush(self):
+        """Persist written units"""
+
+    def close(self):
+        self.flush()
+
+
+class FileStore(BaseStore):
+    """
+    One `.npy` file per storage unit, as `SvManager` stores units on disk.
+    """
+
+    def _file_name(self, unit: int) -> str:
+        return os.path.join(self.root, "sv{}.npy".format(unit))
+
+    def read(self, unit: int) -> np.ndarray:
+        return np.load(self._file_name(unit))
+
+    def write(self, unit: int, vec: np.ndarray):
+        np.save(self._file_name(unit), vec)
+
+
+class MemmapStore(BaseStore):
+    """
+    All storage units in one memory-mapped file, one row per unit.
+    """
+
+    def __init__(self, root: str) -> None:
+        super().__init__(root)
+        self._mm = None
+
+    def open(self, num_units: int, unit_size: int):
+        super().open(num_units, unit_size)
+        self._mm = np.memmap(
+            os.path.join(self.root, "sv.bin"),
+            dtype=np.complex128,
+            mode="w+",
+            shape=(num_units, unit_size),
+        )
+
+    def read(self, unit: int) -> np.ndarray:
+        return np.array(self._mm[unit])
+
+    def write(self, unit: int, vec: np.ndarray):
+        self._mm[unit] = vec
+
+    def flush(self):
+        if self._mm is not None:
+            self._mm.flush()
+
+    def close(self):
+        super().close()
+        self._mm = None
+
+
+class CompressedStore(BaseStore):
+    """
+    One zlib-compressed file per storage unit.
+
+    Args:
+        root (str): Directory of the files of the store.
+        level (int): Compression level of zlib, from 1 (fastest) to 9.
+    """
+
+    def __init__(self, root: str, level: int = 1) -> None:
+        super().__init__(root)
+        self._level = level
+
+    def _file_name(self, unit: int) -> str:
+        return os.path.join(self.root, "sv{}.z".format(unit))
+
+    def read(self, unit: int) -> np.ndarray:
+        with open(self._file_name(unit), "rb") as f:
+            return np.frombuffer(zlib.decompress(f.read()), dtype=np.complex128)
+
+    def write(self, unit: int, vec: np.ndarray):
+        data = zlib.compress(np.ascontiguousarray(vec, np.complex128), self._level)
+        with open(self._file_name(unit), "wb") as f:
+            f.write(data)
+
+
+class ShardedStore(BaseStore):
+    """
+    Storage units interleaved over a few shard files.
+
+    Unit `i` is stored in shard `i % num_shards` at row `i // num_shards`,
+    and is accessed by positional reads and writes of its file descriptor.
+
+    Args:
+        root (str): Directory of the files of the store.
+        num_shards (int): Number of shard files.
+    """
+
+    def __init__(self, root: str, num_shards: int = 4) -> None:
+        super().__init__(root)
+        self._num_shards = num_shards
+        self._fds = []
+
+    def open(self, num_units: int, unit_size: int):
+        super().open(num_units, unit_size)
+        self.close()
+        rows = -(-num_units // self._num_shards)
+        for shard in range(self._num_shards):
+            fd = os.open(
+                os.path.join(self.root, "shard{}.bin".format(shard)),
+                os.O_RDWR | os.O_CREAT,
+                0o644,
+            )
+            os.ftruncate(fd, rows * unit_size * 16)
+            self._fds.append(fd)
+
+    def _locate(self, unit: int):
+        offset = (unit // self._num_shards) * self._unit_size * 16
+        return self._fds[unit % self._num_shards], offset
+
+    def read(self, unit: int) -> np.ndarray:
+        fd, offset = self._locate(unit)
+        data = os.pread(fd, self._unit_size * 16, offset)
+        return np.frombuffer(data, dtype=np.complex128)
+
+    def write(self, unit: int, vec: np.ndarray):
+        fd, offset = self._locate(unit)
+        os.pwrite(fd, np.ascontiguousarray(vec, np.complex128).tobytes(), offset)
+
+    def flush(self):
+        for fd in self._fds:
+            os.fsync(fd)
+
+    def close(self):
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+
+
+STORES = {
+    "file": FileStore,
+    "memmap": MemmapStore,
+    "compressed": CompressedStore,
+    "sharded": ShardedStore,
+}
+
+
+class UnitCache(ABC):
+    """
+    RAM cache of storage units with lazy write-back.
+
+    Units are read through `read` on a miss and written through `write`
+    only when a dirty unit is evicted or the cache is flushed. Subclasses
+    choose the unit to evict by implementing `_touch`, `_forget` and
+    `_victim`.
+
+    Args:
+        capacity (int): Maximum number of cached storage units.
+        read (Callable[[int], np.ndarray]): Reads a unit from the backing store.
+        write (Callable[[int, np.ndarray], None]): Writes a unit to the
+            backing store.
+    """
+
+    # Whether the cache needs the access order of each sweep, see `plan`
+    needs_plan = False
+
+    def __init__(
+        self,
+        capacity: int,
+        read: Callable[[int], np.ndarray],
+        write: Callable[[int, np.ndarray], None],
+    ) -> None:
+        if capacity < 1:
+            raise QdaoError("A cache must hold at least one storage unit")
+        self.capacity = capacity
+        self._read = read
+        self._write = write
+        self._units = {}
+        self._dirty = set()
+        # Loads and stores of a chunk may run in threads
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writebacks = 0
+
+    def __len__(self) -> int:
+        return len(self._units)
+
+    def __contains__(self, unit: int) -> bool:
+        # Locked, an evicted unit is written back before it is removed
+        with self._lock:
+            return unit in self._units
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writebacks": self.writebacks,
+        }
+
+    @abstractmethod
+    def _touch(self, unit: int, is_store: bool):
+        """A cached unit is loaded or stored"""
+
+    @abstractmethod
+    def _forget(self, unit: int):
+        """A unit is removed from the cache"""
+
+    @abstractmethod
+    def _victim(self) -> int:
+        """The unit to evict"""
+
+    def plan(self, seq: List[int], next_seq: List[int]):
+        """Announce the units loaded in the current sweep and, estimated,
+        in the next one, in order of access"""
+
+    def _evict(self):
+        unit = self._victim()
+        self._forget(unit)
+        vec = self._units.pop(unit)
+        if unit in self._dirty:
+            self._dirty.discard(unit)
+            self._write(unit, vec)
+            self.writebacks += 1
+
+    def get(self, unit: int) -> np.ndarray:
+        """Amplitudes of a unit, which must not be modified, a later `put`
+        of the unit replaces them"""
+        with self._lock:
+            vec = self._units.get(unit)
+            if vec is not None:
+                self.hits += 1
+                self._touch(unit, False)
+                return vec
+            self.misses += 1
+        vec = self._read(unit)
+        with self._lock:
+            if unit not in self._units:
+                if len(self._units) >= self.capacity:
+                    self._evict()
+                self._units[unit] = vec
+            self._touch(unit, False)
+        return vec
+
+    def put(self, unit: int, vec: np.ndarray):
+        """Store amplitudes of a unit, which are written back lazily"""
+        # Copied, `vec` is usually a slice of a chunk being reused
+        vec = np.array(vec, dtype=np.complex128)
+        with self._lock:
+            if unit not in self._units and len(self._units) >= self.capacity:
+                self._evict()
+            self._units[unit] = vec
+            self._dirty.add(unit)
+            self._touch(unit, True)
+
+    def flush(self):
+        """Write back dirty units, which stay cached"""
+        with self._lock:
+            for unit in sorted(self._dirty):
+                self._write(unit, self._units[unit])
+                self.writebacks += 1
+            self._dirty.clear()
+
+    def clear(self, write_back: bool = True):
+        """Drop all units, dirty units are written back unless discarded"""
+        if write_back:
+            self.flush()
+        with self._lock:
+            for unit in list(self._units):
+                self._forget(unit)
+            self._units.clear()
+            self._dirty.clear()
+
+
+class LruCache(UnitCache):
+    """
+    Evicts the least recently used storage unit.
+
+    Sweeps alternate direction, see `SvManager.chunk_order`, so the units
+    used last in a sweep are used first in the next one, which makes LRU
+    close to optimal without knowing the plan.
+    """
+
+    def __init__(self, capacity, read, write) -> None:
+        super().__init__(capacity, read, write)
+        self._order = OrderedDict()
+
+    def _touch(self, unit: int, is_store: bool):
+        self._order[unit] = None
+        self._order.move_to_end(unit)
+
+    def _forget(self, unit: int):
+        self._order.pop(unit, None)
+
+    def _victim(self) -> int:
+        return next(iter(self._order))
+
+
+class ClairvoyantCache(UnitCache):
+    """
+    Evicts the storage unit used furthest in the future (Belady's policy).
+
+    Every sweep loads and then stores each unit once, so given the order of
+    the current sweep, see `plan`, the next use of a unit is its load in
+    this sweep if it is still pending, right after its load for its store,
+    and otherwise its load in the next sweep. The order of the next sweep
+    depends on a sub-circuit which is not partitioned yet, it is estimated
+    by sorting physical units. Units accessed outside a plan are evicted
+    first.
+    """
+
+    needs_plan = True
+
+    # Next use of a unit that is not in the plan
+    _UNPLANNED = 1 << 62
+
+    def __init__(self, capacity, read, write) -> None:
+        super().__init__(capacity, read, write)
+        self._pos = {}
+        self._next_pos = {}
+        self._done = set()
+        self._key = {}
+        self._heap = []
+
+    def _next_use(self, unit: int, is_store: bool) -> int:
+        if unit not in self._pos:
+            return self._UNPLANNED
+        if unit in self._done or is_store:
+            return len(self._pos) + self._next_pos.get(unit, len(self._pos))
+        return self._pos[unit]
+
+    def _push(self, unit: int, key: int):
+        self._key[unit] = key
+        heapq.heappush(self._heap, (-key, unit))
+
+    def plan(self, seq: List[int], next_seq: List[int]):
+        with self._lock:
+            self._pos = {unit: i for i, unit in enumerate(seq)}
+            self._next_pos = {unit: i for i, unit in enumerate(next_seq)}
+            self._done = set()
+            self._heap = []
+            for unit in self._units:
+                self._push(unit, self._next_use(unit, False))
+
+    def _touch(self, unit: int, is_store: bool):
+        if is_store:
+            self._done.add(unit)
+            key = self._next_use(unit, True)
+        elif unit in self._pos and unit not in self._done:
+            # Pinned until its store
+            key = -1
+        else:
+            key = self._next_use(unit, False)
+        self._push(unit, key)
+
+    def _forget(self, unit: int):
+        self._key.pop(unit, None)
+
+    def _victim(self) -> int:
+        while True:
+            key, unit = heapq.heappop(self._heap)
+            if self._key.get(unit) == -key and unit in self._units:
+                return unit
+
+
+CACHE_POLICIES = {"lru": LruCache, "clairvoyant": ClairvoyantCache}
+
+PREFETCH_MODES = ["read", "advise"]
+
+
+class Prefetcher:
+    """
+    Reads storage units of the next chunks of a sweep ahead.
+
+    The units of every chunk of a sweep are known once the sweep is
+    ordered, see `plan`. Whenever a chunk starts loading, see `advance`,
+    the units of the following `depth` chunks are requested, so that their
+    reads overlap with loading, simulating and storing the current chunk.
+    In "read" mode, units are read by `num_threads` background threads,
+    i.e., several reads are in flight to hide the latency of the device,
+    and handed over by `take`, at most `depth + 1` chunks are buffered.
+    Pages of the files read are dropped from the page cache if `drop` is
+    set, they are rewritten before being read again. In "advise" mode, the
+    kernel is only advised to read the files ahead (`POSIX_FADV_WILLNEED`)
+    and nothing is buffered.
+
+    Every unit is loaded before it is stored in a sweep, so a unit read
+    ahead is never stale within the sweep. Prefetching stops at the end of
+    the sweep, whose order depends on the next sub-circuit.
+
+    Args:
+        read (Callable[[int], np.ndarray]): Reads a unit from its file.
+        file_name (Callable[[int], str]): File of a unit.
+        depth (int): Number of chunks read ahead.
+        mode (str): "read" or "advise", see `PREFETCH_MODES`.
+        drop (bool): Whether to drop pages of files read ahead.
+        skip (Optional[Callable[[int], bool]]): Whether a unit does not
+            need to be read, e.g., because it is cached.
+        num_threads (int): Number of threads reading ahead.
+    """
+
+    def __init__(
+        self,
+        read: Callable[[int], np.ndarray],
+        file_name: Callable[[int], str],
+        depth: int = 2,
+        mode: str = "read",
+        drop: bool = True,
+        skip: Optional[Callable[[int], bool]] = None,
+        num_threads: int = 4,
+    ) -> None:
+        if mode not in PREFETCH_MODES:
+            raise QdaoError("Unknown prefetch mode: {}".format(mode))
+        if mode == "advise" and not hasattr(os, "posix_fadvise"):
+            logging.warning("posix_fadvise is not available, reading ahead instead")
+            mode = "read"
+        self.depth = depth
+        self.mode = mode
+        self._read = read
+        self._file_name = file_name
+        self._drop = drop and hasattr(os, "posix_fadvise")
+        self._skip = skip
+        self._num_threads = num_threads
+        self._chunks = []
+        self._pos = 0
+        self._issued = 0
+        # Pending reads by unit, and the units requested for each chunk
+        self._futures = {}
+        self._requested = {}
+        self._lock = Lock()
+        self._pool = None
+        self.hits = 0
+        self.wasted = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "wasted": self.wasted}
+
+    def _advise(self, path: str, advice: int):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.posix_fadvise(fd, 0, 0, advice)
+        finally:
+            os.close(fd)
+
+    def _read_ahead(self, unit: int) -> np.ndarray:
+        vec = self._read(unit)
+        if self._drop:
+            self._advise(self._file_name(unit), os.POSIX_FADV_DONTNEED)
+        return vec
+
+    def _issue(self, pos: int):
+        units = [u for u in self._chunks[pos] if not (self._skip and self._skip(u))]
+        if self.mode == "advise":
+            for unit in units:
+                self._advise(self._file_name(unit), os.POSIX_FADV_WILLNEED)
+            return
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._num_threads
+            )
+            weakref.finalize(self, self._pool.shutdown, False)
+        for unit in units:
+            self._futures[unit] = self._pool.submit(self._read_ahead, unit)
+        self._requested[pos] = units
+
+    def _discard(self, pos: int):
+        for unit in self._requested.pop(pos, []):
+            future = self._futures.pop(unit, None)
+            if future is not None:
+                future.cancel()
+                self.wasted += 1
+
+    def plan(self, chunks: List[List[int]]):
+        """Start a sweep loading the units of `chunks` in order, reads of
+        the previous sweep not taken are discarded"""
+        with self._lock:
+            for pos in list(self._requested):
+                self._discard(pos)
+            self._chunks = chunks
+            self._pos = 0
+            self._issued = 0
+            self._fill()
+
+    def _fill(self):
+        end = min(len(self._chunks), self._pos + self.depth)
+        while self._issued < end:
+            self._issue(self._issued)
+            self._issued += 1
+
+    def advance(self, num_chunks: int = 1):
+        """`num_chunks` chunks of the plan start loading"""
+        with self._lock:
+            if not self._chunks:
+                return
+            # Reads of chunks loaded before are not taken anymore
+            for pos in [p for p in self._requested if p < self._pos]:
+                self._discard(pos)
+            self._pos += num_chunks
+            self._fill()
+
+    def take(self, unit: int) -> Optional[np.ndarray]:
+        """Amplitudes of a unit read ahead, `None` if it was not requested"""
+        with self._lock:
+            future = self._futures.pop(unit, None)
+        if future is None:
+            return None
+        self.hits += 1
+        return future.result()
+
+
+class WriteBackQueue:
+    """
+    Writes storage units in the background.
+
+    A stored unit is handed to `num_threads` background threads, so that
+    the engine continues with the next chunk while the write is in flight.
+    At most `capacity` units are pending, `put` blocks while the queue is
+    full. A unit must be waited for before its file is read again, see
+    `wait`, and all writes before the files are used as a whole, e.g.,
+    renamed or committed, see `barrier`. A sweep loads every unit before
+    it is stored, so only the first loads of the next sweep may wait.
+
+    Args:
+        write (Callable[[int, np.ndarray], None]): Writes a unit to its file.
+        capacity (int): Maximum number of pending units.
+        num_threads (int): Number of threads writing units.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[int, np.ndarray], None],
+        capacity: int,
+        num_threads: int = 2,
+    ) -> None:
+        if capacity < 1:
+            raise QdaoError("A write-back queue must hold at least one unit")
+        self.capacity = capacity
+        self._write = write
+        self._slots = Semaphore(capacity)
+        self._pending = {}
+        self._lock = Lock()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+        weakref.finalize(self, self._pool.shutdown, False)
+        self.writes = 0
+        self.stalls = 0
+        self.waits = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"writes": self.writes, "stalls": self.stalls, "waits": self.waits}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self, unit: int, vec: np.ndarray):
+        try:
+            self._write(unit, vec)
+        finally:
+            self._slots.release()
+
+    def _done(self, unit: int, future: concurrent.futures.Future):
+        # Failed writes are kept to be raised by `wait` or `barrier`
+        with self._lock:
+            if self._pending.get(unit) is future and future.exception() is None:
+                del self._pending[unit]
+
+    def put(self, unit: int, vec: np.ndarray):
+        """Write a unit in the background, `vec` must not be modified
+        afterwards"""
+        # Writes of the same unit must not overtake each other
+        self.wait(unit)
+        if not self._slots.acquire(blocking=False):
+            self._slots.acquire()
+            with self._lock:
+                self.stalls += 1
+        with self._lock:
+            future = self._pool.submit(self._run, unit, vec)
+            self.writes += 1
+            self._pending[unit] = future
+        future.add_done_callback(lambda f: self._done(unit, f))
+
+    def wait(self, unit: int):
+        """Wait for the pending write of a unit, if any
+
+        Raises:
+            Exception: The error of the write.
+        """
+        with self._lock:
+            future = self._pending.get(unit)
+        if future is None:
+            return
+        if not future.done():
+            with self._lock:
+                self.waits += 1
+        try:
+            future.result()
+        finally:
+            with self._lock:
+                if self._pending.get(unit) is future:
+                    del self._pending[unit]
+
+    def barrier(self):
+        """Wait for all pending writes
+
+        Raises:
+            Exception: The first error of a write, all writes are finished.
+        """
+        with self._lock:
+            units = list(self._pending)
+        error = None
+        for unit in units:
+            try:
+                self.wait(unit)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+
+def replay(
+    trace: np.ndarray,
+    store: BaseStore,
+    init: Optional[Callable[[int], np.ndarray]] = None,
+) -> Dict:
+    """
+    Replay an I/O trace on a store at full speed.
+
+    The store is opened for the units in the trace and populated before the
+    replay is timed. Timestamps of the trace are ignored. A store writes
+    the amplitudes last read from the store, so that compressible contents
+    stay compressible.
+
+    Args:
+        trace (np.ndarray): Records of `TRACE_DTYPE`, see `IoTrace`.
+        store (BaseStore): Store to replay on.
+        init (Optional[Callable[[int], np.ndarray]]): Initial amplitudes of
+            each unit, e.g., read from the storage units of the recorded
+            run, defaults to random amplitudes.
+
+    Returns:
+        Dict: Number of loads and stores, bytes read and written, elapsed
+            seconds and throughput in bytes per second.
+    """
+    if len(trace) == 0:
+        raise QdaoError("Cannot replay an empty trace")
+    unit_size = int(trace["nbytes"].max()) // 16
+    num_units = int(trace["unit"].max()) + 1
+    if init is None:
+        rng = np.random.default_rng(0)
+        init = lambda unit: rng.random(unit_size) + 1j * rng.random(unit_size)
+
+    store.open(num_units, unit_size)
+    for unit in range(num_units):
+        store.write(unit, init(unit))
+    store.flush()
+
+    ops, units = trace["op"].tolist(), trace["unit"].tolist()
+    vec = np.zeros(unit_size, dtype=np.complex128)
+    st = perf_counter()
+    for op, unit in zip(ops, units):
+        if op == LOAD:
+            vec = store.read(unit)
+        else:
+            store.write(unit, vec)
+    store.flush()
+    elapsed = perf_counter() - st
+    store.close()
+
+    loads = trace["op"] == LOAD
+    num_bytes = int(trace["nbytes"].sum())
+    bytes_read = int(trace["nbytes"][loads].sum())
+    return {
+        "store": type(store).__name__,
+        "num_loads": int(loads.sum()),
+        "num_stores": int(len(trace) - loads.sum()),
+        "bytes_read": bytes_read,
+        "bytes_written": num_bytes - bytes_read,
+        "seconds": elapsed,
+        "throughput": num_bytes / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+DIRECT_IO_ALIGNMENT = 4096
+
+
+def aligned_empty(size: int, dtype=np.complex128) -> np.ndarray:
+    """A 1-D array of `size` items starting at a multiple of `DIRECT_IO_ALIGNMENT`"""
+    dtype = np.dtype(dtype)
+    raw = np.empty(size * dtype.itemsize + DIRECT_IO_ALIGNMENT, dtype=np.uint8)
+    offset = -raw.ctypes.data % DIRECT_IO_ALIGNMENT
+    return raw[offset : offset + size * dtype.itemsize].view(dtype)
+
+
+def _is_aligned(arr: np.ndarray) -> bool:
+    return (
+        arr.flags.c_contiguous
+        and arr.ctypes.data % DIRECT_IO_ALIGNMENT == 0
+        and arr.nbytes % DIRECT_IO_ALIGNMENT == 0
+    )
+
+
+def direct_io_supported(path: str) -> bool:
+    """Whether files in directory `path` can be written with direct I/O,
+    e.g., tmpfs and some network file systems refuse `O_DIRECT`"""
+    if not hasattr(os, "O_DIRECT") or not hasattr(os, "pwritev"):
+        return False
+    probe = os.path.join(path, ".direct_io_probe")
+    try:
+        fd = os.open(probe, os.O_CREAT | os.O_WRONLY | os.O_TRUNC | os.O_DIRECT, 0o644)
+        try:
+            os.write(fd, aligned_empty(DIRECT_IO_ALIGNMENT, np.uint8))
+        finally:
+            os.close(fd)
+        return True
+    except OSError:
+        return False
+    finally:
+        if os.path.exists(probe):
+            os.remove(probe)
+
+
+_headers = {}
+
+
+def _npy_header(num_amps: int) -> np.ndarray:
+    """Aligned `.npy` header of a 1-D complex128 array, padded to
+    `DIRECT_IO_ALIGNMENT` bytes"""
+    header = _headers.get(num_amps)
+    if header is None:
+        desc = "{'descr': '<c16', 'fortran_order': False, 'shape': (%d,), }" % num_amps
+        desc = desc.ljust(DIRECT_IO_ALIGNMENT - 11) + "\n"
+        data = np.lib.format.magic(1, 0) + struct.pack("<H", len(desc))
+        data += desc.encode("latin1")
+        header = aligned_empty(DIRECT_IO_ALIGNMENT, np.uint8)
+        header[:] = np.frombuffer(data, dtype=np.uint8)
+        header.flags.writeable = False
+        _headers[num_amps] = header
+    return header
+
+
+def _padded_size(nbytes: int) -> int:
+    return -(-nbytes // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT
+
+
+def save_direct(path: str, vec: np.ndarray):
+    """
+    Save a storage unit as a `.npy` file with direct I/O.
+
+    The header is padded to `DIRECT_IO_ALIGNMENT` bytes and amplitudes are
+    padded to a multiple of it with zeros, which `np.load` ignores. `vec`
+    is written without copying if it is aligned, see `aligned_empty`.
+    """
+    header = _npy_header(len(vec))
+    if not (vec.dtype == np.complex128 and _is_aligned(vec)):
+        buf = aligned_empty(_padded_size(vec.nbytes) // 16)
+        buf[len(vec) :] = 0
+        buf[: len(vec)] = vec
+        vec = buf
+    fd = os.open(path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC | os.O_DIRECT, 0o644)
+    try:
+        os.pwritev(fd, [header, vec], 0)
+    finally:
+        os.close(fd)
+
+
+def load_direct(
+    path: str, num_amps: int, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Load a storage unit saved by `save_direct` with direct I/O.
+
+    Amplitudes are read into `out` without copying if it is aligned. Files
+    of another layout, e.g., saved by `np.save`, are loaded by `np.load`.
+
+    Args:
+        path (str): Path of the `.npy` file.
+        num_amps (int): Number of amplitudes of the unit.
+        out (Optional[np.ndarray]): Buffer of `num_amps` amplitudes to read into.
+
+    Returns:
+        np.ndarray: The amplitudes, which are `out` if given.
+    """
+    header = _npy_header(num_amps)
+    buf = out
+    if buf is None or not _is_aligned(buf):
+        buf = aligned_empty(_padded_size(16 * num_amps) // 16)
+    head = aligned_empty(DIRECT_IO_ALIGNMENT, np.uint8)
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+    try:
+        nbytes = os.preadv(fd, [head, buf], 0)
+    finally:
+        os.close(fd)
+    if nbytes < DIRECT_IO_ALIGNMENT + 16 * num_amps or not np.array_equal(head, header):
+        vec = np.load(path)
+    else:
+        vec = buf if buf is out else buf[:num_amps]
+    if out is None:
+        return vec
+    if vec is not out:
+        out[:] = vec
+    return out
@@ -1,3 +1,7 @@
+import importlib
+import os
+from collections.abc import Mapping
+
 BITS = [
     1,
     2,
@@ -137,8 +141,54 @@ SECONDARY_PREFIX = "sv"
 SECONDARY_SUFFIX = ".npy"
 
 
-def generate_secondary_file_name(idx: int):
-    return DATA_DIR + "/" + SECONDARY_PREFIX + str(idx) + SECONDARY_SUFFIX
+def _stripe_round_robin(idx: int, num_dirs: int) -> int:
+    return idx % num_dirs
+
+
+def _stripe_hash(idx: int, num_dirs: int) -> int:
+    # Fibonacci hashing, spreads strided unit indices evenly
+    return ((idx * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) * num_dirs >> 64
+
+
+# Directory of a storage unit striped across several directories
+STRIPINGS = {"round_robin": _stripe_round_robin, "hash": _stripe_hash}
+
+
+def unit_data_dir(idx: int, data_dir=DATA_DIR, striping: str = "round_robin"):
+    """Directory holding storage unit `idx`
+
+    Args:
+        idx (int): Index of the storage unit.
+        data_dir (Union[str, List[str]]): A directory, or directories the
+            storage units are striped across, e.g., one per disk.
+        striping (str): Policy in `STRIPINGS` mapping units to directories.
+    """
+    if isinstance(data_dir, str):
+        return data_dir
+    if len(data_dir) == 1:
+        return data_dir[0]
+    return data_dir[STRIPINGS[striping](idx, len(data_dir))]
+
+
+def generate_secondary_file_name(
+    idx: int, slot: int = 0, data_dir=DATA_DIR, striping: str = "round_robin"
+):
+    """File name of a storage unit, `slot` selects one of the buffers
+    used by double-buffered storage, see `unit_data_dir` for `data_dir`
+    and `striping`"""
+    name = SECONDARY_PREFIX + str(idx)
+    if slot:
+        name += "_" + str(slot)
+    return os.path.join(unit_data_dir(idx, data_dir, striping), name + SECONDARY_SUFFIX)
+
+
+def fsync_path(path: str):
+    """Flush a file or the entries of a directory to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 def index0(qubits, k):
@@ -234,7 +284,13 @@ def indexes(qubits, k):
     return ret
 
 
-def retrieve_sv(num_qubits: int, num_local: int = 2):
+def retrieve_sv(
+    num_qubits: int,
+    num_local: int = 2,
+    layout=None,
+    data_dir=DATA_DIR,
+    striping: str = "round_robin",
+):
     """Retrieve statevector from disk
 
     This is used only for test, and must be used after simulation finished
@@ -242,6 +298,11 @@ def retrieve_sv(num_qubits: int, num_local: int = 2):
     Args:
         num_qubits (int): Number of qubits
         num_local (int): Number of qubits stored in single storage unit
+        layout (Optional[List[int]]): Physical position of each logical qubit
+            if the layout was not restored, see `SvManager.layout`
+        data_dir (Union[str, List[str]]): Directory, or striped directories,
+            of storage units, see `unit_data_dir`
+        striping (str): Policy striping storage units across `data_dir`
     """
     import numpy as np
 
@@ -251,10 +312,15 @@ def retrieve_sv(num_qubits: int, num_local: int = 2):
     sv = np.zeros(1 << num_qubits, dtype=complex)
 
     for i in range(num_sus):
-        fn = generate_secondary_file_name(i)
+        fn = generate_secondary_file_name(i, data_dir=data_dir, striping=striping)
         vec = np.load(fn)
         sv[i * su_size : (i + 1) * su_size] = vec
 
+    if layout is not None:
+        # Axis `a` of the tensor is qubit `num_qubits - 1 - a`
+        axes = [num_qubits - 1 - layout[num_qubits - 1 - a] for a in range(num_qubits)]
+        sv = sv.reshape((2,) * num_qubits).transpose(axes).reshape(-1)
+
     return sv
 
 
@@ -278,3 +344,39 @@ def safe_import(module_name, submodule_name):
             return func
 
         return placeholder_decorator
+
+
+class LazyRegistry(Mapping):
+    """Registry of classes given as "module:attribute" paths, which are
+    imported on first lookup, so that registering a backend does not import it
+
+    Args:
+        paths (dict): Maps a name to "module:attribute" or to a class.
+    """
+
+    def __init__(self, paths: dict) -> None:
+        self._paths = dict(paths)
+        self._resolved = {}
+
+    def __getitem__(self, name):
+        if name not in self._resolved:
+            target = self._paths[name]
+            if isinstance(target, str):
+                module_name, attr = target.split(":")
+                target = getattr(importlib.import_module(module_name), attr)
+            self._resolved[name] = target
+        return self._resolved[name]
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def register(self, name: str, target) -> None:
+        """Register a class or a "module:attribute" path under `name`"""
+        self._paths[name] = target
+        self._resolved.pop(name, None)
+
+    def __repr__(self):
+        return "LazyRegistry({})".format(self._paths)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.quantum_info import Statevector, random_statevector
+
+from qdao.batch import BatchSimulator
+from qdao.bench.circuits import generate_circuit
+from qdao.exceptions import QdaoError
+from qdao.simulator import QdaoSimObj
+
+
+class TestBatchSimulator:
+    @pytest.mark.parametrize("family", ["random", "qft", "qaoa"])
+    def test_run(self, family):
+        num_qubits = 6
+        circ = generate_circuit(family, num_qubits, depth=6, seed=1)
+        batch = np.stack(
+            [random_statevector(1 << num_qubits, seed=s).data for s in range(3)]
+        )
+        expected = [Statevector(row).evolve(circ).data for row in batch]
+
+        circ.save_state()
+        out = BatchSimulator().run(QdaoSimObj(batch, circ))
+        assert np.shares_memory(out, batch)
+        assert np.allclose(out, expected)
+
+    def test_run_quafu(self):
+        from quafu.simulators.qfvm import simulate_circuit
+
+        num_qubits = 6
+        circ = generate_circuit("random", num_qubits, depth=6, seed=1, backend="quafu")
+        batch = np.stack(
+            [random_statevector(1 << num_qubits, seed=s).data for s in range(3)]
+        )
+        expected = [simulate_circuit(circ, row.copy()) for row in batch]
+
+        out = BatchSimulator("quafu").run(QdaoSimObj(batch, circ))
+        assert np.allclose(out, expected)
+
+    def test_unsupported(self):
+        circ = QuantumCircuit(2)
+        circ.reset(0)
+        with pytest.raises(QdaoError):
+            BatchSimulator().compile(circ)
@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+from qiskit.circuit.library import QFT
+from qiskit.quantum_info import Operator
+
+from qdao.bench import CIRCUITS, PHASES, BenchConfig, generate_circuit, run_config
+from qdao.bench.circuits import qft
+from qdao.bench.regression import CASES, Measurement, compare, load_baseline
+from qdao.bench.regression import main as regression_main
+from qdao.bench.regression import save_baseline
+from qdao.bench.runner import main
+
+
+class TestBench:
+    @pytest.mark.parametrize("family", sorted(CIRCUITS))
+    def test_generate_circuit(self, family):
+        circ = generate_circuit(family, 6, depth=2, seed=1)
+        assert circ.num_qubits == 6
+        # Generators are deterministic
+        assert circ == generate_circuit(family, 6, depth=2, seed=1)
+
+    def test_qft(self):
+        assert Operator(qft(4)).equiv(Operator(QFT(4)))
+
+    def test_run_config(self, tmp_path, monkeypatch):
+        workdir = tmp_path / "work"
+        workdir.mkdir()
+        monkeypatch.chdir(tmp_path)
+        config = BenchConfig(num_qubits=6, depth=4, num_primary=4, num_local=2)
+        result = run_config(config, workdir=str(workdir))
+        assert result["num_sub_circuits"] > 0
+        assert set(result["phases"]) == set(PHASES)
+        assert result["phases"]["simulate"] > 0
+        assert sum(result["phases"].values()) <= result["time"]
+        # Scratch storage units are removed, nothing is written to the CWD
+        assert not list(workdir.iterdir())
+        assert os.getcwd() == str(tmp_path)
+        assert list(tmp_path.iterdir()) == [workdir]
+
+    def test_main(self, tmp_path, capsys):
+        args = ["--num-qubits", "6", "--num-primary", "4", "--num-local", "1", "2"]
+        args += ["--sv-locations", "disk", "memory", "--workdir", str(tmp_path)]
+        assert main(args) == 0
+
+        results = [json.loads(l) for l in capsys.readouterr().out.splitlines()]
+        assert len(results) == 4
+        assert all("error" not in r for r in results)
+
+
+class TestRegression:
+    def test_compare(self):
+        base = {
+            "a": Measurement("s", [1.0, 1.1, 1.2]),
+            "b": Measurement("gates/s", [100, 110, 120]),
+        }
+        # Slower beyond noise, but within threshold or overlapping IQR is fine
+        assert compare(base, {"a": Measurement("s", [1.5, 1.6, 1.7])})[0]["case"] == "a"
+        assert not compare(base, {"a": Measurement("s", [1.15, 1.2, 1.25])})
+        assert not compare(base, {"a": Measurement("s", [0.5, 1.5, 2.5])})
+        assert compare(base, {"b": Measurement("gates/s", [50, 55, 60])})
+        assert not compare(base, {"b": Measurement("gates/s", [200, 210, 220])})
+
+    def test_main(self, tmp_path):
+        args = ["--baseline-dir", str(tmp_path), "--cases", "util.indexes*"]
+        args += ["--repeat", "3"]
+        assert regression_main(["check"] + args) == 2
+        assert regression_main(["record"] + args) == 0
+        assert load_baseline(str(tmp_path)).keys() == {"util.indexes/q16-w4"}
+
+        # A baseline far faster than this machine
+        save_baseline(
+            str(tmp_path), {"util.indexes/q16-w4": Measurement("s", [1e-6] * 3)}
+        )
+        assert regression_main(["check"] + args) == 1
+
+    def test_init_cases(self):
+        # Large chunks are only measured on request
+        assert CASES["qiskit.init/chunk-p16"].default
+        assert not CASES["qiskit.init/chunk-p26"].default
+        for kind in ["chunk", "initialize"]:
+            m = CASES["qiskit.init/{}-p16".format(kind)].measure(repeat=1, warmup=0)
+            assert m.median > 0
+
+    def test_storage_cases(self):
+        assert not CASES["storage.sweep/direct-q30-p26-l20"].default
+        for mode in ["buffered", "direct"]:
+            case = CASES["storage.sweep/{}-q20-p16-l12".format(mode)]
+            assert case.default
+            m = case.measure(repeat=1, warmup=0)
+            assert m.unit == "B/s" and m.median > 0
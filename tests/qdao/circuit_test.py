@@ -1,6 +1,20 @@
+import numpy as np
+import pytest
 from qiskit.circuit import QuantumCircuit
+from qiskit.quantum_info import Operator
 from constants import QCS_BENCHMARKS_DIR
-from qdao.circuit import BaselinePartitioner, StaticPartitioner
+from qdao.circuit import (
+    BaselinePartitioner,
+    CircuitHelperProvider,
+    DiagonalOp,
+    GateFusion,
+    LayoutOp,
+    PermutationOp,
+    QdaoStorageOp,
+    StaticPartitioner,
+    UniQPartitioner,
+)
+from qdao.exceptions import QdaoError
 from tests.qdao import QdaoBaseTest
 
 
@@ -65,3 +79,161 @@ class TestStaticPartitioner(QdaoBaseTest):
         circ.save_state()
         print(circ)
         assert sub_circs[0].circ == circ
+
+    def test_run_storage_ops(self):
+        circ = QuantumCircuit(8)
+        circ.h(range(4))
+        circ.cz(0, 6)
+        circ.rz(0.5, 7)
+        circ.x(5)
+        circ.swap(6, 7)
+        circ.h(6)
+        part = StaticPartitioner(np=4, nl=2, storage_ops=True)
+        sub_circs = part.run(circ)
+
+        ops = [s for s in sub_circs if isinstance(s, QdaoStorageOp)]
+        assert [type(op) for op in ops] == [
+            DiagonalOp,
+            DiagonalOp,
+            PermutationOp,
+            PermutationOp,
+        ]
+        # Options the partitioner does not implement are rejected
+        with pytest.raises(QdaoError):
+            BaselinePartitioner(np=4, nl=2, storage_ops=True)
+        with pytest.raises(QdaoError):
+            UniQPartitioner(np=4, nl=2, remap_qubits=True)
+
+        # Storage operations must implement `apply`
+        with pytest.raises(TypeError):
+            type("IncompleteOp", (QdaoStorageOp,), {})([0])
+
+        # The last h(6) does not commute with swap(6, 7)
+        assert sub_circs[0].real_qubits == [0, 1, 2, 3]
+        assert isinstance(sub_circs[-1].circ, QuantumCircuit)
+        assert sub_circs[-1].real_qubits == [0, 1, 6]
+
+    def test_run_remap_qubits(self):
+        circ = QuantumCircuit(6)
+        circ.h(0)
+        for _ in range(3):
+            circ.h(4)
+            circ.h(5)
+        circ.h(1)
+        sub_circs = StaticPartitioner(np=3, nl=2).run(circ)
+        assert len(sub_circs) == 6
+
+        part = StaticPartitioner(np=3, nl=2, remap_qubits=True)
+        sub_circs = part.run(circ)
+        # Qubits 4 and 5 become local by swapping with qubits 0 and 1
+        assert part.layout == [4, 5, 2, 3, 0, 1]
+        assert isinstance(sub_circs[0], LayoutOp)
+        assert sub_circs[0].layout == part.layout
+        assert len(sub_circs) == 3
+        assert sub_circs[1].real_qubits == [0, 1, 4]
+        assert sub_circs[2].real_qubits == [0, 1, 5]
+
+    def test_iter_run(self):
+        circ = self.get_qiskit_circ("random", num_qubits=8, depth=20, measure=False)
+        stream = self._part.iter_run(circ)
+        # Nothing is partitioned before the first sub-circuit is consumed
+        assert iter(stream) is stream
+
+        sub_circs = self._part.run(circ)
+        assert [s.real_qubits for s in stream] == [s.real_qubits for s in sub_circs]
+
+
+class TestGateFusion(QdaoBaseTest):
+    def test_run(self):
+        circ = self.get_qiskit_circ("random", num_qubits=6, depth=20, measure=False)
+        helper = CircuitHelperProvider.get_helper("qiskit")
+        helper.circ = circ
+
+        for max_qubits in [1, 2, 3]:
+            instrs = GateFusion(helper, max_qubits).run(helper.instructions)
+            assert len(instrs) <= len(circ)
+
+            fused_circ = circ.copy_empty_like()
+            for instr in instrs:
+                # Gates wider than a block are kept unchanged
+                assert len(instr.qubits) <= max_qubits or instr in circ.data
+                fused_circ.append(instr)
+            assert Operator(fused_circ).equiv(Operator(circ))
+
+    def test_unsupported(self):
+        with pytest.raises(QdaoError):
+            StaticPartitioner(np=6, nl=2, backend="quafu", fusion=2)
+
+    def test_static_partitioner(self):
+        circ = self.get_qiskit_circ("random", num_qubits=8, depth=20, measure=False)
+        sub_circs = StaticPartitioner(np=6, nl=2).run(circ)
+        fused_sub_circs = StaticPartitioner(np=6, nl=2, fusion=2).run(circ)
+
+        num_ops = sum([len(s.circ) for s in sub_circs])
+        num_fused_ops = sum([len(s.circ) for s in fused_sub_circs])
+        assert num_fused_ops <= num_ops
+
+
+class TestQuafuCircuitHelper(QdaoBaseTest):
+    def test_gen_sub_circ(self):
+        from quafu.circuits.quantum_circuit import QuantumCircuit as QuafuCircuit
+
+        circ = QuafuCircuit(6)
+        circ.h(5)
+        circ.cnot(5, 3)
+        circ.rz(4, 0.5)
+        helper = CircuitHelperProvider.get_helper("quafu")
+        helper.circ = circ
+        sub_circ = helper.gen_sub_circ(circ.gates, 2, 5)
+
+        # Gates are recorded by reference and materialized on first access
+        assert sub_circ.real_qubits == [0, 1, 3, 4, 5]
+        assert [g.pos for g in sub_circ.gates] == [(4,), (4, 2), (3,)]
+        assert sub_circ.gates[2].params == 0.5
+        assert all(g.gate is instr for g, instr in zip(sub_circ.gates, circ.gates))
+
+        sub = sub_circ.circ
+        assert sub is sub_circ.circ
+        assert [g.pos for g in sub.gates] == [4, [4, 2], 3]
+        assert sub.gates[1].ctrls == [4] and sub.gates[1].targs == [2]
+        # The original circuit is left untouched
+        assert [g.pos for g in circ.gates] == [5, [5, 3], 4]
+
+    def test_get_instr_matrix(self):
+        from quafu.circuits.quantum_circuit import QuantumCircuit as QuafuCircuit
+        from quafu.simulators.qfvm import simulate_circuit
+
+        from qdao.batch import apply_gate
+
+        helper = CircuitHelperProvider.get_helper("quafu")
+        for add in [
+            lambda c: c.ry(2, 0.3),
+            lambda c: c.cnot(3, 1),
+            lambda c: c.rxx(2, 0, 0.4),
+            lambda c: c.toffoli(3, 0, 2),
+            lambda c: c.fredkin(1, 3, 0),
+        ]:
+            circ = QuafuCircuit(4)
+            add(circ)
+            helper.circ = circ
+            gate = circ.gates[0]
+            sv = np.random.rand(16) + 1j * np.random.rand(16)
+            expected = simulate_circuit(circ, sv.copy())
+
+            # Matrices are little-endian in the order of qubits of the gate
+            batch = sv.reshape(1, -1).copy()
+            qubits = list(helper.get_instr_qubits(gate))
+            apply_gate(batch, helper.get_instr_matrix(gate), qubits)
+            assert np.allclose(batch[0], expected)
+
+    def test_storage_ops(self):
+        from quafu.circuits.quantum_circuit import QuantumCircuit as QuafuCircuit
+
+        circ = QuafuCircuit(8)
+        circ.h(0)
+        circ.cz(0, 6)
+        circ.rz(7, 0.5)
+        circ.x(5)
+        part = StaticPartitioner(np=4, nl=2, backend="quafu", storage_ops=True)
+        ops = [s for s in part.run(circ) if isinstance(s, QdaoStorageOp)]
+        assert [type(op) for op in ops] == [DiagonalOp, DiagonalOp, PermutationOp]
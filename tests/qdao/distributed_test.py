@@ -0,0 +1,87 @@
+from threading import Thread
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from qiskit import transpile
+from qiskit.quantum_info import Statevector
+from qiskit_aer import Aer
+
+from qdao.distributed import ChunkScheduler, PipeTransport
+from qdao.engine import Engine
+from qdao.exceptions import QdaoError
+from qdao.manager import SvManager
+from qdao.qiskit.utils import random_circuit
+from qdao.util import retrieve_sv
+
+
+class TestDistributed:
+    def test_alltoall(self):
+        size = 4
+        transports = PipeTransport.create(size)
+        results = [None] * size
+
+        def exchange(rank):
+            outgoing = {dst: (rank, dst) for dst in range(size) if dst != rank}
+            results[rank] = transports[rank].alltoall(outgoing)
+
+        threads = [Thread(target=exchange, args=(r,)) for r in range(size)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for rank in range(size):
+            assert results[rank] == {
+                src: (src, rank) for src in range(size) if src != rank
+            }
+
+    def test_schedule(self):
+        manager = SvManager(num_qubits=8, num_primary=5, num_local=3)
+        scheduler = ChunkScheduler(manager, 2)
+        assert scheduler.shard(1) == list(range(16, 32))
+
+        # Qubit 7 decides the owner, chunks not touching it are local
+        plan = scheduler.schedule([0, 1, 2, 3, 4])
+        assert plan == [0, 0, 0, 0, 1, 1, 1, 1]
+        plan = scheduler.schedule([0, 1, 2, 6, 7])
+        assert sorted(plan) == [0, 0, 0, 0, 1, 1, 1, 1]
+
+        with pytest.raises(QdaoError):
+            ChunkScheduler(manager, 3)
+
+    @pytest.mark.parametrize("location", ["disk", "memory", "private"])
+    def test_engine(self, location, monkeypatch):
+        NQ, NP, NL = 8, 5, 3
+        private = location == "private"
+        if private:
+            # Without room in /dev/shm, workers only hold their shards
+            monkeypatch.setattr(
+                "os.statvfs", lambda path: SimpleNamespace(f_bavail=0, f_frsize=1)
+            )
+            location = "memory"
+        sim = Aer.get_backend("aer_simulator")
+        circ = random_circuit(NQ, 6, max_operands=2, measure=False, seed=7)
+        circ = transpile(circ, sim)
+
+        engine = Engine(
+            circuit=circ,
+            num_primary=NP,
+            num_local=NL,
+            sv_location=location,
+            num_workers=2,
+        )
+        engine.run()
+        if location == "memory":
+            assert (engine._manager.shm_name is None) == private
+        stats = engine.transfer_stats
+        assert stats["local_units"] + stats["remote_units"] > 0
+
+        if location == "disk":
+            sv = retrieve_sv(NQ, num_local=NL)
+        else:
+            sv = np.concatenate(engine._manager._global_sv)
+
+        circ.save_state()
+        sv_org = sim.run(circ).result().get_statevector()
+        assert Statevector(sv).equiv(sv_org)
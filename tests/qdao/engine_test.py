@@ -11,8 +11,11 @@ from qiskit.quantum_info import Statevector
 from constants import *
 from qdao.circuit import BaselinePartitioner
 from qdao.engine import Engine
+from qdao.qiskit.data_preparation.initializer import ChunkInitialize
+from qdao.qiskit.utils import random_circuit
 from qdao.simulator import QdaoSimObj
-from qdao.util import retrieve_sv
+from qdao.storage import direct_io_supported
+from qdao.util import DATA_DIR, retrieve_sv
 from tests.qdao import QdaoBaseTest
 
 
@@ -129,6 +132,107 @@ class TestEngine(QdaoBaseTest):
         print("Qiskit runs: {}".format(time() - st))
         assert Statevector(sv).equiv(Statevector(sv_org))
 
+    def test_run_qiskit_inplace(self):
+        NQ, NP, NL = 10, 8, 6
+        circ = self.get_qiskit_circ("random", num_qubits=NQ, depth=9, measure=False)
+        circ = transpile(circ, self._sv_sim)
+
+        svs = []
+        for inplace in [True, False]:
+            engine = Engine(circuit=circ, num_primary=NP, num_local=NL, inplace=inplace)
+            assert engine._sim.inplace == inplace
+            engine.run()
+            svs.append(retrieve_sv(NQ, num_local=NL))
+
+        # Chunks are not normalized and are loaded without validation
+        chunk = np.zeros(1 << NP, dtype=np.complex128)
+        chunk[[0, -1]] = 0.5
+        init = QuantumCircuit(NP)
+        init.append(ChunkInitialize(chunk), range(NP))
+        init.save_state()
+        assert np.allclose(self._sv_sim.run(init).result().get_statevector(), chunk)
+
+        # Chunks are evolved in the buffer they are loaded into
+        chunk = np.zeros(1 << NP, dtype=np.complex128)
+        chunk[0] = 1
+        engine._circ_helper.circ = QuantumCircuit(NP)
+        sim = Engine(circuit=circ, num_primary=NP, num_local=NL)._sim
+        assert sim.run(engine._circ_helper.init_circ_from_sv(chunk)) is chunk
+
+        circ.save_state()
+        sv_org = self._sv_sim.run(circ).result().get_statevector().data
+        for sv in svs:
+            assert Statevector(sv).equiv(Statevector(sv_org))
+
+    def _run_and_check(self, before_run=None, **engine_kwargs):
+        # Runs a random circuit with `engine_kwargs`, compares the result
+        # against Aer and returns the engine for feature-specific checks
+        NQ, NP, NL = 10, 6, 4
+        circ = self.get_qiskit_circ("random", num_qubits=NQ, depth=9, measure=False)
+        circ = transpile(circ, self._sv_sim)
+
+        engine = Engine(circuit=circ, num_primary=NP, num_local=NL, **engine_kwargs)
+        if before_run is not None:
+            before_run(engine)
+        engine.run()
+        sv = retrieve_sv(
+            NQ,
+            num_local=NL,
+            data_dir=engine_kwargs.get("data_dir", DATA_DIR),
+            striping=engine_kwargs.get("striping", "round_robin"),
+        )
+
+        circ.save_state()
+        sv_org = self._sv_sim.run(circ).result().get_statevector().data
+        assert Statevector(sv).equiv(Statevector(sv_org))
+        return engine
+
+    def test_run_qiskit_batch(self):
+        # 16 chunks in batches of 3, i.e., the last batch is partial
+        self._run_and_check(batch_size=3)
+
+    @pytest.mark.parametrize("policy", ["lru", "clairvoyant"])
+    def test_run_qiskit_cache(self, policy):
+        # A quarter of the 64 storage units does not fit into the cache
+        engine = self._run_and_check(cache_budget=48 * (16 << 4), cache_policy=policy)
+        cache = engine._manager.cache
+        assert cache.hits > 0 and cache.writebacks > 0
+
+    @pytest.mark.parametrize("prefetch_mode", ["read", "advise"])
+    def test_run_qiskit_prefetch(self, prefetch_mode):
+        engine = self._run_and_check(prefetch_depth=2, prefetch_mode=prefetch_mode)
+        if prefetch_mode == "read":
+            assert engine._manager.prefetcher.hits > 0
+
+    def test_run_qiskit_direct_io(self):
+        if not direct_io_supported(DATA_DIR):
+            pytest.skip("Direct I/O is not supported in {}".format(DATA_DIR))
+        chunks = []
+
+        def before_run(engine):
+            assert engine.manager.direct_io
+            chunks.append(engine.manager.chunk)
+            # Results of simulators not evolving the chunk in place are
+            # copied into the page-aligned chunk instead of replacing it
+            run = engine._sim.run
+            engine._sim.run = lambda simobj: run(simobj).copy()
+
+        engine = self._run_and_check(before_run=before_run, direct_io=True)
+        assert engine.manager.chunk is chunks[0]
+
+    @pytest.mark.parametrize("checkpoint", [False, True])
+    def test_run_qiskit_write_back(self, checkpoint, tmp_path):
+        engine = self._run_and_check(
+            write_back_budget=16 << 6,
+            checkpoint=str(tmp_path / "ckpt.pkl") if checkpoint else None,
+        )
+        assert len(engine._manager.write_back) == 0
+
+    @pytest.mark.parametrize("striping", ["round_robin", "hash"])
+    def test_run_qiskit_striped(self, striping, tmp_path):
+        dirs = [str(tmp_path / "d{}".format(i)) for i in range(3)]
+        self._run_and_check(data_dir=dirs, striping=striping, io_threads=2)
+
     def run_quafu_diff_test(
         self,
         circ: QuantumCircuit,
@@ -213,6 +317,40 @@ class TestEngine(QdaoBaseTest):
 
         return NQ, NP, NL
 
+    def test_resume(self, tmp_path):
+        NQ, NP, NL = 8, 5, 3
+        circ = random_circuit(NQ, 8, max_operands=2, measure=False, seed=3)
+        circ = transpile(circ, self._sv_sim)
+        checkpoint = str(tmp_path / "checkpoint.pkl")
+
+        engine = Engine(
+            circuit=circ, num_primary=NP, num_local=NL, checkpoint=checkpoint
+        )
+        # Interrupt the run in the middle of a sub-circuit
+        write_su = engine._manager._write_su
+        num_writes = 0
+
+        def interrupted_write_su(unit, vec):
+            nonlocal num_writes
+            num_writes += 1
+            if num_writes == 50:
+                raise KeyboardInterrupt
+            write_su(unit, vec)
+
+        engine._manager._write_su = interrupted_write_su
+        with pytest.raises(KeyboardInterrupt):
+            engine.run()
+
+        engine = Engine(
+            circuit=circ, num_primary=NP, num_local=NL, checkpoint=checkpoint
+        )
+        engine.resume()
+        sv = retrieve_sv(NQ, num_local=NL)
+
+        circ.save_state()
+        sv_org = self._sv_sim.run(circ).result().get_statevector()
+        assert Statevector(sv).equiv(sv_org)
+
     def test_run_quafu_any_qasm(self, nq, np, nl, mode, qasm, parallel, diff):
         """
         Basic test to run random circuits and
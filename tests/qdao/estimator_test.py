@@ -0,0 +1,181 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from qiskit import transpile
+from qiskit.quantum_info import Statevector
+from qiskit_aer import Aer
+
+from qdao.circuit import StaticPartitioner
+from qdao.engine import Engine
+from qdao.estimator import (
+    ThroughputProfile,
+    auto_configure,
+    estimate_cost,
+    sweep_configs,
+)
+from qdao.exceptions import QdaoError
+from qdao.manager import SvManager
+from qdao.qiskit.utils import random_circuit
+from qdao.util import retrieve_sv
+
+
+def get_circ(num_qubits, depth):
+    circ = random_circuit(num_qubits, depth, max_operands=2, measure=False, seed=42)
+    return transpile(circ, Aer.get_backend("aer_simulator"))
+
+
+class TestEstimator:
+    def test_estimate_cost(self):
+        NQ, NP, NL = 8, 6, 3
+        circ = get_circ(NQ, 10)
+        est = estimate_cost(circ, num_primary=NP, num_local=NL)
+
+        sub_circs = StaticPartitioner(np=NP, nl=NL).run(circ)
+        assert est.num_sub_circuits == len(sub_circs)
+        assert est.num_chunks == 1 << (NQ - NP)
+        assert est.num_storage_files == 1 << (NQ - NL)
+        assert est.io_ops == (1 << (NQ - NL)) * (1 + 2 * len(sub_circs))
+        assert est.bytes_moved == 16 * (1 << NQ) * (1 + 2 * len(sub_circs))
+        assert est.peak_memory >= 16 * (1 << NP)
+        assert est.predicted_time > 0
+
+    def test_estimate_memory(self):
+        circ = get_circ(8, 4)
+        est_disk = estimate_cost(circ, num_primary=6, num_local=3)
+        est_mem = estimate_cost(circ, num_primary=6, num_local=3, sv_location="memory")
+        assert est_mem.num_storage_files == 0
+        assert est_mem.peak_memory == est_disk.peak_memory + 16 * (1 << 8)
+
+    def test_engine_estimate(self):
+        circ = get_circ(8, 6)
+        engine = Engine(circuit=circ, num_primary=6, num_local=3)
+        est = engine.estimate()
+        assert est.num_primary == 6
+        assert est.num_local == 3
+        assert est.to_dict()["num_sub_circuits"] == est.num_sub_circuits
+
+    @pytest.mark.parametrize("restore_layout", [True, False])
+    @pytest.mark.parametrize("storage_ops", [False, True])
+    def test_estimate_layout_passes(self, restore_layout, storage_ops):
+        NQ, NP, NL = 12, 8, 4
+        circ = get_circ(NQ, 10)
+        part = StaticPartitioner(
+            np=NP, nl=NL, remap_qubits=True, storage_ops=storage_ops
+        )
+        engine = Engine(
+            circuit=circ,
+            num_primary=NP,
+            num_local=NL,
+            partitioner=part,
+            restore_layout=restore_layout,
+            io_trace=True,
+        )
+        est = engine.estimate()
+        engine.run()
+
+        # Initialization is not traced
+        trace = engine.manager.io_trace.to_array()
+        assert est.bytes_moved == 16 * (1 << NQ) + int(trace["nbytes"].sum())
+        assert est.io_ops == (1 << (NQ - NL)) + len(trace)
+
+    def test_sweep_configs(self):
+        circ = get_circ(6, 6)
+        profile = ThroughputProfile(io_bandwidth=1e9, sim_throughput=1e9)
+        ests = sweep_configs(circ, profile=profile)
+        assert len(ests) == sum(p - 2 for p in range(3, 7))
+        times = [est.predicted_time for est in ests]
+        assert times == sorted(times)
+
+        ests = sweep_configs(circ, profile=profile, max_memory=16 * (1 << 4) * 4)
+        assert all(est.num_primary <= 4 for est in ests)
+
+    def test_calibrate(self):
+        circ = get_circ(8, 4)
+        profile = ThroughputProfile.calibrate(circ, num_primary=6, num_local=3)
+        assert profile.io_bandwidth > 0
+        assert profile.sim_throughput > 0
+        assert profile.sim_overhead > 0
+
+    def test_calibrate_storage_dir(self, tmp_path, monkeypatch):
+        import qdao.estimator
+
+        dirs = [str(tmp_path / "d0"), str(tmp_path / "d1")]
+        probed = []
+        drop = qdao.estimator._drop_page_cache
+
+        def record_drop(fn):
+            probed.append(os.path.dirname(os.path.dirname(fn)))
+            drop(fn)
+
+        monkeypatch.setattr(qdao.estimator, "_drop_page_cache", record_drop)
+        profile = ThroughputProfile.calibrate(num_local=3, storage_dir=dirs)
+        assert profile.io_bandwidth > 0
+        # Every striped directory is probed and cleaned up
+        assert sorted(set(probed)) == dirs
+        assert all(not os.listdir(path) for path in dirs)
+
+    def test_auto_configure(self):
+        NQ = 8
+        circ = get_circ(NQ, 6)
+        profile = ThroughputProfile()
+        budget = 16 * (1 << 5) * 4
+        est = auto_configure(circ, memory_budget=budget, profile=profile)
+        assert est.peak_memory <= budget
+        assert est.num_primary == 5
+        assert 1 <= est.num_local <= est.num_primary - 2
+
+        est = auto_configure(circ, memory_budget=budget, profile=profile, num_buffers=2)
+        assert est.num_primary == 4
+
+        with pytest.raises(QdaoError):
+            auto_configure(circ, memory_budget=16, profile=profile)
+
+    def test_auto_configure_disk(self, tmp_path, monkeypatch):
+        NQ = 8
+        circ = get_circ(NQ, 6)
+        profile = ThroughputProfile()
+        # Free space for 1.5 statevectors
+        free = 3 * 16 * (1 << NQ) // 2
+        monkeypatch.setattr(
+            "shutil.disk_usage", lambda path: SimpleNamespace(free=free)
+        )
+        auto_configure(circ, storage_dir=str(tmp_path), profile=profile)
+        # Double-buffered storage keeps two copies
+        with pytest.raises(QdaoError):
+            auto_configure(
+                circ, storage_dir=str(tmp_path), profile=profile, storage_copies=2
+            )
+        with pytest.raises(QdaoError):
+            Engine(
+                circuit=circ,
+                auto_config=True,
+                data_dir=str(tmp_path),
+                checkpoint=str(tmp_path / "ckpt.pkl"),
+            )
+
+    def test_engine_auto_config(self):
+        NQ = 8
+        circ = get_circ(NQ, 6)
+        engine = Engine(circuit=circ, auto_config=True, memory_budget=16 * (1 << 6) * 4)
+        assert engine.num_primary == 6
+        engine.run()
+
+        sv = retrieve_sv(NQ, num_local=engine.num_local)
+        circ.save_state()
+        sv_org = Aer.get_backend("aer_simulator").run(circ).result().get_statevector()
+        assert Statevector(sv).equiv(sv_org)
+
+        # Chunks read ahead count against the memory budget
+        circ = get_circ(NQ, 6)
+        engine = Engine(
+            circuit=circ,
+            auto_config=True,
+            memory_budget=16 * (1 << 6) * 6,
+            prefetch_depth=2,
+        )
+        assert engine.num_primary == 5
+
+        # The configuration of a given manager cannot be changed
+        with pytest.raises(QdaoError):
+            Engine(circuit=circ, manager=SvManager(NQ, 4, 2), auto_config=True)
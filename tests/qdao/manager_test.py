@@ -1,12 +1,14 @@
+import os
 import random
 
 from time import time
 import numpy as np
+import pytest
 
 from qiskit.compiler import transpile
 
 from qdao.manager import SvManager
-from qdao.util import DATA_DIR
+from qdao.util import DATA_DIR, retrieve_sv
 from tests.qdao import QdaoBaseTest
 
 
@@ -81,6 +83,201 @@ class TestSvManager(QdaoBaseTest):
         np.testing.assert_array_equal(self._sv_dao._chunk[4:8], vec2)
         np.testing.assert_array_equal(self._sv_dao._chunk[12:16], vec3)
 
+    def test_apply_permutation(self):
+        sv_dao = SvManager(num_qubits=6, num_primary=4, num_local=2)
+        sv_dao.initialize()
+        vecs = []
+        for i in range(16):
+            vecs.append(np.random.rand(4) + 1j * np.random.rand(4))
+            np.save(DATA_DIR + "/sv{}.npy".format(i), vecs[-1])
+
+        # X on qubit 3, i.e., global qubit 1, swaps unit 0 with 2
+        sv_dao.apply_permutation([3], np.array([1, 0]))
+        sv_dao.load_sv([0, 1, 2, 3])
+        np.testing.assert_array_equal(sv_dao.chunk[0:4], vecs[2])
+        np.testing.assert_array_equal(sv_dao.chunk[4:8], vecs[3])
+        np.testing.assert_array_equal(sv_dao.chunk[8:12], vecs[0])
+        np.testing.assert_array_equal(sv_dao.chunk[12:16], vecs[1])
+
+        sv_dao.finalize()
+        np.testing.assert_array_equal(np.load(DATA_DIR + "/sv0.npy"), vecs[2])
+        np.testing.assert_array_equal(np.load(DATA_DIR + "/sv2.npy"), vecs[0])
+
+    def test_apply_diagonal(self):
+        sv_dao = SvManager(num_qubits=6, num_primary=4, num_local=2)
+        sv_dao.initialize()
+        vecs = []
+        for i in range(16):
+            vecs.append(np.random.rand(4) + 1j * np.random.rand(4))
+            np.save(DATA_DIR + "/sv{}.npy".format(i), vecs[-1])
+
+        # CZ on qubit 0 and 2
+        sv_dao.apply_diagonal([0, 2], np.array([1, 1, 1, -1]))
+        sv_dao.load_sv([0, 1, 2, 3])
+        np.testing.assert_array_equal(sv_dao.chunk[0:4], vecs[0])
+        np.testing.assert_array_equal(sv_dao.chunk[4:8], vecs[1] * [1, -1, 1, -1])
+        sv_dao.finish_sweep()
+        sv_dao.load_sv([0, 1, 2, 3])
+        np.testing.assert_array_equal(sv_dao.chunk[4:8], vecs[1])
+
+    def test_apply_layout(self):
+        sv_dao = SvManager(num_qubits=6, num_primary=3, num_local=2)
+        sv_dao.initialize()
+        sv = np.random.rand(64) + 1j * np.random.rand(64)
+        for i in range(8):
+            sv_dao.chunk_idx = i
+            sv_dao.chunk = sv[i * 8 : (i + 1) * 8].copy()
+            sv_dao.store_sv([0, 1, 2])
+
+        # Only one global qubit can be moved in a pass
+        layout = [5, 2, 0, 4, 1, 3]
+        sv_dao.apply_layout(layout)
+        assert sv_dao.layout == layout
+        sv_dao.finalize(restore_layout=False)
+        np.testing.assert_allclose(retrieve_sv(6, 2, layout=layout), sv)
+
+        sv_dao.finalize()
+        assert sv_dao.layout is None
+        np.testing.assert_allclose(retrieve_sv(6, 2), sv)
+
+    def test_shared_memory(self):
+        sv_dao = SvManager(
+            num_qubits=6, num_primary=4, num_local=2, sv_location="memory"
+        )
+        sv_dao.initialize()
+        assert sv_dao.shm_name is not None
+        assert sv_dao._global_sv.shape == (16, 4)
+
+        # Another manager, e.g., in a worker process, attaches by name
+        other = SvManager(
+            num_qubits=6,
+            num_primary=4,
+            num_local=2,
+            sv_location="memory",
+            shm_name=sv_dao.shm_name,
+        )
+        vec = np.random.rand(16) + 1j * np.random.rand(16)
+        other.chunk = vec
+        other.store_sv([0, 1, 2, 3])
+        sv_dao.load_sv([0, 1, 2, 3])
+        np.testing.assert_array_equal(sv_dao.chunk, vec)
+
+        # Units are relabeled in place
+        sv_dao.apply_permutation([3], np.array([1, 0]))
+        sv_dao.finalize()
+        np.testing.assert_array_equal(other._global_sv[2], vec[0:4])
+        np.testing.assert_array_equal(other._global_sv[0], vec[8:12])
+
+    def test_read_write_unit(self):
+        sv_dao = SvManager(
+            num_qubits=6, num_primary=4, num_local=2, sv_location="memory"
+        )
+        sv_dao.initialize()
+        assert sv_dao.num_qubits == 6 and sv_dao.num_primary == 4
+        vec = np.random.rand(4) + 1j * np.random.rand(4)
+        sv_dao.write_unit(5, vec)
+        np.testing.assert_array_equal(sv_dao.read_unit(5), vec)
+
+    def test_shard(self):
+        sv_dao = SvManager(
+            num_qubits=6,
+            num_primary=4,
+            num_local=2,
+            sv_location="memory",
+            shard=[4, 5, 6, 7],
+        )
+        sv_dao.initialize()
+        # Only rows of the shard are allocated
+        assert sv_dao._global_sv.shape == (4, 4)
+        vec = np.random.rand(4) + 1j * np.random.rand(4)
+        sv_dao.write_unit(6, vec)
+        np.testing.assert_array_equal(sv_dao.read_unit(6), vec)
+        with pytest.raises(KeyError):
+            sv_dao.read_unit(0)
+
+        with pytest.raises(ValueError):
+            SvManager(num_qubits=6, num_primary=4, num_local=2, shard=[0])
+
+    def test_access_order(self):
+        sv_dao = SvManager(
+            num_qubits=6, num_primary=4, num_local=2, sv_location="memory"
+        )
+        sv_dao.initialize()
+        reads = []
+        read = sv_dao._read_su
+        sv_dao._read_su = lambda unit: (reads.append(unit), read(unit))[1]
+
+        # A chunk of global qubits 2 and 3 spans units 0, 1, 4, 5
+        qubits = [0, 1, 4, 5]
+        order = sv_dao.chunk_order(qubits)
+        assert sorted(order) == list(range(4))
+        sv_dao.chunk_idx = order[0]
+        sv_dao.load_sv(qubits)
+        assert reads == sorted(reads)
+
+        # Units of a batch are accessed in one sorted pass
+        reads.clear()
+        batch = np.empty((4, 16), dtype=np.complex128)
+        sv_dao.load_batch(qubits, order, batch)
+        assert reads == list(range(16))
+        np.testing.assert_array_equal(batch[0], sv_dao.load_sv(qubits))
+
+        # The direction alternates between sweeps
+        sv_dao.finish_sweep()
+        assert sv_dao.chunk_order(qubits) == order[::-1]
+        reads.clear()
+        sv_dao.load_batch(qubits, order, batch)
+        assert reads == list(range(15, -1, -1))
+        sv_dao.finalize()
+
+    def test_data_dir(self, tmp_path):
+        dirs = [str(tmp_path / "d{}".format(i)) for i in range(3)]
+        sv_dao = SvManager(
+            num_qubits=6, num_primary=4, num_local=2, data_dir=dirs, io_threads=2
+        )
+        sv_dao.initialize()
+        assert [len(os.listdir(d)) for d in dirs] == [6, 5, 5]
+        sv = np.random.rand(64) + 1j * np.random.rand(64)
+        for i in range(4):
+            sv_dao.chunk_idx = i
+            sv_dao.chunk = sv[i * 16 : (i + 1) * 16].copy()
+            sv_dao.store_sv([0, 1, 2, 3])
+        np.testing.assert_array_equal(np.load(dirs[1] + "/sv4.npy"), sv[16:20])
+
+        # Units are moved across directories when relabeled units are renamed
+        sv_dao.apply_permutation([3], np.array([1, 0]))
+        sv_dao.finalize()
+        res = retrieve_sv(6, num_local=2, data_dir=dirs)
+        np.testing.assert_array_equal(res[0:4], sv[8:12])
+        np.testing.assert_array_equal(res[8:12], sv[0:4])
+
+        with pytest.raises(ValueError):
+            SvManager(num_qubits=6, num_primary=4, num_local=2, striping="stripe")
+
+    def test_commit_durable(self, tmp_path, monkeypatch):
+        synced = []
+        monkeypatch.setattr("qdao.manager.fsync_path", synced.append)
+        sv_dao = SvManager(
+            num_qubits=6,
+            num_primary=4,
+            num_local=2,
+            double_buffer=True,
+            data_dir=str(tmp_path),
+        )
+        sv_dao.initialize()
+        committed = []
+        sv_dao.on_commit = lambda: committed.append(list(synced))
+        for i in range(4):
+            sv_dao.chunk_idx = i
+            sv_dao.load_sv([0, 1, 2, 3])
+            sv_dao.store_sv([0, 1, 2, 3])
+        sv_dao.finish_sweep()
+
+        # Written units and their directory are flushed before the commit
+        units = [sv_dao._file_name(unit, 1) for unit in range(16)]
+        assert len(committed) == 1
+        assert sorted(committed[0]) == sorted(units + [str(tmp_path)])
+
     def test_load_save_large(self, nq):
         NQ = int(nq)
         NP = NQ - 2
@@ -0,0 +1,82 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from qiskit import transpile
+from qiskit.qasm2 import dumps
+from qiskit.quantum_info import SparsePauliOp, Statevector
+from qiskit_aer import Aer
+
+from qdao.cli import main
+from qdao.engine import Engine
+from qdao.qiskit.utils import random_circuit
+from qdao.results import (
+    PauliExpectations,
+    Probabilities,
+    SampleCounts,
+    StatevectorWriter,
+    UnitReducer,
+    reduce_units,
+)
+
+
+def get_circ(num_qubits, depth):
+    circ = random_circuit(num_qubits, depth, max_operands=2, measure=False, seed=3)
+    return transpile(circ, Aer.get_backend("aer_simulator"))
+
+
+class TestResults:
+    def test_reduce_units(self, tmp_path):
+        NQ, NP, NL = 7, 5, 3
+        circ = get_circ(NQ, 8)
+        engine = Engine(circuit=circ, num_primary=NP, num_local=NL)
+        engine.run()
+        sv = Statevector(circ)
+
+        path = str(tmp_path / "sv.npy")
+        probs, marginal, counts, expectations, _ = reduce_units(
+            engine.manager.iter_units(),
+            [
+                Probabilities(NQ),
+                Probabilities(NQ, qubits=[6, 1]),
+                SampleCounts(NQ, shots=1000, seed=0, qubits=[0]),
+                PauliExpectations(NQ, ["ZIIIIIZ", "IIIZIII"]),
+                StatevectorWriter(NQ, path),
+            ],
+        )
+        assert np.allclose(probs, sv.probabilities())
+        assert np.allclose(marginal, sv.probabilities([6, 1]))
+        assert sum(counts.values()) == 1000
+        assert abs(counts.get("1", 0) / 1000 - sv.probabilities([0])[1]) < 0.1
+        for label, value in expectations.items():
+            assert np.isclose(value, sv.expectation_value(SparsePauliOp(label)).real)
+        assert Statevector(np.load(path)).equiv(sv)
+
+    def test_unit_reducer_abstract(self):
+        with pytest.raises(TypeError):
+            UnitReducer(3)
+
+    def test_cli(self, tmp_path):
+        circ = get_circ(6, 6)
+        qasm = tmp_path / "circ.qasm"
+        qasm.write_text(dumps(circ))
+        out = tmp_path / "out"
+
+        args = [str(qasm), "--num-primary", "4", "--num-local", "2"]
+        args += ["--output-dir", str(out), "--probabilities", "--shots", "10"]
+        args += ["--statevector", "npy", "--sv-location", "memory"]
+        assert main(args) == 0
+
+        sv = Statevector(circ)
+        assert Statevector(np.load(out / "statevector.npy")).equiv(sv)
+        assert np.allclose(np.load(out / "probabilities.npy"), sv.probabilities())
+        assert sum(json.load(open(out / "counts.json")).values()) == 10
+        stats = json.load(open(out / "stats.json"))
+        assert stats["num_sub_circuits"] > 0
+        assert stats["timings"]["run"] >= stats["phases"]["simulate"]
+        assert not os.path.exists(out / "expectations.json")
+
+        # Primary and local qubits are given together or chosen together
+        with pytest.raises(SystemExit):
+            main([str(qasm), "--num-primary", "4", "--output-dir", str(out)])
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from qiskit.quantum_info import Statevector, random_statevector
+
+from qdao.bench.circuits import generate_circuit
+from qdao.circuit import CircuitHelperProvider
+from qdao.exceptions import QdaoError
+from qdao.simulator import QdaoSimObj, SimulatorProvider
+
+
+def _run_sub_circ(backend, num_primary, chunk):
+    circ = generate_circuit("random", num_primary, depth=8, seed=5, backend=backend)
+    helper = CircuitHelperProvider.get_helper(backend)
+    helper.circ = circ
+    helper.circ = helper.gen_sub_circ(list(helper.instructions), 0, num_primary).circ
+    sim = SimulatorProvider.get_simulator(backend)
+    return sim.run(helper.init_circ_from_sv(chunk))
+
+
+class TestQuafuSimulator:
+    @pytest.mark.parametrize("num_primary", [4, 8])
+    def test_run_vs_qiskit(self, num_primary):
+        # Chunks are not normalized
+        chunk = random_statevector(1 << num_primary, seed=1).data * 0.5
+        expected = _run_sub_circ("qiskit", num_primary, chunk.copy())
+
+        buf = chunk.copy()
+        sv = _run_sub_circ("quafu", num_primary, buf)
+        assert sv is buf
+        assert Statevector(sv).equiv(Statevector(expected))
+        assert np.isclose(np.linalg.norm(sv), 0.5)
+
+    def test_run_size_mismatch(self):
+        from quafu import QuantumCircuit
+
+        circ = QuantumCircuit(3)
+        circ.h(0)
+        sim = SimulatorProvider.get_simulator("quafu")
+        with pytest.raises(QdaoError):
+            sim.run(QdaoSimObj(np.zeros(4, dtype=np.complex128), circ))
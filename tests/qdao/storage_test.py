@@ -0,0 +1,285 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+from qiskit import transpile
+from qiskit_aer import Aer
+
+from qdao.bench.replay import main
+from qdao.engine import Engine
+from qdao.exceptions import QdaoError
+from qdao.qiskit.utils import random_circuit
+from qdao.storage import (
+    LOAD,
+    STORE,
+    STORES,
+    TRACE_DTYPE,
+    BaseStore,
+    ClairvoyantCache,
+    IoTrace,
+    LruCache,
+    Prefetcher,
+    UnitCache,
+    WriteBackQueue,
+    aligned_empty,
+    direct_io_supported,
+    load_direct,
+    replay,
+    save_direct,
+)
+
+
+def get_trace(batch_size=1):
+    NQ, NP, NL = 7, 5, 3
+    circ = random_circuit(NQ, 8, max_operands=2, measure=False, seed=3)
+    circ = transpile(circ, Aer.get_backend("aer_simulator"))
+    engine = Engine(
+        circuit=circ,
+        num_primary=NP,
+        num_local=NL,
+        sv_location="memory",
+        batch_size=batch_size,
+        io_trace=True,
+    )
+    engine.run()
+    return engine._manager.io_trace.to_array()
+
+
+class TestIoTrace:
+    @pytest.mark.parametrize("batch_size", [1, 4])
+    def test_record(self, batch_size):
+        trace = get_trace(batch_size)
+        assert trace.dtype == TRACE_DTYPE
+        assert np.all(trace["nbytes"] == 16 << 3)
+        assert np.all(np.diff(trace["time"]) >= 0)
+
+        # Each sweep loads and stores every unit once, chunk by chunk
+        for sweep in np.unique(trace["sweep"]):
+            records = trace[trace["sweep"] == sweep]
+            for op in (LOAD, STORE):
+                units = records["unit"][records["op"] == op]
+                assert sorted(units) == list(range(16))
+            for chunk in range(4):
+                assert np.count_nonzero(records["chunk"] == chunk) == 8
+
+    def test_save_load(self, tmp_path):
+        trace = IoTrace()
+        trace.record(LOAD, 3, 64, 1, 0)
+        trace.record(STORE, 3, 64, 1, 0)
+        assert len(trace) == 2
+        path = str(tmp_path / "trace.npy")
+        trace.save(path)
+        np.testing.assert_array_equal(IoTrace.load(path), trace.to_array())
+
+        np.save(path, np.zeros(2))
+        with pytest.raises(QdaoError):
+            IoTrace.load(path)
+
+
+class TestStores:
+    @pytest.mark.parametrize("name", sorted(STORES))
+    def test_read_write(self, name, tmp_path):
+        store = STORES[name](str(tmp_path))
+        store.open(5, 8)
+        vecs = [np.random.rand(8) + 1j * np.random.rand(8) for _ in range(5)]
+        for unit, vec in enumerate(vecs):
+            store.write(unit, vec)
+        store.flush()
+        for unit in [4, 0, 2, 1, 3]:
+            np.testing.assert_array_equal(store.read(unit), vecs[unit])
+        store.close()
+
+    def test_abstract(self, tmp_path):
+        with pytest.raises(TypeError):
+            type("ReadOnlyStore", (BaseStore,), {"read": lambda self, unit: None})(
+                str(tmp_path)
+            )
+
+    @pytest.mark.parametrize("name", sorted(STORES))
+    def test_replay(self, name, tmp_path):
+        trace = get_trace()
+        result = replay(trace, STORES[name](str(tmp_path)))
+        assert result["num_loads"] == result["num_stores"] == len(trace) // 2
+        assert result["bytes_read"] == result["num_loads"] * (16 << 3)
+        assert result["seconds"] > 0
+
+    def test_replay_cli(self, tmp_path, capsys):
+        path = str(tmp_path / "trace.npy")
+        np.save(path, get_trace())
+        args = [path, "--stores", "file", "sharded", "--workdir", str(tmp_path)]
+        assert main(args) == 0
+        results = [
+            json.loads(line) for line in capsys.readouterr().out.split("\n")[:-1]
+        ]
+        assert [r["name"] for r in results] == ["file", "sharded"]
+
+
+class TestUnitCache:
+    def get_cache(self, cls, capacity):
+        backing = {unit: np.full(4, unit, dtype=np.complex128) for unit in range(8)}
+        reads, writes = [], []
+
+        def read(unit):
+            reads.append(unit)
+            return backing[unit].copy()
+
+        def write(unit, vec):
+            writes.append(unit)
+            backing[unit] = vec.copy()
+
+        return cls(capacity, read, write), backing, reads, writes
+
+    def test_lru(self):
+        cache, backing, reads, writes = self.get_cache(LruCache, 2)
+        cache.get(0)
+        cache.put(1, np.ones(4))
+        cache.get(0)
+        assert reads == [0] and writes == []
+
+        # Unit 1 is least recently used and written back when evicted
+        cache.get(2)
+        assert writes == [1] and 1 not in cache and 0 in cache
+        np.testing.assert_array_equal(backing[1], np.ones(4))
+
+        cache.put(0, np.zeros(4))
+        cache.flush()
+        assert writes == [1, 0] and len(cache) == 2
+        np.testing.assert_array_equal(cache.get(0), np.zeros(4))
+        assert cache.stats == {"hits": 2, "misses": 2, "writebacks": 2}
+
+        cache.put(3, np.ones(4))
+        cache.clear(write_back=False)
+        assert len(cache) == 0 and 3 not in writes
+
+    def test_abstract(self):
+        with pytest.raises(TypeError):
+            UnitCache(2, lambda unit: None, lambda unit, vec: None)
+
+    def test_clairvoyant(self):
+        cache, _, reads, writes = self.get_cache(ClairvoyantCache, 3)
+        cache.plan([0, 1, 2, 3], [3, 2, 1, 0])
+        for unit in range(3):
+            cache.get(unit)
+            cache.put(unit, np.ones(4))
+
+        # Unit 0 is used last in the next sweep
+        cache.get(3)
+        assert writes == [0] and 0 not in cache
+
+        # A unit loaded in this sweep is kept until it is stored
+        cache.plan([4, 5, 1], [1, 5, 4])
+        cache.get(4)
+        cache.get(5)
+        assert 4 in cache and 5 in cache and 1 in cache
+
+
+class TestPrefetcher:
+    def get_prefetcher(self, tmp_path, **kwargs):
+        reads = []
+
+        def read(unit):
+            reads.append(unit)
+            return np.full(4, unit, dtype=np.complex128)
+
+        path = lambda unit: str(tmp_path / "sv{}.npy".format(unit))
+        for unit in range(8):
+            np.save(path(unit), np.zeros(4))
+        return Prefetcher(read, path, **kwargs), reads
+
+    def test_read_ahead(self, tmp_path):
+        pf, reads = self.get_prefetcher(tmp_path, depth=1)
+        pf.plan([[0, 1], [2, 3], [4, 5], [6, 7]])
+
+        # Loading chunk 0 reads chunk 1 ahead
+        pf.advance()
+        np.testing.assert_array_equal(pf.take(0), np.zeros(4))
+        np.testing.assert_array_equal(pf.take(1), np.ones(4))
+        assert {0, 1} <= set(reads) <= {0, 1, 2, 3}
+        assert pf.take(0) is None
+
+        # Units of chunk 1 not taken are discarded
+        pf.advance()
+        pf.advance()
+        assert pf.take(2) is None and pf.take(4) is not None
+        pf.plan([])
+        assert pf.stats == {"hits": 3, "wasted": 5}
+
+    def test_skip_and_advise(self, tmp_path):
+        pf, reads = self.get_prefetcher(tmp_path, depth=2, skip=lambda u: u % 2)
+        pf.plan([[0, 1], [2, 3]])
+        assert pf.take(1) is None and pf.take(0) is not None
+        assert 1 not in reads
+
+        pf, reads = self.get_prefetcher(tmp_path, depth=2, mode="advise")
+        pf.plan([[0, 1], [2, 3]])
+        pf.advance()
+        assert pf.take(0) is None and reads == []
+
+
+class TestWriteBackQueue:
+    def test_wait_and_barrier(self):
+        release = threading.Event()
+        files = {}
+
+        def write(unit, vec):
+            release.wait()
+            if unit == 3:
+                raise OSError("disk full")
+            files[unit] = vec
+
+        queue = WriteBackQueue(write, capacity=4)
+        for unit in range(3):
+            queue.put(unit, np.full(4, unit))
+        assert len(queue) == 3 and files == {}
+
+        # A unit is written before it is read again
+        release.set()
+        queue.wait(1)
+        assert 1 in files
+        queue.put(3, np.zeros(4))
+        with pytest.raises(OSError):
+            queue.barrier()
+        assert len(queue) == 0 and sorted(files) == [0, 1, 2]
+        assert queue.stats["writes"] == 4
+
+    def test_capacity(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def write(unit, vec):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        queue = WriteBackQueue(write, capacity=1, num_threads=4)
+        for unit in range(4):
+            queue.put(unit, np.zeros(4))
+        queue.barrier()
+        assert peak[0] == 1 and queue.stats["stalls"] == 3
+
+
+class TestDirectIo:
+    def test_save_load(self, tmp_path):
+        if not direct_io_supported(str(tmp_path)):
+            pytest.skip("O_DIRECT is not supported")
+        path = str(tmp_path / "sv0.npy")
+        vec = np.random.rand(256) + 1j * np.random.rand(256)
+
+        # Unaligned vectors are copied, files are compatible with np.load
+        save_direct(path, vec[1:])
+        np.testing.assert_array_equal(np.load(path), vec[1:])
+        np.testing.assert_array_equal(load_direct(path, 255), vec[1:])
+
+        out = aligned_empty(256)
+        save_direct(path, vec)
+        assert load_direct(path, 256, out=out) is out
+        np.testing.assert_array_equal(out, vec)
+
+        # Files written by np.save are read as well
+        np.save(path, vec)
+        np.testing.assert_array_equal(load_direct(path, 256), vec)
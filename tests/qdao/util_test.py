@@ -1,6 +1,12 @@
+import json
+import os
+import subprocess
 import sys
 
-from qdao.util import indexes
+from qdao.util import STRIPINGS, LazyRegistry, generate_secondary_file_name, indexes
+
+# Seconds, generous for slow CI machines
+IMPORT_TIME_BUDGET = 1.0
 
 # 00000010
 # 00001010
@@ -22,3 +28,39 @@ class TestQdaoUtil:
     def test_indexes(self):
         for case in test_cases:
             assert indexes(case[0], case[1]) == case[2]
+
+    def test_striping(self):
+        dirs = ["d0", "d1", "d2", "d3"]
+        assert generate_secondary_file_name(5) == os.path.join("data", "sv5.npy")
+        assert generate_secondary_file_name(5, 1, data_dir=dirs) == os.path.join(
+            "d1", "sv5_1.npy"
+        )
+        # Units with a stride of the number of directories are spread by hash
+        for name, stripe in STRIPINGS.items():
+            counts = [0] * 4
+            for unit in range(0, 256, 4):
+                counts[stripe(unit, 4)] += 1
+            assert max(counts) <= (64 if name == "round_robin" else 24)
+            assert stripe(7, 1) == 0
+
+    def test_lazy_registry(self):
+        registry = LazyRegistry({"indexes": "qdao.util:indexes"})
+        assert "indexes" in registry
+        assert registry["indexes"] is indexes
+        registry.register("sorted", sorted)
+        assert list(registry) == ["indexes", "sorted"]
+        assert registry["sorted"] is sorted
+
+    def test_import_is_lazy(self):
+        code = (
+            "import json, sys, time; st = time.perf_counter(); import qdao; "
+            "print(json.dumps([time.perf_counter() - st, sorted(sys.modules)]))"
+        )
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, env=env
+        )
+        elapsed, modules = json.loads(out.stdout)
+        for name in ["qiskit", "qiskit_aer", "quafu", "asyncio"]:
+            assert name not in modules
+        assert elapsed < IMPORT_TIME_BUDGET